@@ -0,0 +1,356 @@
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+
+
+# Política por defecto del control de admisión; se puede sobreescribir
+# parcialmente con el argumento admission_policy o la variable de entorno
+# MCP_ADMISSION_POLICY (JSON).
+DEFAULT_POLICY = {
+    "cheap_cost": 10_000,          # hasta aquí la consulta va al carril rápido
+    "max_cost": 5_000_000,         # por encima se aplica on_expensive
+    "on_expensive": "limit",       # "reject" | "queue" | "limit"
+    "auto_limit": 1000,            # LIMIT que se agrega con on_expensive = "limit"
+    "allow_recursive": False,      # CTE recursivos sin LIMIT
+    "fast_lane_concurrency": 4,
+    "slow_lane_concurrency": 1,
+    "fast_lane_timeout": 5.0,      # segundos máximos de ejecución
+    "slow_lane_timeout": 30.0,
+    "export_max_cost": 500_000_000,  # máximo para export_query, que nunca recibe LIMIT automático
+    "export_timeout": 600.0,
+}
+
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+_SUBQUERY_PREFIXES = (
+    "CO-ROUTINE", "MATERIALIZE", "SCALAR SUBQUERY", "LIST SUBQUERY",
+    "COMPOUND QUERY", "LEFT-MOST SUBQUERY", "UNION", "INTERSECT", "EXCEPT",
+    "SETUP", "RECURSIVE STEP", "MULTI-INDEX OR", "INDEX ",
+)
+
+_ALIAS_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w]*)(?:\s+(?:AS\s+)?([A-Za-z_][\w]*))?",
+    re.IGNORECASE,
+)
+
+# comentarios, literales e identificadores entre comillas: se blanquean antes de buscar LIMIT
+_SQL_OPAQUE = re.compile(
+    r"--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]",
+    re.DOTALL,
+)
+_SQL_TOKEN = re.compile(r"[()]|\bLIMIT\b", re.IGNORECASE)
+
+_CTE_HEAD = re.compile(
+    r"\s*([A-Za-z_]\w*)\s*(?:\([^()]*\))?\s*AS\s*(?:(?:NOT\s+)?MATERIALIZED\s*)?\(", re.IGNORECASE
+)
+_CTE_SEPARATOR = re.compile(r"\s*,")
+# consumen todas las filas antes de devolver la primera: un LIMIT por encima no corta la recursión
+_ROW_CONSUMERS = re.compile(
+    r"\b(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT|STRING_AGG|JSON_GROUP_ARRAY|JSON_GROUP_OBJECT)\s*\("
+    r"|\bOVER\b",
+    re.IGNORECASE,
+)
+
+_SQL_KEYWORDS = {
+    "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "NATURAL",
+    "ON", "USING", "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "EXCEPT",
+    "INTERSECT", "WINDOW", "AS",
+}
+
+
+class AdmissionRejected(Exception):
+    """La consulta no fue admitida por la política de costos"""
+
+
+class AdmissionDecision:
+    """Resultado de evaluar una consulta: carril, costo estimado y SQL final"""
+
+    def __init__(self, query: str, lane: str, cost: float, plan: list[str],
+                 tables: set[str], action: str = "run", reason: str = ""):
+        self.query = query
+        self.lane = lane
+        self.cost = cost
+        self.plan = plan
+        self.tables = tables
+        self.action = action
+        self.reason = reason
+
+    def to_dict(self) -> dict:
+        return {
+            "lane": self.lane,
+            "action": self.action,
+            "estimated_cost": None if math.isinf(self.cost) else round(self.cost),
+            "tables": sorted(self.tables),
+            "reason": self.reason,
+        }
+
+
+class AdmissionController:
+    """Control de admisión por costo para consultas SQL ad-hoc.
+
+    Antes de ejecutar se compila la consulta con EXPLAIN QUERY PLAN bajo un
+    authorizer que solo permite lecturas. El costo se estima a partir de la
+    forma del plan (SCAN/SEARCH, bucles anidados, subconsultas, B-trees
+    temporales) y del número de filas de cada tabla. Según la política la
+    consulta va al carril rápido, al carril lento (cola de baja prioridad),
+    recibe un LIMIT automático o se rechaza.
+    """
+
+    def __init__(self, policy: dict | None = None, row_estimator=None):
+        self.policy = dict(DEFAULT_POLICY)
+        env_policy = os.environ.get("MCP_ADMISSION_POLICY")
+        if env_policy:
+            self.policy.update(json.loads(env_policy))
+        if policy:
+            self.policy.update(policy)
+        if self.policy["on_expensive"] not in ("reject", "queue", "limit"):
+            raise ValueError(f"on_expensive inválido: {self.policy['on_expensive']}")
+
+        self.row_estimator = row_estimator or self._max_rowid_estimate
+        self._lanes = {
+            "fast": asyncio.Semaphore(self.policy["fast_lane_concurrency"]),
+            "slow": asyncio.Semaphore(self.policy["slow_lane_concurrency"]),
+        }
+        self.waiting = {"fast": 0, "slow": 0}
+
+    # --- authorizer -------------------------------------------------------
+
+    @staticmethod
+    def read_only_authorizer(tables: set[str] | None = None):
+        """Crea un authorizer que solo permite lecturas y registra las tablas leídas"""
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action not in _ALLOWED_ACTIONS:
+                return sqlite3.SQLITE_DENY
+            if action == sqlite3.SQLITE_READ and tables is not None and arg1:
+                tables.add(arg1)
+            return sqlite3.SQLITE_OK
+        return authorizer
+
+    # --- estimación -------------------------------------------------------
+
+    @staticmethod
+    def _max_rowid_estimate(conn: sqlite3.Connection, table: str) -> int:
+        """Estima filas con MAX(rowid): O(log n) en vez de un COUNT(*) completo"""
+        try:
+            row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+            return int(row[0] or 0)
+        except sqlite3.Error:
+            return 1000
+
+    def evaluate(self, conn: sqlite3.Connection, query: str, bulk: bool = False) -> AdmissionDecision:
+        """Evalúa la consulta y decide carril y acción según la política.
+
+        Con bulk=True (exportaciones) el máximo es export_max_cost y una
+        consulta cara se encola en el carril lento en vez de recibir un LIMIT.
+        """
+        tables: set[str] = set()
+        conn.set_authorizer(self.read_only_authorizer(tables))
+        try:
+            plan_rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        except sqlite3.DatabaseError as e:
+            if "not authorized" in str(e):
+                raise AdmissionRejected("solo se permiten consultas de lectura") from e
+            raise
+        finally:
+            conn.set_authorizer(None)
+
+        rows = {table: max(self.row_estimator(conn, table), 1) for table in tables}
+        aliases = self._aliases(query, tables)
+        cost, flags = self._plan_cost(plan_rows, rows, aliases)
+        plan = [row[3] for row in plan_rows]
+        has_limit = self.has_outer_limit(query)
+
+        if flags["recursive"] and not self.policy["allow_recursive"] and not self._recursion_bounded(query, plan_rows):
+            raise AdmissionRejected("CTE recursivo sin LIMIT")
+
+        if cost <= self.policy["cheap_cost"]:
+            return AdmissionDecision(query, "fast", cost, plan, tables)
+        if cost <= self.policy["max_cost"]:
+            return AdmissionDecision(query, "slow", cost, plan, tables,
+                                     reason="costo sobre el umbral del carril rápido")
+        if bulk:
+            if cost <= self.policy["export_max_cost"]:
+                return AdmissionDecision(query, "slow", cost, plan, tables, action="queue",
+                                         reason="exportación masiva, encolada en carril lento")
+            raise AdmissionRejected(
+                f"costo estimado {cost:.0f} excede el máximo de exportación {self.policy['export_max_cost']}")
+
+        action = self.policy["on_expensive"]
+        if action == "limit" and not has_limit:
+            if flags["blocking"]:
+                # con ORDER BY / GROUP BY en B-tree temporal el LIMIT no evita el recorrido completo
+                raise AdmissionRejected(
+                    f"costo estimado {cost:.0f} excede el máximo y el plan no admite LIMIT")
+            limited = f"SELECT * FROM (\n{self.strip_tail(query)}\n) LIMIT {int(self.policy['auto_limit'])}"
+            return AdmissionDecision(limited, "slow", cost, plan, tables, action="limit",
+                                     reason=f"LIMIT {self.policy['auto_limit']} agregado automáticamente")
+        if action == "queue" or (action == "limit" and has_limit):
+            return AdmissionDecision(query, "slow", cost, plan, tables, action="queue",
+                                     reason="costo sobre el máximo, encolada en carril lento")
+        raise AdmissionRejected(f"costo estimado {cost:.0f} excede el máximo {self.policy['max_cost']}")
+
+    @staticmethod
+    def has_outer_limit(query: str) -> bool:
+        """True si la sentencia tiene un LIMIT propio, fuera de subconsultas, CTEs, literales y comentarios"""
+        depth = 0
+        for token in _SQL_TOKEN.findall(_SQL_OPAQUE.sub(" ", query)):
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                return True
+        return False
+
+    @classmethod
+    def _recursion_bounded(cls, query: str, plan_rows) -> bool:
+        """True si cada CTE recursivo tiene su propio LIMIT o si el LIMIT exterior corta la recursión.
+
+        El LIMIT exterior solo la corta si los CTE recursivos se consumen fila a
+        fila como co-rutinas: no si se materializan, si el plan ordena o agrupa
+        en un B-tree temporal o si los consume un agregado o una función de ventana.
+        """
+        bodies, statement = cls._recursive_ctes(query)
+        if bodies and all(cls.has_outer_limit(body) for body in bodies.values()):
+            return True
+        if not cls.has_outer_limit(statement) or _ROW_CONSUMERS.search(statement):
+            return False
+        details = {node_id: detail for node_id, _, _, detail in plan_rows}
+        recursive = {parent for _, parent, _, detail in plan_rows if detail == "SETUP"}
+        return (
+            all(details.get(node_id, "").startswith("CO-ROUTINE") for node_id in recursive)
+            and not any("TEMP B-TREE" in detail for detail in details.values())
+        )
+
+    @staticmethod
+    def _recursive_ctes(query: str) -> tuple[dict[str, str], str]:
+        """Cuerpos de los CTE recursivos del WITH RECURSIVE inicial y la sentencia que los usa, sin comentarios ni literales"""
+        code = _SQL_OPAQUE.sub(" ", query)
+        head = re.match(r"\s*WITH\s+RECURSIVE\b", code, re.IGNORECASE)
+        if head is None:
+            return {}, code
+        bodies = {}
+        position = head.end()
+        while (cte := _CTE_HEAD.match(code, position)) is not None:
+            depth, end = 1, cte.end()
+            while end < len(code) and depth:
+                depth += {"(": 1, ")": -1}.get(code[end], 0)
+                end += 1
+            name, body = cte.group(1), code[cte.end():end - 1]
+            if re.search(rf"\b{re.escape(name)}\b", body, re.IGNORECASE):
+                bodies[name] = body
+            position = end
+            separator = _CTE_SEPARATOR.match(code, position)
+            if separator is None:
+                break
+            position = separator.end()
+        return bodies, code[position:]
+
+    @staticmethod
+    def strip_tail(query: str) -> str:
+        """La consulta sin los ';' ni los comentarios del final, para envolverla en una subconsulta"""
+        code = _SQL_OPAQUE.sub(
+            lambda m: " " * len(m.group()) if m.group().startswith(("--", "/*")) else m.group(), query
+        )
+        return query[:len(code.rstrip("; \t\r\n"))]
+
+    @staticmethod
+    def _aliases(query: str, tables: set[str]) -> dict[str, str]:
+        """Mapea alias de FROM/JOIN a su tabla real"""
+        aliases = {table: table for table in tables}
+        lowered = {table.lower(): table for table in tables}
+        for table, alias in _ALIAS_PATTERN.findall(query):
+            real = lowered.get(table.lower())
+            if real and alias and alias.upper() not in _SQL_KEYWORDS:
+                aliases[alias] = real
+        return aliases
+
+    @staticmethod
+    def _plan_cost(plan_rows, rows: dict[str, int], aliases: dict[str, str]) -> tuple[float, dict]:
+        """Costo aproximado de un plan de EXPLAIN QUERY PLAN.
+
+        Los bucles hermanos (SCAN/SEARCH bajo el mismo padre) se multiplican
+        porque SQLite los ejecuta anidados; las subconsultas se suman, y las
+        correlacionadas se multiplican por las filas del bucle exterior.
+        """
+        children: dict[int, list] = {}
+        for node_id, parent, _, detail in plan_rows:
+            children.setdefault(parent, []).append((node_id, detail))
+        flags = {"recursive": False, "blocking": False}
+        default_rows = max(rows.values(), default=1000)
+
+        def loop_cost(detail: str) -> float:
+            parts = detail.split()
+            name = parts[1] if len(parts) > 1 else ""
+            if name == "CONSTANT":
+                return 1.0
+            n = rows.get(aliases.get(name, name), default_rows)
+            if parts[0] == "SCAN":
+                return float(n)
+            # SEARCH: igualdad sobre índice ~ log2(n), rango ~ n/4
+            if re.search(r"[<>]", detail):
+                return max(n / 4.0, 1.0)
+            return math.log2(n + 1) + 1.0
+
+        def group_cost(parent: int) -> float:
+            loops = 1.0
+            has_loop = False
+            extra = 0.0
+            for node_id, detail in children.get(parent, []):
+                if detail.startswith(("SCAN", "SEARCH")):
+                    loops *= loop_cost(detail)
+                    has_loop = True
+                    extra += group_cost(node_id)
+                elif detail.startswith("USE TEMP B-TREE"):
+                    flags["blocking"] = True
+                elif detail.startswith(("SETUP", "RECURSIVE STEP")):
+                    flags["recursive"] = True
+                    extra += group_cost(node_id)
+                elif detail.startswith("CORRELATED"):
+                    extra += loops * group_cost(node_id)
+                elif detail.startswith(_SUBQUERY_PREFIXES):
+                    extra += group_cost(node_id)
+            if any(d.startswith("USE TEMP B-TREE") for _, d in children.get(parent, [])):
+                loops *= max(math.log2(loops + 1), 1.0)
+            return (loops if has_loop else 0.0) + extra
+
+        cost = group_cost(0)
+        if flags["recursive"]:
+            cost = math.inf
+        return cost, flags
+
+    # --- ejecución --------------------------------------------------------
+
+    async def run(self, decision: AdmissionDecision, func, *args, executor=None):
+        """Ejecuta func(*args) dentro del carril asignado, en un hilo o en el executor indicado"""
+        lane = self._lanes[decision.lane]
+        self.waiting[decision.lane] += 1
+        entered = False
+        try:
+            async with lane:
+                self.waiting[decision.lane] -= 1
+                entered = True
+                if executor is not None:
+                    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+                return await asyncio.to_thread(func, *args)
+        finally:
+            if not entered:
+                self.waiting[decision.lane] -= 1
+
+    def timeout_for(self, decision: AdmissionDecision) -> float:
+        return self.policy[f"{decision.lane}_lane_timeout"]
+
+    @staticmethod
+    def install_deadline(conn: sqlite3.Connection, seconds: float):
+        """Interrumpe la consulta si supera el tiempo asignado a su carril"""
+        deadline = time.monotonic() + seconds
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10_000)
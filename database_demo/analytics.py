@@ -0,0 +1,361 @@
+import sqlite3
+import numpy as np
+
+
+GRANULARITIES = {
+    # granularidad: (ventana de media móvil, período estacional)
+    "day": (7, 7),
+    "week": (4, 52),
+    "month": (3, 12),
+}
+
+# Expresión SQL del período de cada pedido como entero (días, semanas o meses
+# desde 1970-01-01), para agregar en SQL a la granularidad pedida y evitar
+# parsear fechas en Python
+PERIOD_EXPRESSIONS = {
+    "day": "CAST(julianday(o.order_date) - 2440587.5 AS INTEGER)",
+    "week": "(CAST(julianday(o.order_date) - 2440587.5 AS INTEGER) + 3) / 7",
+    "month": "(CAST(strftime('%Y', o.order_date) AS INTEGER) - 1970) * 12 + CAST(strftime('%m', o.order_date) AS INTEGER) - 1",
+}
+
+SALES_SERIES_QUERIES = {
+    "category": """
+        SELECT {period} AS period, p.category AS series,
+               SUM(oi.quantity * oi.unit_price) AS revenue,
+               COUNT(DISTINCT o.id) AS orders
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        JOIN products p ON p.id = oi.product_id
+        WHERE o.status IN ('completed', 'shipped') AND o.order_date IS NOT NULL {date_filter}
+        GROUP BY period, series
+    """,
+    "country": """
+        SELECT {period} AS period, o.shipping_country AS series,
+               SUM(o.total_amount) AS revenue,
+               COUNT(*) AS orders
+        FROM orders o
+        WHERE o.status IN ('completed', 'shipped') AND o.order_date IS NOT NULL {date_filter}
+        GROUP BY period, series
+    """,
+    "total": """
+        SELECT {period} AS period, 'total' AS series,
+               SUM(o.total_amount) AS revenue,
+               COUNT(*) AS orders
+        FROM orders o
+        WHERE o.status IN ('completed', 'shipped') AND o.order_date IS NOT NULL {date_filter}
+        GROUP BY period
+    """,
+}
+
+
+def load_sales_series(conn: sqlite3.Connection, granularity: str, group_by: str,
+                      start_date: str | None = None, end_date: str | None = None
+                      ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list]:
+    """Devuelve (período, índice de serie, ingresos, pedidos, claves de serie) agregados en SQL"""
+    if group_by not in SALES_SERIES_QUERIES:
+        raise ValueError(f"group_by inválido: {group_by}")
+    if granularity not in PERIOD_EXPRESSIONS:
+        raise ValueError(f"granularity inválida: {granularity}")
+    conditions, params = [], []
+    if start_date:
+        conditions.append("AND o.order_date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("AND o.order_date < DATE(?, '+1 day')")
+        params.append(end_date)
+    query = SALES_SERIES_QUERIES[group_by].format(
+        period=PERIOD_EXPRESSIONS[granularity],
+        date_filter=" ".join(conditions)
+    )
+
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        empty = np.array([])
+        return empty.astype(np.int64), empty.astype(np.int64), empty, empty, []
+    periods, series, revenue, orders = zip(*rows)
+    # codificación de las series en enteros con un dict: O(n), sin ordenar strings
+    codes: dict = {}
+    series_index = np.fromiter((codes.setdefault(s, len(codes)) for s in series), dtype=np.int64, count=len(series))
+    keys = [key if key is not None else "(sin dato)" for key in codes]
+    return (
+        np.array(periods, dtype=np.int64),
+        series_index,
+        np.array(revenue, dtype=np.float64),
+        np.array(orders, dtype=np.float64),
+        keys,
+    )
+
+
+def _period_labels(first: int, last: int, granularity: str) -> np.ndarray:
+    """Fecha de inicio de cada período entre first y last (denso, sin huecos)"""
+    periods = np.arange(first, last + 1)
+    if granularity == "day":
+        return periods.astype("datetime64[D]")
+    if granularity == "week":
+        # 1970-01-01 fue jueves: la semana 0 empieza el lunes 1969-12-29
+        return (periods * 7 - 3).astype("datetime64[D]")
+    return periods.astype("datetime64[M]")
+
+
+def _rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Media móvil por fila con cumsum; las primeras window-1 columnas quedan en NaN"""
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] < window:
+        return result
+    csum = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+    result[:, window - 1:] = (csum[:, window:] - csum[:, :-window]) / window
+    return result
+
+
+def _growth(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (current - previous) / previous
+    growth[~np.isfinite(growth)] = np.nan
+    return growth
+
+
+def _seasonality(matrix: np.ndarray, season: int) -> np.ndarray | None:
+    """Índice estacional por fila: media de cada fase / media general (requiere dos ciclos)"""
+    n_series, n_periods = matrix.shape
+    if n_periods < 2 * season:
+        return None
+    cycles = -(-n_periods // season)
+    padded = np.full((n_series, cycles * season), np.nan)
+    padded[:, :n_periods] = matrix
+    means = np.nanmean(padded.reshape(n_series, cycles, season), axis=1)
+    overall = matrix.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.where(overall > 0, means / overall, 1.0)
+    return index
+
+
+def _forecast(matrix: np.ndarray, horizon: int, fit_periods: int, seasonal: np.ndarray | None,
+              season: int) -> np.ndarray:
+    """Tendencia lineal por mínimos cuadrados (todas las series a la vez) por el índice estacional"""
+    n_series, n_periods = matrix.shape
+    fit = min(fit_periods, n_periods)
+    y = matrix[:, -fit:]
+    t = np.arange(n_periods - fit, n_periods, dtype=np.float64)
+    t_mean = t.mean()
+    y_mean = y.mean(axis=1, keepdims=True)
+    variance = ((t - t_mean) ** 2).sum()
+    slope = ((y - y_mean) * (t - t_mean)).sum(axis=1, keepdims=True) / variance if variance else np.zeros((n_series, 1))
+    future = np.arange(n_periods, n_periods + horizon, dtype=np.float64)
+    forecast = y_mean + slope * (future - t_mean)
+    if seasonal is not None:
+        forecast = forecast * seasonal[:, future.astype(np.int64) % season]
+    return np.clip(forecast, 0, None)
+
+
+def _round(values, digits: int = 2) -> list:
+    return [None if v is None or not np.isfinite(v) else round(float(v), digits) for v in values]
+
+
+def compute_sales_trends(conn: sqlite3.Connection, granularity: str = "week", group_by: str = "category",
+                         start_date: str | None = None, end_date: str | None = None,
+                         window: int | None = None, horizon: int = 4, top: int = 10,
+                         recent_periods: int = 12) -> dict:
+    """Series densas de ingresos y pedidos con medias móviles, crecimiento, estacionalidad y pronóstico.
+
+    Todo el cálculo posterior a la consulta es vectorizado: las series se
+    arman como matrices [serie x período] con np.bincount y cada métrica se
+    calcula para todas las series a la vez.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity inválida: {granularity}")
+    default_window, season = GRANULARITIES[granularity]
+    window = max(int(window or default_window), 1)
+
+    periods, series_index, revenue, orders, keys = load_sales_series(conn, granularity, group_by, start_date, end_date)
+    if len(periods) == 0:
+        return {"granularity": granularity, "group_by": group_by, "periods": 0, "series_count": 0, "series": []}
+
+    first = periods.min()
+    period = periods - first
+    labels = _period_labels(first, periods.max(), granularity)
+    n_series, n_periods = len(keys), len(labels)
+
+    flat = series_index * n_periods + period
+    size = n_series * n_periods
+    revenue_matrix = np.bincount(flat, weights=revenue, minlength=size).reshape(n_series, n_periods)
+    orders_matrix = np.bincount(flat, weights=orders, minlength=size).reshape(n_series, n_periods)
+
+    rolling = _rolling_mean(revenue_matrix, window)
+    last_growth = _growth(revenue_matrix[:, -1], revenue_matrix[:, -2]) if n_periods > 1 else np.full(n_series, np.nan)
+    if n_periods >= 2 * window:
+        window_growth = _growth(
+            revenue_matrix[:, -window:].sum(axis=1),
+            revenue_matrix[:, -2 * window:-window].sum(axis=1)
+        )
+    else:
+        window_growth = np.full(n_series, np.nan)
+    seasonal = _seasonality(revenue_matrix, season)
+    forecast = _forecast(revenue_matrix, horizon, max(2 * window, season if seasonal is not None else 0),
+                         seasonal, season)
+
+    totals = revenue_matrix.sum(axis=1)
+    order_totals = orders_matrix.sum(axis=1)
+    ranking = np.argsort(-totals)[:top]
+    recent = min(recent_periods, n_periods)
+    period_labels = [str(label) for label in labels]
+    future_labels = _future_labels(labels, granularity, horizon)
+
+    result_series = []
+    for i in ranking:
+        result_series.append({
+            "key": str(keys[i]),
+            "total_revenue": round(float(totals[i]), 2),
+            "total_orders": int(order_totals[i]),
+            "last_period": {
+                "period": period_labels[-1],
+                "revenue": round(float(revenue_matrix[i, -1]), 2),
+                "orders": int(orders_matrix[i, -1]),
+            },
+            "rolling_mean": _round([rolling[i, -1]])[0],
+            "growth_rate": _round([last_growth[i]], 4)[0],
+            "window_growth_rate": _round([window_growth[i]], 4)[0],
+            "seasonality": _round(seasonal[i], 3) if seasonal is not None else None,
+            "forecast": [
+                {"period": label, "revenue": value}
+                for label, value in zip(future_labels, _round(forecast[i]))
+            ],
+            "recent": [
+                {"period": label, "revenue": rev, "orders": int(n)}
+                for label, rev, n in zip(
+                    period_labels[-recent:],
+                    _round(revenue_matrix[i, -recent:]),
+                    orders_matrix[i, -recent:]
+                )
+            ],
+        })
+
+    return {
+        "granularity": granularity,
+        "group_by": group_by,
+        "window": window,
+        "start": period_labels[0],
+        "end": period_labels[-1],
+        "periods": n_periods,
+        "series_count": n_series,
+        "series": result_series,
+    }
+
+
+def _future_labels(labels: np.ndarray, granularity: str, horizon: int) -> list[str]:
+    step = 7 if granularity == "week" else 1
+    last = labels[-1]
+    return [str(last + step * (k + 1)) for k in range(horizon)]
+
+
+CUSTOMER_RFM_QUERY = """
+    WITH stats AS (
+        SELECT user_id,
+               MAX(order_date) AS last_order,
+               COUNT(*) AS frequency,
+               SUM(total_amount) AS monetary
+        FROM orders
+        WHERE status IN ('completed', 'shipped')
+        GROUP BY user_id
+    ),
+    reference AS (
+        SELECT COALESCE(?, MAX(last_order)) AS ref_date FROM stats
+    )
+    -- se parte de stats y se busca cada usuario por su clave primaria; los
+    -- usuarios sin pedidos se agregan aparte con un anti-join (NOT EXISTS: un
+    -- pedido con user_id NULL dejaría vacío un NOT IN)
+    SELECT u.id, u.name, u.email, u.country,
+           CAST(julianday(reference.ref_date) - julianday(s.last_order) AS INTEGER) AS recency_days,
+           s.frequency, s.monetary
+    FROM stats s
+    CROSS JOIN reference
+    JOIN users u ON u.id = s.user_id
+    UNION ALL
+    SELECT u.id, u.name, u.email, u.country, NULL, 0, 0
+    FROM users u
+    WHERE NOT EXISTS (SELECT 1 FROM stats s WHERE s.user_id = u.id)
+"""
+
+RFM_COLUMNS = ["id", "name", "email", "country", "recency_days", "frequency", "monetary",
+               "r_score", "f_score", "m_score", "segment"]
+
+
+def rfm_segment(r: int, f: int, m: int) -> str:
+    """Segmento clásico de RFM a partir de los quintiles"""
+    if r == 0:
+        return "Sin compras"
+    if r >= 4 and f >= 4 and m >= 4:
+        return "Champions"
+    if r >= 3 and f >= 4:
+        return "Leales"
+    if r >= 4 and f <= 1:
+        return "Nuevos"
+    if r >= 4:
+        return "Potenciales leales"
+    if r <= 2 and f >= 3:
+        return "En riesgo"
+    if r <= 2:
+        return "Hibernando"
+    return "Necesitan atención"
+
+
+def _quintiles(values: np.ndarray) -> np.ndarray:
+    """Quintil 1..5 de cada valor con el mismo reparto que NTILE(5) de SQL"""
+    n = len(values)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(n)
+    # NTILE da un elemento extra a los primeros n % 5 grupos
+    size, extra = divmod(n, 5)
+    big = extra * (size + 1)
+    return np.where(
+        ranks < big,
+        ranks // (size + 1),
+        extra + (ranks - big) // max(size, 1),
+    ) + 1
+
+
+def compute_customer_segments(conn: sqlite3.Connection, reference_date: str | None = None) -> dict:
+    """Scores RFM y segmento de todos los clientes con una sola pasada sobre orders.
+
+    Las métricas por cliente salen de un único GROUP BY sobre orders; los
+    quintiles se calculan con rankings de numpy en vez de tres NTILE() de
+    SQL, que ordenarían el resultado completo una vez por cada score.
+    """
+    rows = conn.execute(CUSTOMER_RFM_QUERY, (reference_date,)).fetchall()
+    total = len(rows)
+    recency = np.fromiter((row[4] if row[4] is not None else -1 for row in rows), dtype=np.int64, count=total)
+    frequency = np.fromiter((row[5] for row in rows), dtype=np.int64, count=total)
+    monetary = np.fromiter((row[6] for row in rows), dtype=np.float64, count=total)
+
+    scores = np.zeros((3, total), dtype=np.int64)
+    buyers = np.flatnonzero(recency >= 0)
+    # recencia: menos días desde el último pedido es mejor score
+    scores[0, buyers] = _quintiles(-recency[buyers])
+    scores[1, buyers] = _quintiles(frequency[buyers])
+    scores[2, buyers] = _quintiles(monetary[buyers])
+
+    customers = []
+    summary: dict[str, dict] = {}
+    for row, r, f, m in zip(rows, *(scores.tolist())):
+        segment = rfm_segment(r, f, m)
+        customers.append((*row, r, f, m, segment))
+        entry = summary.setdefault(segment, {"customers": 0, "recency_days": 0, "frequency": 0, "monetary": 0.0})
+        entry["customers"] += 1
+        entry["recency_days"] += row[4] or 0
+        entry["frequency"] += row[5]
+        entry["monetary"] += row[6]
+
+    segments = {}
+    for segment, entry in sorted(summary.items(), key=lambda item: -item[1]["monetary"]):
+        n = entry["customers"]
+        segments[segment] = {
+            "customers": n,
+            "share": round(n / total, 4) if total else 0,
+            "avg_recency_days": round(entry["recency_days"] / n, 1) if segment != "Sin compras" else None,
+            "avg_frequency": round(entry["frequency"] / n, 2),
+            "avg_monetary": round(entry["monetary"] / n, 2),
+            "total_monetary": round(entry["monetary"], 2),
+        }
+    customers.sort(key=lambda customer: -customer[6])
+    return {"total_customers": total, "segments": segments, "customers": customers}
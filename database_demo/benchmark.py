@@ -0,0 +1,470 @@
+"""Benchmarks de rendimiento del servidor de base de datos.
+
+Uso:
+    python database_demo/benchmark.py --orders 2000000 export
+    python database_demo/benchmark.py --orders 5000000 export --formats csv --batch-sizes 10000
+    python database_demo/benchmark.py --orders 5000000 reports --repeat 5
+    python database_demo/benchmark.py --orders 2000000 workers --jobs 16
+    python database_demo/benchmark.py --orders 500000 dashboard --repeat 5
+    python database_demo/benchmark.py --orders 500000 spill --divisor 4
+
+Cada benchmark arma (o reutiliza con --db) una base sintética con el schema
+del servidor y el volumen pedido, y escribe un reporte JSON.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from database_server import CompleteDatabaseMCP
+from export import export_cursor, pa
+from reports import REPORT_PIPELINES, build_report
+from workers import query_to_json
+from client import DEFAULT_CLIENT_CONFIG, SERVER_SCRIPT, DatabaseClient
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def build_dataset(db_path: str, orders: int, users: int | None = None, products: int | None = None) -> dict:
+    """Crea la base con el schema del servidor y la llena con pedidos sintéticos"""
+    server = CompleteDatabaseMCP(db_path)
+    server.default_tenant.catalog.close()
+    users = users or max(orders // 20, 10)
+    products = products or max(orders // 100, 10)
+
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    if existing < orders:
+        start = time.perf_counter()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("""
+            INSERT INTO users (name, email, age, country, is_active)
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            SELECT 'Usuario ' || i, 'usuario' || i || '@example.com', 18 + i % 60,
+                   CASE i % 5 WHEN 0 THEN 'España' WHEN 1 THEN 'México' WHEN 2 THEN 'Argentina'
+                               WHEN 3 THEN 'Chile' ELSE 'Colombia' END,
+                   i % 10 != 0
+            FROM n
+        """, (users,))
+        conn.execute("""
+            INSERT INTO products (name, category, price, cost, stock, supplier)
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            SELECT 'Producto ' || i,
+                   CASE i % 4 WHEN 0 THEN 'Electronics' WHEN 1 THEN 'Furniture'
+                               WHEN 2 THEN 'Appliances' ELSE 'Books' END,
+                   round(5 + (abs(random()) % 200000) / 100.0, 2), NULL, abs(random()) % 100,
+                   'Proveedor ' || (i % 50)
+            FROM n
+        """, (products,))
+        conn.execute("""
+            INSERT INTO orders (user_id, order_date, total_amount, status, shipping_country)
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            SELECT 1 + abs(random()) % ?, date('2023-01-01', '+' || (abs(random()) % 730) || ' days'),
+                   round(10 + (abs(random()) % 300000) / 100.0, 2),
+                   CASE abs(random()) % 10 WHEN 0 THEN 'pending' WHEN 1 THEN 'cancelled'
+                                           WHEN 2 THEN 'shipped' ELSE 'completed' END,
+                   'España'
+            FROM n
+        """, (orders - existing, users))
+        conn.commit()
+        print(f"dataset: {orders - existing} pedidos generados en {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("users", "products", "orders")
+    }
+    conn.close()
+    return counts
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_isolated(func, *args) -> dict:
+    """Ejecuta func en un proceso aparte para medir su pico de memoria sin arrastrar el de otros casos"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+# --- export_query -------------------------------------------------------------
+
+EXPORT_QUERY = """
+    SELECT o.id, o.user_id, u.name, u.country, o.order_date, o.total_amount, o.status
+    FROM orders o JOIN users u ON u.id = o.user_id
+"""
+
+
+def _export_case(db_path: str, output: str, fmt: str, batch_size: int) -> dict:
+    baseline = _peak_rss_mb()
+    conn = sqlite3.connect(db_path)
+    try:
+        result = export_cursor(conn.execute(EXPORT_QUERY), output, fmt, batch_size)
+    finally:
+        conn.close()
+    os.remove(output)
+    return {
+        "format": fmt,
+        "batch_size": batch_size,
+        "rows": result["rows"],
+        "seconds": result["seconds"],
+        "rows_per_second": result["rows_per_second"],
+        "mb_per_second": round(result["bytes"] / 1e6 / result["seconds"], 1) if result["seconds"] else None,
+        "file_mb": round(result["bytes"] / 1e6, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+    }
+
+
+def _fetch_case(db_path: str, batch_size: int) -> dict:
+    """Techo de referencia: solo recorrer el cursor con fetchmany, sin escribir nada"""
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    rows = 0
+    try:
+        cursor = conn.execute(EXPORT_QUERY)
+        while batch := cursor.fetchmany(batch_size):
+            rows += len(batch)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "format": "fetch only",
+        "batch_size": batch_size,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed),
+    }
+
+
+def _json_case(db_path: str) -> dict:
+    """Lo que costaba antes sacar el mismo extracto: fetchall + json.dumps como execute_query"""
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        data = [dict(row) for row in conn.execute(EXPORT_QUERY).fetchall()]
+        text = json.dumps(data, indent=2, default=str)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "format": "json (execute_query)",
+        "rows": len(data),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(len(data) / elapsed),
+        "mb_per_second": round(len(text) / 1e6 / elapsed, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+    }
+
+
+def bench_export(args) -> dict:
+    formats = [fmt for fmt in args.formats if fmt != "arrow" or pa is not None]
+    results = [_run_isolated(_fetch_case, args.db, max(args.batch_sizes))]
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            for batch_size in args.batch_sizes:
+                output = os.path.join(tmp, f"bench.{fmt}")
+                results.append(_run_isolated(_export_case, args.db, output, fmt, batch_size))
+                print(json.dumps(results[-1]), file=sys.stderr)
+    if args.baseline:
+        results.append(_run_isolated(_json_case, args.db))
+    report = {"benchmark": "export", "dataset": args.dataset, "results": results}
+    if "arrow" in args.formats and pa is None:
+        report["skipped"] = "arrow (pyarrow no instalado)"
+    return report
+
+
+# --- generate_business_report -------------------------------------------------
+
+# Consultas de resumen que antes se ejecutaban después del desglose, cada una
+# con su propio recorrido de la tabla
+LEGACY_SUMMARY_QUERIES = {
+    "sales": """
+        SELECT SUM(total_amount) as total_revenue, COUNT(*) as total_orders, AVG(total_amount) as avg_order_value
+        FROM orders WHERE status IN ('completed', 'shipped')
+    """,
+    "customers": """
+        SELECT COUNT(*) as total_customers, SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_customers
+        FROM users
+    """,
+    "products": """
+        SELECT COUNT(*) as total_products, COUNT(CASE WHEN stock < 10 THEN 1 END) as low_stock_count,
+               AVG(price) as avg_price
+        FROM products
+    """,
+}
+
+
+def _legacy_report(conn: sqlite3.Connection, report_type: str) -> dict:
+    """Desglose y resumen como consultas separadas y sin transacción, como antes"""
+    breakdown = conn.execute(REPORT_PIPELINES[report_type]["query"]).fetchall()
+    summary = conn.execute(LEGACY_SUMMARY_QUERIES[report_type]).fetchone()
+    return {"breakdown": breakdown, "summary": summary}
+
+
+def _table_scans(conn: sqlite3.Connection, queries: list[str]) -> int:
+    return sum(
+        1 for query in queries
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")
+        if row[3].startswith("SCAN") and "CONSTANT" not in row[3]
+    )
+
+
+def bench_reports(args) -> dict:
+    conn = sqlite3.connect(args.db)
+    results = []
+    for report_type, pipeline in REPORT_PIPELINES.items():
+        timings = {"legacy": [], "pipeline": []}
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _legacy_report(conn, report_type)
+            timings["legacy"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            build_report(conn, report_type)
+            timings["pipeline"].append(time.perf_counter() - start)
+        legacy, single = min(timings["legacy"]), min(timings["pipeline"])
+        results.append({
+            "report_type": report_type,
+            "legacy_scans": _table_scans(conn, [pipeline["query"], LEGACY_SUMMARY_QUERIES[report_type]]),
+            "pipeline_scans": _table_scans(conn, [pipeline["query"]]),
+            "legacy_ms": round(legacy * 1000, 2),
+            "pipeline_ms": round(single * 1000, 2),
+            "speedup": round(legacy / single, 2) if single else None,
+        })
+        print(json.dumps(results[-1]), file=sys.stderr)
+    conn.close()
+    return {"benchmark": "reports", "dataset": args.dataset, "repeat": args.repeat, "results": results}
+
+
+# --- carril de procesos -------------------------------------------------------
+
+WORKERS_QUERY = "SELECT id, user_id, order_date, total_amount, status FROM orders WHERE id % ? = 0"
+
+
+def _serialize_job(db_path: str, divisor: int) -> int:
+    """Una llamada pesada de execute_query: filas a dicts + json.dumps, en el hilo o proceso que la ejecute"""
+    query = WORKERS_QUERY.replace("?", str(divisor))
+    rows, payload = query_to_json(db_path, query, 600.0, 1 << 20)
+    return rows
+
+
+def bench_workers(args) -> dict:
+    cpus = os.cpu_count() or 1
+    levels = sorted({1, 2, 4, 8, cpus} & set(range(1, max(cpus, args.max_workers) + 1)))
+    results = []
+    for executor_type in ("threads", "processes"):
+        for workers in levels:
+            if executor_type == "threads":
+                executor = ThreadPoolExecutor(workers)
+            else:
+                executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                # calentar los workers para no medir el arranque de los procesos
+                list(executor.map(_serialize_job, [args.db] * workers, [10 ** 9] * workers))
+            with executor:
+                start = time.perf_counter()
+                rows = sum(executor.map(_serialize_job, [args.db] * args.jobs, [args.divisor] * args.jobs))
+                elapsed = time.perf_counter() - start
+            results.append({
+                "executor": executor_type,
+                "workers": workers,
+                "jobs": args.jobs,
+                "seconds": round(elapsed, 3),
+                "jobs_per_second": round(args.jobs / elapsed, 2),
+                "rows_per_second": round(rows / elapsed),
+            })
+            print(json.dumps(results[-1]), file=sys.stderr)
+    return {"benchmark": "workers", "dataset": args.dataset, "cpu_count": cpus, "results": results}
+
+
+# --- dashboard end-to-end ----------------------------------------------------
+
+# Las llamadas del demo: KPIs, preguntas de negocio, reportes e insights
+DASHBOARD_CALLS = (
+    [("get_kpis", {})]
+    + [("ask_business_question", {"question": question}) for question in
+       ("mejores clientes", "productos más vendidos", "ventas por país", "clientes inactivos", "inventario bajo")]
+    + [("generate_business_report", {"report_type": report_type, "period": "month"})
+       for report_type in REPORT_PIPELINES]
+    + [("find_insights", {"focus_area": area}) for area in ("sales", "customers", "products", "all")]
+    + [("get_inventory_alerts", {})]
+)
+
+# sin el cache persistente del servidor: se mide el cálculo, no el hit
+DASHBOARD_SERVER_ENV = {"MCP_RESULT_CACHE": json.dumps({"enabled": False})}
+
+
+def _legacy_decode(text: str):
+    """Cómo el demo original recuperaba los datos: buscar '[' o '{' y volver a parsear"""
+    for marker in ("[", "{"):
+        start = text.find(marker)
+        if start != -1:
+            try:
+                return json.loads(text[start:])
+            except ValueError:
+                continue
+    return text
+
+
+async def _dashboard_sequential(db_path: str, repeat: int) -> list[float]:
+    params = StdioServerParameters(
+        command=sys.executable, args=[SERVER_SCRIPT],
+        env={**os.environ, "MCP_DB_PATH": db_path, **DASHBOARD_SERVER_ENV}
+    )
+    timings = []
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for tool, arguments in DASHBOARD_CALLS:
+                    result = await session.call_tool(tool, arguments)
+                    _legacy_decode(result.content[0].text)
+                timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def _dashboard_client(db_path: str, repeat: int, cache: bool) -> tuple[list[float], dict]:
+    config = {"cache_entries": DEFAULT_CLIENT_CONFIG["cache_entries"] if cache else 0}
+    timings = []
+    async with DatabaseClient.connect(db_path, config, env=DASHBOARD_SERVER_ENV) as client:
+        if cache:
+            # primera pasada: llena el cache del cliente
+            await client.call_many(DASHBOARD_CALLS)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await client.call_many(DASHBOARD_CALLS)
+            timings.append(time.perf_counter() - start)
+        return timings, client.cache_stats()
+
+
+def bench_dashboard(args) -> dict:
+    modes = {
+        "sequential": lambda: _dashboard_sequential(args.db, args.repeat),
+        "pipelined": lambda: _dashboard_client(args.db, args.repeat, cache=False),
+        "pipelined_cached": lambda: _dashboard_client(args.db, args.repeat, cache=True),
+    }
+    results = []
+    for mode, run in modes.items():
+        outcome = asyncio.run(run())
+        timings, cache_stats = outcome if isinstance(outcome, tuple) else (outcome, None)
+        results.append({
+            "mode": mode,
+            "calls": len(DASHBOARD_CALLS),
+            "best_ms": round(min(timings) * 1000, 1),
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 1),
+            "client_cache": cache_stats,
+        })
+        print(json.dumps(results[-1]), file=sys.stderr)
+    return {"benchmark": "dashboard", "dataset": args.dataset, "repeat": args.repeat, "results": results}
+
+
+# --- spill de resultados grandes ---------------------------------------------
+
+async def _spill_run(db_path: str, divisor: int, spill: bool) -> dict:
+    """Una consulta grande y, mientras tanto, llamadas chicas cada 10 ms midiendo su latencia"""
+    env = {
+        **DASHBOARD_SERVER_ENV,
+        "MCP_SPILL": json.dumps({"enabled": spill}),
+        "MCP_ADMISSION_POLICY": json.dumps({"on_expensive": "queue"}),
+        "MCP_PROCESS_POOL": json.dumps({"workers": 0}),
+    }
+    query = WORKERS_QUERY.replace("?", str(divisor))
+    async with DatabaseClient.connect(db_path, {"cache_entries": 0}, env=env) as client:
+        latencies = []
+        done = asyncio.Event()
+
+        async def small_calls():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.call("get_data_version")
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        probe = asyncio.ensure_future(small_calls())
+        result = await client.call("execute_query", {"query": query})
+        response = time.perf_counter() - start
+        rows = await client.load(result)
+        total = time.perf_counter() - start
+        done.set()
+        await probe
+
+    latencies.sort()
+    return {
+        "mode": "spill" if spill else "inline",
+        "rows": len(rows),
+        "response_s": round(response, 3),
+        "total_s": round(total, 3),
+        "small_calls": len(latencies),
+        "small_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "small_max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def bench_spill(args) -> dict:
+    results = []
+    for spill in (False, True):
+        results.append(asyncio.run(_spill_run(args.db, args.divisor, spill)))
+        print(json.dumps(results[-1]), file=sys.stderr)
+    return {"benchmark": "spill", "dataset": args.dataset, "results": results}
+
+
+# --- main ---------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del servidor MCP de base de datos")
+    parser.add_argument("--db", help="Base a usar (por defecto una temporal)")
+    parser.add_argument("--orders", type=int, default=2_000_000, help="Pedidos del dataset sintético")
+    parser.add_argument("--output", help="Guardar el reporte JSON en este archivo")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Throughput de export_query")
+    export_parser.add_argument("--formats", nargs="+", default=["csv", "arrow"])
+    export_parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    export_parser.add_argument("--baseline", action="store_true",
+                               help="Medir también fetchall + json.dumps como execute_query")
+    export_parser.set_defaults(run=bench_export)
+
+    reports_parser = subparsers.add_parser("reports", help="Reportes de un recorrido frente a desglose + resumen")
+    reports_parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mejor)")
+    reports_parser.set_defaults(run=bench_reports)
+
+    workers_parser = subparsers.add_parser("workers", help="Escalado del carril de procesos frente a hilos")
+    workers_parser.add_argument("--jobs", type=int, default=16, help="Llamadas pesadas concurrentes")
+    workers_parser.add_argument("--divisor", type=int, default=20, help="Cada llamada devuelve 1 de cada N pedidos")
+    workers_parser.add_argument("--max-workers", type=int, default=8)
+    workers_parser.set_defaults(run=bench_workers)
+
+    dashboard_parser = subparsers.add_parser("dashboard", help="Dashboard del demo: secuencial frente a cliente en pipeline")
+    dashboard_parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se reporta la mejor y la media)")
+    dashboard_parser.set_defaults(run=bench_dashboard)
+
+    spill_parser = subparsers.add_parser("spill", help="Resultado grande en línea frente a recurso paginado")
+    spill_parser.add_argument("--divisor", type=int, default=4, help="La consulta devuelve 1 de cada N pedidos")
+    spill_parser.set_defaults(run=bench_spill)
+
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        args.db = args.db or os.path.join(tmp, "benchmark.db")
+        args.dataset = build_dataset(args.db, args.orders)
+        report = args.run(args)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import sqlite3
+import threading
+import time
+
+
+COUNTS_TABLE = "_catalog_counts"
+
+
+class CatalogCache:
+    """Cache del catálogo: conteo de filas, schema y tamaño en disco por tabla.
+
+    - Los conteos se mantienen con triggers AFTER INSERT/DELETE que actualizan
+      la tabla _catalog_counts, así que leerlos no recorre las tablas. Si no se
+      pueden instalar los triggers (BD de solo lectura) se usan las estimaciones
+      de sqlite_stat1 o MAX(rowid), marcadas como estimaciones.
+    - El schema se cachea hasta que cambia PRAGMA schema_version (DDL).
+    - Páginas y bytes por tabla salen de dbstat (una pasada por todas las
+      páginas): se miden en un hilo aparte, con su propia conexión, al instalar
+      y después cuando cambió PRAGMA data_version y pasó size_refresh_seconds.
+      Mientras tanto se sirve la última medición (pendiente hasta la primera).
+    """
+
+    def __init__(self, db_path: str, size_refresh_seconds: float = 60.0):
+        self.db_path = db_path
+        self.size_refresh_seconds = size_refresh_seconds
+        self._conn = None
+        self._lock = threading.Lock()
+        self._schema_version = None
+        self._tables: list[str] = []
+        self._schemas: dict[str, list[dict]] = {}
+        self._sizes: dict[str, dict] = {}
+        self._sizes_measured_at = 0.0
+        self._sizes_data_version = None
+        self._sizes_refresh: threading.Thread | None = None
+        self.counters_installed = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- mantenimiento ----------------------------------------------------
+
+    def _user_tables(self, conn: sqlite3.Connection) -> list[str]:
+        """Tablas reales de main (sin internas con prefijo "_", vistas, virtuales ni shadow)"""
+        rows = conn.execute("PRAGMA main.table_list").fetchall()
+        return sorted(
+            name for schema, name, kind, *_ in rows
+            if kind == "table" and not name.startswith(("sqlite_", "_"))
+        )
+
+    def _install_counters(self, conn: sqlite3.Connection):
+        """Crea la tabla de conteos y los triggers de las tablas que aún no los tienen"""
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {COUNTS_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            )
+        """)
+        tracked = {row[0] for row in conn.execute(f"SELECT table_name FROM {COUNTS_TABLE}")}
+        for table in self._tables:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS "_catalog_ai_{table}" AFTER INSERT ON "{table}"
+                BEGIN
+                    UPDATE {COUNTS_TABLE} SET row_count = row_count + 1 WHERE table_name = '{table}';
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS "_catalog_ad_{table}" AFTER DELETE ON "{table}"
+                BEGIN
+                    UPDATE {COUNTS_TABLE} SET row_count = row_count - 1 WHERE table_name = '{table}';
+                END
+            """)
+            if table not in tracked:
+                # único recorrido completo: sembrar el contador
+                conn.execute(
+                    f'INSERT INTO {COUNTS_TABLE} (table_name, row_count) SELECT ?, COUNT(*) FROM "{table}"',
+                    (table,)
+                )
+        placeholders = ", ".join("?" for _ in self._tables)
+        conn.execute(f"DELETE FROM {COUNTS_TABLE} WHERE table_name NOT IN ({placeholders})", self._tables)
+        conn.commit()
+
+    def _refresh_schema(self, conn: sqlite3.Connection):
+        """Recarga tablas y triggers si hubo DDL desde la última lectura"""
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if schema_version == self._schema_version:
+            return
+        self._tables = self._user_tables(conn)
+        self._schemas = {}
+        self._sizes_data_version = None
+        try:
+            self._install_counters(conn)
+            self.counters_installed = True
+        except sqlite3.OperationalError:
+            conn.rollback()
+            self.counters_installed = False
+        # instalar triggers cambia schema_version: se relee después
+        self._schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def install(self):
+        """Instala los contadores y lanza la primera medición de tamaños; se llama al inicializar la base de datos"""
+        with self._lock:
+            self._schema_version = None
+            conn = self._connection()
+            self._refresh_schema(conn)
+            self._start_size_refresh(conn.execute("PRAGMA data_version").fetchone()[0])
+
+    # --- consultas --------------------------------------------------------
+
+    def tables(self) -> list[str]:
+        with self._lock:
+            self._refresh_schema(self._connection())
+            return list(self._tables)
+
+    def table_schema(self, table_name: str) -> list[dict] | None:
+        """Columnas de la tabla desde cache; None si la tabla no existe"""
+        with self._lock:
+            conn = self._connection()
+            self._refresh_schema(conn)
+            if table_name not in self._tables:
+                return None
+            if table_name not in self._schemas:
+                self._schemas[table_name] = [
+                    {
+                        "column_id": column[0],
+                        "name": column[1],
+                        "type": column[2],
+                        "not_null": bool(column[3]),
+                        "default_value": column[4],
+                        "primary_key": bool(column[5])
+                    }
+                    for column in conn.execute(f'PRAGMA table_info("{table_name}")')
+                ]
+            return self._schemas[table_name]
+
+    def row_counts(self, exact: bool = False) -> dict[str, dict]:
+        """Conteo por tabla con su fuente: counter, exact, sqlite_stat1 (estimación) o max_rowid (estimación)"""
+        with self._lock:
+            conn = self._connection()
+            self._refresh_schema(conn)
+            if exact:
+                return self._exact_counts(conn)
+            if self.counters_installed:
+                counts = dict(conn.execute(f"SELECT table_name, row_count FROM {COUNTS_TABLE}"))
+                return {
+                    table: {"row_count": counts.get(table, 0), "row_count_source": "counter"}
+                    for table in self._tables
+                }
+            return self._estimated_counts(conn)
+
+    def _exact_counts(self, conn: sqlite3.Connection) -> dict[str, dict]:
+        """Recuenta con COUNT(*) y resincroniza los contadores (corrige derivas, p.ej. por REPLACE)"""
+        result = {}
+        for table in self._tables:
+            count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            result[table] = {"row_count": count, "row_count_source": "exact"}
+            if self.counters_installed:
+                conn.execute(f"UPDATE {COUNTS_TABLE} SET row_count = ? WHERE table_name = ?", (count, table))
+        if self.counters_installed:
+            conn.commit()
+        return result
+
+    def _estimated_counts(self, conn: sqlite3.Connection) -> dict[str, dict]:
+        stat1 = {}
+        has_stat1 = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if has_stat1:
+            for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                if stat:
+                    stat1.setdefault(table, int(stat.split()[0]))
+        result = {}
+        for table in self._tables:
+            if table in stat1:
+                result[table] = {"row_count": stat1[table], "row_count_source": "sqlite_stat1 (estimate)"}
+            else:
+                max_rowid = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0]
+                result[table] = {"row_count": max_rowid or 0, "row_count_source": "max_rowid (estimate)"}
+        return result
+
+    def estimate_rows(self, conn: sqlite3.Connection, table: str) -> int:
+        """Estimador de filas para el control de admisión"""
+        counts = self.row_counts()
+        if table in counts:
+            return counts[table]["row_count"]
+        try:
+            row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+            return int(row[0] or 0)
+        except sqlite3.Error:
+            return 1000
+
+    def data_version(self) -> int:
+        """PRAGMA data_version de la conexión del catálogo: cambia con cada commit de otra conexión"""
+        with self._lock:
+            return self._connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def sizes(self) -> tuple[dict[str, dict], dict]:
+        """Páginas y bytes por tabla (incluye sus índices) más totales del archivo, de la última medición"""
+        with self._lock:
+            conn = self._connection()
+            self._refresh_schema(conn)
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            # tras un DDL (_sizes_data_version en None) se vuelve a medir sin esperar el intervalo
+            stale = self._sizes_data_version is None or (
+                self._sizes_data_version != data_version
+                and time.time() - self._sizes_measured_at >= self.size_refresh_seconds
+            )
+            if stale:
+                self._start_size_refresh(data_version)
+
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            database = {
+                "page_size": page_size,
+                "page_count": page_count,
+                "file_bytes": page_size * page_count,
+                "sizes_measured_at": _format_timestamp(self._sizes_measured_at),
+                "sizes_pending": not self._sizes_measured_at,
+                "sizes_refreshing": self._sizes_refresh is not None,
+            }
+            return self._sizes, database
+
+    def _start_size_refresh(self, data_version: int):
+        """Lanza la medición de tamaños si no hay una en curso (con el lock tomado)"""
+        if self._sizes_refresh is not None:
+            return
+        # dbstat recorre todas las páginas: se mide fuera de la llamada
+        self._sizes_refresh = threading.Thread(
+            target=self._refresh_sizes, args=(data_version, list(self._tables)), daemon=True
+        )
+        self._sizes_refresh.start()
+
+    def _refresh_sizes(self, data_version: int, tables: list[str]):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                sizes = _measure_sizes(conn, tables)
+            finally:
+                conn.close()
+            with self._lock:
+                self._sizes = sizes
+                self._sizes_measured_at = time.time()
+                self._sizes_data_version = data_version
+        except sqlite3.Error:
+            pass
+        finally:
+            self._sizes_refresh = None
+
+
+def _measure_sizes(conn: sqlite3.Connection, tables: list[str]) -> dict[str, dict]:
+    owners = dict(conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"
+    ))
+    sizes: dict[str, dict] = {}
+    try:
+        rows = conn.execute(
+            "SELECT name, pageno, pgsize FROM dbstat WHERE aggregate = TRUE"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # SQLite compilado sin SQLITE_ENABLE_DBSTAT_VTAB
+        return sizes
+    for name, pages, size in rows:
+        table = owners.get(name, name)
+        if table not in tables:
+            continue
+        entry = sizes.setdefault(table, {"pages": 0, "bytes": 0})
+        entry["pages"] += pages
+        entry["bytes"] += size
+    return sizes
+
+
+def _format_timestamp(timestamp: float) -> str | None:
+    if not timestamp:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
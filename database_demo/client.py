@@ -0,0 +1,301 @@
+"""Cliente asíncrono para el servidor MCP de base de datos.
+
+    async with DatabaseClient.connect() as client:
+        kpis = await client.kpis()
+        reports = await client.call_many([
+            ("generate_business_report", {"report_type": t, "period": "month"})
+            for t in ("sales", "customers", "products")
+        ])
+
+Las llamadas concurrentes comparten una sola sesión stdio: se envían sin
+esperar la respuesta de la anterior (hasta max_in_flight a la vez) y el
+servidor las atiende en paralelo. Los datos llegan en structuredContent, sin
+buscar el JSON dentro del texto; si el servidor materializó un resultado
+grande, load() lo lee por páginas con resources/read. Los resultados de herramientas de solo
+lectura se guardan en un cache LRU del cliente junto con el data_version con
+que se calcularon, y se sirven mientras el servidor informe esa misma versión.
+"""
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from result_cache import cache_key
+
+
+# Configuración por defecto del cliente; se sobreescribe con el argumento
+# config o la variable de entorno MCP_CLIENT (JSON).
+DEFAULT_CLIENT_CONFIG = {
+    "max_in_flight": 16,       # llamadas pendientes a la vez sobre la sesión
+    "cache_entries": 256,      # resultados guardados en el cache del cliente (0 lo desactiva)
+    "version_ttl": 1.0,        # segundos que se confía en el último data_version sin volver a consultarlo
+}
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_server.py")
+
+
+class ToolError(Exception):
+    """La herramienta respondió con un error"""
+
+
+@dataclass
+class ToolResult:
+    tool: str
+    text: str                       # encabezado (o la respuesta completa si no trae JSON)
+    data: Any = None                # JSON de la respuesta ya decodificado
+    data_version: str | None = None
+    cached: bool = False
+    seconds: float = 0.0
+
+    @property
+    def is_error(self) -> bool:
+        return self.text.startswith(("Error", "Consulta rechazada", "Exportación rechazada"))
+
+    @property
+    def spill(self) -> dict | None:
+        """Descriptor del recurso si el servidor materializó el resultado en vez de enviarlo en línea"""
+        if isinstance(self.data, dict) and self.data.get("spilled"):
+            return self.data
+        return None
+
+
+@dataclass
+class _VersionState:
+    version: str | None = None
+    observed_at: float = 0.0        # cuándo se envió la llamada que la informó
+    probe: asyncio.Task | None = field(default=None, repr=False)
+
+
+class DatabaseClient:
+    """Cliente tipado del servidor sobre una ClientSession ya inicializada"""
+
+    def __init__(self, session: ClientSession, config: dict | None = None, tenant: str | None = None):
+        self.session = session
+        self.tenant = tenant
+        self.config = dict(DEFAULT_CLIENT_CONFIG)
+        env_config = os.environ.get("MCP_CLIENT")
+        if env_config:
+            self.config.update(json.loads(env_config))
+        if config:
+            self.config.update(config)
+        self._in_flight = asyncio.Semaphore(self.config["max_in_flight"])
+        self._cache: OrderedDict[str, ToolResult] = OrderedDict()
+        self._cacheable: set[str] | None = None
+        self._version = _VersionState()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def connect(cls, db_path: str | None = None, config: dict | None = None,
+                      tenant: str | None = None, env: dict | None = None):
+        """Lanza el servidor por stdio y devuelve un cliente conectado"""
+        server_env = dict(os.environ)
+        if db_path:
+            server_env["MCP_DB_PATH"] = db_path
+        server_env.update(env or {})
+        params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], env=server_env)
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                client = cls(session, config, tenant)
+                await client.list_tools()
+                yield client
+
+    # --- llamadas ---------------------------------------------------------
+
+    async def list_tools(self) -> list:
+        result = await self.session.list_tools()
+        # solo se cachean las herramientas que el servidor marca como de solo lectura e idempotentes
+        self._cacheable = {
+            tool.name for tool in result.tools
+            if tool.annotations and tool.annotations.readOnlyHint and tool.annotations.idempotentHint
+        }
+        return result.tools
+
+    async def call(self, tool: str, arguments: dict | None = None, use_cache: bool = True) -> ToolResult:
+        """Llama a la herramienta; se puede usar desde muchas tareas a la vez"""
+        arguments = dict(arguments or {})
+        if self.tenant:
+            arguments["tenant"] = self.tenant
+        cacheable = (
+            use_cache and self.config["cache_entries"] > 0
+            and self._cacheable is not None and tool in self._cacheable
+        )
+        key = cache_key(tool, arguments) if cacheable else None
+
+        if cacheable and key in self._cache:
+            version = await self.data_version()
+            entry = self._cache.get(key)
+            if entry is not None and version is not None and entry.data_version == version:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return ToolResult(entry.tool, entry.text, entry.data, entry.data_version, cached=True)
+
+        if cacheable:
+            self.misses += 1
+        result = await self._send(tool, arguments)
+        # un resultado materializado vence en el servidor: no se guarda el descriptor
+        if cacheable and not result.is_error and result.data_version is not None and result.spill is None:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.config["cache_entries"]:
+                self._cache.popitem(last=False)
+        return result
+
+    async def call_many(self, calls: list[tuple[str, dict | None]], use_cache: bool = True) -> list[ToolResult]:
+        """Envía todas las llamadas en pipeline y devuelve los resultados en el mismo orden"""
+        return list(await asyncio.gather(*(self.call(tool, arguments, use_cache) for tool, arguments in calls)))
+
+    async def _send(self, tool: str, arguments: dict) -> ToolResult:
+        async with self._in_flight:
+            sent_at = time.monotonic()
+            result = await self.session.call_tool(tool, {**arguments, "_structured": True})
+        seconds = time.monotonic() - sent_at
+
+        data_version = (result.meta or {}).get("data_version")
+        self._observe_version(data_version, sent_at)
+        text = "".join(getattr(content, "text", "") for content in result.content)
+        if result.isError:
+            return ToolResult(tool, text or "Error", None, data_version, seconds=seconds)
+        structured = result.structuredContent or {}
+        return ToolResult(tool, structured.get("header", text), structured.get("data"), data_version,
+                          seconds=seconds)
+
+    # --- resultados materializados ---------------------------------------
+
+    async def read_resource(self, uri: str) -> tuple[str | bytes, dict]:
+        """Una página de un recurso del servidor: (contenido, _meta con la página siguiente)"""
+        async with self._in_flight:
+            result = await self.session.read_resource(uri)
+        content = result.contents[0]
+        data = content.text if hasattr(content, "text") else base64.b64decode(content.blob)
+        return data, content.meta or {}
+
+    async def read_rows(self, descriptor: dict, page_rows: int | None = None) -> list:
+        """Todas las filas de un resultado materializado, leyendo las páginas en pipeline"""
+        total = descriptor["rows"]
+        page_rows = page_rows or max(total // self.config["max_in_flight"], 1)
+        uri = descriptor["resource"]
+
+        async def read_range(start: int, stop: int) -> list:
+            rows = []
+            while start < stop:
+                text, meta = await self.read_resource(f"{uri}?rows={start}:{stop}")
+                rows.extend(json.loads(line) for line in text.splitlines())
+                # el servidor recorta las páginas grandes: se pide lo que faltó
+                start = meta["rows"][1]
+            return rows
+
+        pages = await asyncio.gather(*(
+            read_range(start, min(start + page_rows, total)) for start in range(0, total, page_rows)
+        ))
+        return [row for page in pages for row in page]
+
+    async def read_bytes(self, descriptor: dict) -> bytes:
+        """Contenido completo de un recurso (p. ej. una exportación) por rangos de bytes"""
+        chunks = []
+        uri = descriptor["pages"]["bytes"]
+        while uri:
+            data, meta = await self.read_resource(uri)
+            chunks.append(data if isinstance(data, bytes) else data.encode("utf-8"))
+            uri = meta.get("next")
+        return b"".join(chunks)
+
+    async def load(self, result: ToolResult) -> Any:
+        """Datos del resultado; si se materializó, los trae del recurso y rearma la respuesta original"""
+        descriptor = result.spill
+        if descriptor is None:
+            return result.data if result.data is not None else result.text
+        if descriptor["rows"] is None:
+            return json.loads(await self.read_bytes(descriptor))
+        rows = await self.read_rows(descriptor)
+        inline = dict(descriptor.get("inline") or {})
+        rows_key = inline.pop("rows_key", None)
+        return {**inline, rows_key: rows} if rows_key else rows
+
+    # --- data_version -----------------------------------------------------
+
+    def _observe_version(self, version: str | None, sent_at: float):
+        # con llamadas en pipeline una respuesta vieja puede llegar después de una nueva
+        if version is not None and sent_at >= self._version.observed_at:
+            self._version.version = version
+            self._version.observed_at = sent_at
+
+    async def data_version(self, refresh: bool = False) -> str | None:
+        """Último data_version del servidor; se vuelve a consultar si tiene más de version_ttl segundos"""
+        state = self._version
+        fresh = time.monotonic() - state.observed_at <= self.config["version_ttl"]
+        if state.version is not None and fresh and not refresh:
+            return state.version
+        if state.probe is None:
+            # una sola consulta en curso aunque muchas llamadas la necesiten a la vez
+            state.probe = asyncio.ensure_future(self._send("get_data_version", self._tenant_arguments()))
+            state.probe.add_done_callback(lambda _: setattr(state, "probe", None))
+        await asyncio.shield(state.probe)
+        return state.version
+
+    def _tenant_arguments(self) -> dict:
+        return {"tenant": self.tenant} if self.tenant else {}
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def cache_stats(self) -> dict:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    # --- herramientas -----------------------------------------------------
+
+    async def _data(self, tool: str, arguments: dict | None = None) -> Any:
+        result = await self.call(tool, arguments)
+        if result.is_error:
+            raise ToolError(result.text)
+        return await self.load(result)
+
+    async def kpis(self) -> dict:
+        return await self._data("get_kpis")
+
+    async def ask(self, question: str) -> list[dict]:
+        return await self._data("ask_business_question", {"question": question})
+
+    async def business_report(self, report_type: str = "sales", period: str = "month") -> dict:
+        return await self._data("generate_business_report", {"report_type": report_type, "period": period})
+
+    async def insights(self, focus_area: str = "all") -> list[str]:
+        text = await self._data("find_insights", {"focus_area": focus_area})
+        return [line[2:] for line in text.splitlines() if line.startswith("• ")]
+
+    async def sales_analytics(self, period: str = "month") -> dict:
+        return await self._data("get_sales_analytics", {"period": period})
+
+    async def sales_trends(self, granularity: str = "week", group_by: str = "category", **options) -> dict:
+        return await self._data("get_sales_trends", {"granularity": granularity, "group_by": group_by, **options})
+
+    async def customer_insights(self) -> dict:
+        return await self._data("get_customer_insights")
+
+    async def customer_segments(self, segment: str | None = None, **options) -> dict:
+        arguments = {"segment": segment, **options} if segment else options
+        return await self._data("get_customer_segments", arguments)
+
+    async def inventory_alerts(self, **options) -> dict:
+        return await self._data("get_inventory_alerts", options)
+
+    async def search(self, query: str, entity: str = "all", limit: int = 20) -> dict:
+        return await self._data("search_entities", {"query": query, "entity": entity, "limit": limit})
+
+    async def query(self, sql: str) -> list[dict]:
+        return await self._data("execute_query", {"query": sql})
+
+    async def table_schema(self, table_name: str) -> list[dict]:
+        return await self._data("get_table_schema", {"table_name": table_name})
+
+    async def database_stats(self, exact: bool = False) -> dict:
+        return await self._data("get_database_stats", {"exact": exact})
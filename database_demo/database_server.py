@@ -1,26 +1,162 @@
 import asyncio
+import functools
+import os
 import sqlite3
 import json
+import time
 from typing import Any
 from datetime import datetime, timedelta
 import random
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 import mcp.server.stdio
 import mcp.types as types
+from admission import AdmissionController, AdmissionRejected
+from catalog import CatalogCache
+from snapshots import InteractiveGate, ReportScheduler
+from tracing import TraceRecorder
+from profiling import CallProfiler, profiled, trace_connection
+from reports import build_report
+from result_cache import ResultCache, cache_key, database_fingerprint
+from spill import RowWriter, SpillStore, collect_rows
+from workers import ProcessLane, call_with_connection, decode_payload, query_to_json
+from tenancy import ConnectionPool, TenantManager, TenantState
+from export import EXPORT_MIME_TYPES, export_cursor, export_path
+from search import SEARCH_INDEXES, create_search_indexes, search_entities
+from inventory import (
+    alert_counts, create_inventory_engine, create_order_date_tracking, inventory_alerts, rebuild_inventory,
+    set_threshold
+)
+from partitions import archived_rows, create_partition_registry, install_views, partition_layout, prune
+from analytics import RFM_COLUMNS, compute_customer_segments, compute_sales_trends
+from registry import ToolRegistry, ToolSpec
+from tools import REPORT_TYPES, TOOL_SPECS
+
+SCHEMA_VERSION = 5
+
+def structured_payload(text: str) -> tuple[str, Any] | None:
+    """Separa una respuesta "encabezado + JSON" en (encabezado, datos); None si no trae JSON"""
+    starts = [index for index in (text.find("\n{"), text.find("\n[")) if index != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    try:
+        data = json.loads(text[start + 1:])
+    except ValueError:
+        return None
+    return text[:start].rstrip(), data
+
+TENANT_PROPERTY = {
+    "type": "string",
+    "description": "Base de datos de tenant sobre la que operar (por defecto la base principal)"
+}
 
 class CompleteDatabaseMCP:
-    def __init__(self, db_path: str = "database_demo/mcp_database.db"):
-        self.db_path = db_path
+    def __init__(self, db_path: str = "database_demo/mcp_database.db", admission_policy: dict | None = None,
+                 scheduler_config: dict | None = None, trace_path: str | None = None,
+                 tenants_dir: str | None = None, result_cache_config: dict | None = None,
+                 workers_config: dict | None = None, spill_config: dict | None = None):
         self.server = Server("complete-database-mcp")
+        self.scheduler_config = scheduler_config
+        self.result_cache_config = result_cache_config
+        self.max_concurrent_calls = int(os.environ.get("MCP_TENANT_MAX_CONCURRENT", "4"))
+        self.max_slow_calls = int(os.environ.get("MCP_TENANT_MAX_SLOW", "2"))
+        self.admission = AdmissionController(
+            admission_policy,
+            row_estimator=self._estimate_rows
+        )
+        self.interactive = InteractiveGate()
+        self.tenants = TenantManager(
+            tenants_dir or os.environ.get("MCP_TENANTS_DIR", "database_demo/tenants"),
+            self._open_tenant,
+            max_open=int(os.environ.get("MCP_MAX_OPEN_TENANTS", "32"))
+        )
+        trace_path = trace_path or os.environ.get("MCP_TRACE_FILE")
+        self.tracer = TraceRecorder(
+            trace_path,
+            record_responses=os.environ.get("MCP_TRACE_RESPONSES") == "1"
+        ) if trace_path else None
+        self.profiler = CallProfiler()
+        self.export_dir = os.environ.get("MCP_EXPORT_DIR", "exports")
+        self.workers = ProcessLane(workers_config)
+        self.spill = SpillStore(spill_config)
+        self.registry = ToolRegistry(TOOL_SPECS, {"tenant": TENANT_PROPERTY})
+        self.default_tenant = self._open_tenant("default", db_path, sample_data=True)
+        self.db_path = db_path
         self._setup_handlers()
-        self._init_database()
     
-    def _init_database(self):
+    @property
+    def tenant(self) -> TenantState:
+        """Tenant de la llamada en curso (la base principal si no se indicó uno)"""
+        return self.tenants.current() or self.default_tenant
+    
+    def _open_tenant(self, name: str, db_path: str, sample_data: bool = False) -> TenantState:
+        """Inicializa o migra la base del tenant y arma su pool, catálogo y snapshots"""
+        self._init_database(db_path, sample_data)
+        catalog = CatalogCache(db_path)
+        catalog.install()
+        scheduler = ReportScheduler(
+            db_path,
+            build_report,
+            REPORT_TYPES,
+            self.interactive,
+            self.scheduler_config
+        )
+        result_cache = ResultCache(db_path, self.result_cache_config)
+        pool = ConnectionPool(db_path)
+        # el SQL de las herramientas se valida contra la base ya migrada y la
+        # primera conexión del pool queda con las sentencias preparadas
+        conn = pool.acquire(None)
+        try:
+            install_views(conn, partition_layout(conn))
+            self.registry.validate(conn)
+            self.registry.warm(conn)
+            conn.warmed = True
+        finally:
+            conn.close()
+        return TenantState(name, db_path, pool, catalog, scheduler, result_cache,
+                           self.max_concurrent_calls, self.max_slow_calls)
+    
+    def _init_database(self, db_path: str, sample_data: bool = True):
         """Inicializa la base de datos con todas las tablas necesarias"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            self._migrate_schema(cursor, version)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        if sample_data:
+            cursor.execute("SELECT COUNT(*) FROM users")
+            if cursor.fetchone()[0] == 0:
+                self._insert_sample_data(cursor)
+        
+        conn.commit()
+        conn.close()
+    
+    def _migrate_schema(self, cursor, version: int):
+        """Aplica las migraciones pendientes según PRAGMA user_version"""
+        if version < 1:
+            self._create_base_tables(cursor)
+        if version < 2:
+            create_search_indexes(cursor)
+        if version < 3:
+            create_partition_registry(cursor)
+        if version < 4:
+            # el estado inicial cuenta también las ventas ya archivadas en particiones
+            install_views(cursor.connection, partition_layout(cursor.connection))
+            create_inventory_engine(cursor)
+        if version < 5:
+            create_order_date_tracking(cursor)
+            if version == 4:
+                # sin el trigger, las fechas de pedido cambiadas dejaron ventas diarias en el día viejo
+                install_views(cursor.connection, partition_layout(cursor.connection))
+                rebuild_inventory(cursor)
+    
+    def _create_base_tables(self, cursor):
+        """Tablas base (migración 1)"""
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -72,13 +208,24 @@ class CompleteDatabaseMCP:
                 FOREIGN KEY (product_id) REFERENCES products (id)
             )
         ''')
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        if cursor.fetchone()[0] == 0:
-            self._insert_sample_data(cursor)
-        
-        conn.commit()
-        conn.close()
+    
+    def _connect(self, row_factory=sqlite3.Row, start_date: str | None = None,
+                 end_date: str | None = None) -> sqlite3.Connection:
+        """Toma una conexión del pool del tenant actual (trazada si la llamada se está perfilando).
+
+        Las vistas orders / order_items incluyen las particiones archivadas;
+        con start_date / end_date solo se adjuntan las que cubren ese rango.
+        """
+        conn = self.tenant.pool.acquire(row_factory)
+        install_views(conn, partition_layout(conn), start_date, end_date)
+        if not conn.warmed:
+            self.registry.warm(conn)
+            conn.warmed = True
+        return trace_connection(conn)
+    
+    def _estimate_rows(self, conn: sqlite3.Connection, table: str) -> int:
+        """Filas de la tabla para el control de admisión: las de main más las archivadas en particiones"""
+        return self.tenant.catalog.estimate_rows(conn, table) + archived_rows(partition_layout(conn), table)
     
     def _insert_sample_data(self, cursor):
         """Inserta datos de ejemplo"""
@@ -172,182 +319,286 @@ class CompleteDatabaseMCP:
         """Configura TODOS los handlers necesarios"""
         
         @self.server.list_tools()
-        async def handle_list_tools() -> list[types.Tool]:
-            """Lista TODAS las herramientas disponibles"""
+        async def handle_list_tools() -> types.ListToolsResult:
+            """Lista TODAS las herramientas disponibles (armada una sola vez en el registro)"""
+            return self.registry.tools
+        
+        @self.server.list_resources()
+        async def handle_list_resources() -> list[types.Resource]:
+            """Resultados materializados y exportaciones vigentes"""
             return [
-                types.Tool(
-                    name="execute_query",
-                    description="Ejecuta una consulta SQL SELECT",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {"type": "string", "description": "Consulta SQL SELECT a ejecutar"}
-                        },
-                        "required": ["query"]
-                    }
-                ),
-                types.Tool(
-                    name="get_table_schema",
-                    description="Obtiene el schema de una tabla",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "table_name": {"type": "string", "description": "Nombre de la tabla"}
-                        },
-                        "required": ["table_name"]
-                    }
-                ),
-                types.Tool(
-                    name="get_database_stats",
-                    description="Obtiene estadísticas de la base de datos",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {}
-                    }
-                ),
-                types.Tool(
-                    name="ask_business_question",
-                    description="Responde preguntas de negocio en lenguaje natural",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "question": {"type": "string", "description": "Pregunta de negocio en lenguaje natural"}
-                        },
-                        "required": ["question"]
-                    }
-                ),
-                types.Tool(
-                    name="get_kpis",
-                    description="Obtiene indicadores clave de rendimiento (KPIs)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {}
-                    }
-                ),
-                types.Tool(
-                    name="generate_business_report",
-                    description="Genera reportes de negocio automáticamente",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "report_type": {
-                                "type": "string",
-                                "enum": ["sales", "customers", "products"],
-                                "description": "Tipo de reporte a generar"
-                            },
-                            "period": {
-                                "type": "string",
-                                "enum": ["week", "month", "quarter"],
-                                "description": "Período del reporte"
-                            }
-                        },
-                        "required": ["report_type"]
-                    }
-                ),
-                types.Tool(
-                    name="find_insights",
-                    description="Encuentra insights automáticamente en los datos",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "focus_area": {
-                                "type": "string",
-                                "enum": ["sales", "customers", "products", "all"],
-                                "description": "Área de enfoque para los insights"
-                            }
-                        }
-                    }
-                ),
-                types.Tool(
-                    name="get_sales_analytics",
-                    description="Obtiene análisis de ventas avanzado",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "period": {"type": "string", "enum": ["week", "month", "quarter"], "description": "Período de análisis"}
-                        }
-                    }
-                ),
-                types.Tool(
-                    name="get_customer_insights",
-                    description="Obtiene insights de clientes",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {}
-                    }
-                ),
-                types.Tool(
-                    name="get_inventory_alerts",
-                    description="Obtiene alertas de inventario",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {}
-                    }
+                types.Resource(
+                    uri=entry.uri, name=f"{entry.name}-{entry.id}", mimeType=entry.mime_type, size=entry.size,
+                    description=f"{entry.rows} filas" if entry.rows is not None else None
                 )
+                for entry in self.spill.entries()
             ]
         
-        @self.server.call_tool()
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> list[ReadResourceContents]:
+            """Lee una página de un resultado: ?rows=inicio:fin o ?offset=N&length=M"""
+            data, mime_type, meta = await asyncio.to_thread(self.spill.read, str(uri))
+            content = data if mime_type == "application/octet-stream" else data.decode("utf-8")
+            return [ReadResourceContents(content, mime_type, meta)]
+        
+        # los argumentos se validan con los validadores ya compilados del registro
+        @self.server.call_tool(validate_input=False)
         async def handle_call_tool(
             name: str, arguments: dict[str, Any] | None
-        ) -> list[types.TextContent]:
-            """Maneja TODAS las llamadas a herramientas"""
+        ) -> list[types.TextContent] | types.CallToolResult:
+            """Maneja TODAS las llamadas a herramientas.
+
+            El resultado lleva en _meta.data_version la versión de los datos
+            tomada antes de calcularlo. Con el argumento _structured el JSON de
+            la respuesta va en structuredContent ({"header", "data"}) y el texto
+            queda solo con el encabezado.
+            """
             if arguments is None:
                 arguments = {}
             
-            try:
-                if name == "execute_query":
-                    return await self._execute_query(arguments.get("query", ""))
-                elif name == "get_table_schema":
-                    return await self._get_table_schema(arguments.get("table_name", ""))
-                elif name == "get_database_stats":
-                    return await self._get_database_stats()
-                elif name == "ask_business_question":
-                    return await self._ask_business_question(arguments.get("question", ""))
-                elif name == "get_kpis":
-                    return await self._get_kpis()
-                elif name == "generate_business_report":
-                    return await self._generate_business_report(
-                        arguments.get("report_type", "sales"),
-                        arguments.get("period", "month")
-                    )
-                elif name == "find_insights":
-                    return await self._find_insights(arguments.get("focus_area", "all"))
-                elif name == "get_sales_analytics":
-                    return await self._get_sales_analytics(arguments.get("period", "month"))
-                elif name == "get_customer_insights":
-                    return await self._get_customer_insights()
-                elif name == "get_inventory_alerts":
-                    return await self._get_inventory_alerts()
-                
-                else:
-                    raise ValueError(f"Herramienta desconocida: {name}")
+            error = self.registry.check_arguments(name, arguments)
+            if error is not None:
+                return types.CallToolResult(
+                    content=[types.TextContent(type="text", text=f"Error de validación: {error}")],
+                    isError=True
+                )
             
+            try:
+                tenant = await self.tenants.get(arguments["tenant"]) if arguments.get("tenant") else self.default_tenant
             except Exception as e:
                 return [types.TextContent(
                     type="text",
                     text=f"Error: {str(e)}"
                 )]
+            
+            data_version = self._data_version(tenant)
+            self.interactive.enter()
+            started_at = time.time()
+            start = time.perf_counter()
+            try:
+                async with self.tenants.use(tenant):
+                    if self.profiler.should_profile(arguments):
+                        result = await self._profiled_call(name, arguments)
+                    else:
+                        result = await self._cached_dispatch(name, arguments)
+            
+            finally:
+                self.interactive.exit()
+            
+            # las herramientas que materializan su resultado mientras lo leen ya traen su resource_link
+            links = [content for content in result if content.type == "resource_link"]
+            result = [content for content in result if content.type != "resource_link"]
+            
+            if self.tracer:
+                self.tracer.record(
+                    name, arguments, started_at, time.perf_counter() - start,
+                    "".join(content.text for content in result)
+                )
+            
+            if not links and len(result) == 1 and self.spill.should_spill([result[0].text]):
+                spilled = await asyncio.to_thread(
+                    self._spill_result, name, arguments, tenant, data_version, result[0].text
+                )
+                if spilled is not None:
+                    result, links = spilled
+            
+            structured = None
+            if arguments.get("_structured") and len(result) == 1:
+                payload = structured_payload(result[0].text)
+                if payload is not None:
+                    header, data = payload
+                    result = [types.TextContent(type="text", text=header)]
+                    structured = {"header": header, "data": data}
+            return types.CallToolResult(
+                content=result + links,
+                structuredContent=structured,
+                isError=False,
+                _meta={"data_version": data_version}
+            )
+    
+    def _spill_result(self, name: str, arguments: dict[str, Any], tenant: TenantState,
+                      data_version: str | None, text: str):
+        """Materializa una respuesta grande y la reemplaza por su descriptor y un resource_link"""
+        payload = structured_payload(text)
+        header, data = payload if payload is not None else (text.split("\n", 1)[0], None)
+        descriptor = self.spill.spill(self._spill_key(name, arguments, tenant, data_version), header, data, text)
+        if descriptor is None:
+            return None
+        return self._spilled_response(name, header, descriptor)
+    
+    @staticmethod
+    def _spill_key(name: str, arguments: dict[str, Any], tenant: TenantState, data_version: str | None) -> tuple:
+        # sin data_version no se puede saber si un resultado anterior sigue vigente: no se reutiliza
+        return (name, cache_key(name, arguments), tenant.name, data_version or time.time())
+    
+    @staticmethod
+    def _spilled_response(name: str, header: str, descriptor: dict):
+        """Descriptor de un resultado materializado más su resource_link"""
+        content = types.TextContent(
+            type="text",
+            text=f"{header}\nResultado grande: leer con resources/read por páginas\n{json.dumps(descriptor, indent=2, default=str)}"
+        )
+        link = types.ResourceLink(
+            type="resource_link", name=name, uri=descriptor["resource"],
+            mimeType=descriptor["mime_type"], size=descriptor["bytes"]
+        )
+        return [content], [link]
+    
+    @staticmethod
+    def _data_version(tenant: TenantState) -> str | None:
+        """Huella de la base del tenant (la misma que usa el cache persistente)"""
+        try:
+            return database_fingerprint(tenant.db_path)
+        except OSError:
+            return None
+    
+    async def _safe_dispatch(self, name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
+        """Despacha la llamada convirtiendo cualquier excepción en un mensaje de error"""
+        try:
+            return await self._dispatch(name, arguments)
+        
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error: {str(e)}"
+            )]
+    
+    async def _cached_dispatch(self, name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
+        """Sirve la llamada desde el cache persistente del tenant si la base no cambió desde que se guardó"""
+        # execute_query no es cacheable: admite random() o date('now')
+        if name not in self.registry.cacheable:
+            return await self._safe_dispatch(name, arguments)
+        
+        cache = self.tenant.result_cache
+        fingerprint = cache.fingerprint()
+        texts = await asyncio.to_thread(cache.get, name, arguments, fingerprint)
+        if texts is not None:
+            return [types.TextContent(type="text", text=text) for text in texts]
+        
+        result = await self._safe_dispatch(name, arguments)
+        texts = [content.text for content in result]
+        if not any(text.startswith("Error") for text in texts):
+            await asyncio.to_thread(cache.put, name, arguments, texts, fingerprint)
+        return result
+    
+    async def _profiled_call(self, name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
+        """Ejecuta la llamada bajo cProfile y traza de SQL, y escribe los resultados a disco"""
+        start = time.perf_counter()
+        async with self.profiler.session(name) as session:
+            result = await self._safe_dispatch(name, arguments)
+        total = time.perf_counter() - start
+        
+        # costo aproximado del framing MCP: serializar el resultado como lo hará el SDK
+        framing_start = time.perf_counter()
+        types.CallToolResult(content=result, isError=False).model_dump_json(by_alias=True, exclude_none=True)
+        framing = time.perf_counter() - framing_start
+        
+        self.profiler.write(session, arguments, total, framing)
+        return result
+    
+    async def _dispatch(self, name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
+        """Despacha la llamada a la herramienta correspondiente según el registro"""
+        spec = self.registry.get(name)
+        if spec is None:
+            raise ValueError(f"Herramienta desconocida: {name}")
+        if spec.handler is None:
+            return await self._run_sql_tool(spec, arguments)
+        return await getattr(self, spec.handler)(*spec.bind(arguments).values())
+    
+    async def _run_sql_tool(self, spec: ToolSpec, arguments: dict[str, Any]) -> list[types.TextContent]:
+        """Reporte declarativo: ejecuta las sentencias de la herramienta con sus argumentos como parámetros"""
+        params = spec.bind(arguments)
+        conn = self._connect()
+        
+        try:
+            data = {name: params[name] for name in spec.echo}
+            for name, sql in spec.sql.items():
+                cursor = conn.execute(sql, params)
+                if name in spec.single_row:
+                    data[name] = dict(cursor.fetchone())
+                else:
+                    data[name] = [dict(row) for row in cursor.fetchall()]
+            
+            return [types.TextContent(
+                type="text",
+                text=f"{spec.header.format(**params)}\n\n{json.dumps(data, indent=2, default=str)}"
+            )]
+        
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"{spec.error}: {str(e)}"
+            )]
+        
+        finally:
+            conn.close()
+    
+    async def _get_data_version(self) -> list[types.TextContent]:
+        """Versión actual de los datos del tenant"""
+        return [types.TextContent(
+            type="text",
+            text=f"Versión de datos:\n{json.dumps({'data_version': self._data_version(self.tenant)})}"
+        )]
     
-    async def _execute_query(self, query: str) -> list[types.TextContent]:
-        """Ejecuta una consulta SQL SELECT"""
-        if not query.strip().upper().startswith("SELECT"):
+    async def _execute_query(self, query: str) -> list[types.TextContent | types.ResourceLink]:
+        """Ejecuta una consulta SQL de lectura pasando por el control de admisión.
+
+        Si las filas superan el umbral del spill se escriben al archivo del
+        resultado mientras se leen del cursor, sin armar antes el JSON completo.
+        """
+        if not query.strip().upper().startswith(("SELECT", "WITH")):
             return [types.TextContent(
                 type="text",
                 text="Error: Solo se permiten consultas SELECT"
             )]
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row 
-        cursor = conn.cursor()
+        conn = self._connect(row_factory=None)
+        try:
+            decision = self.admission.evaluate(conn, query)
+        except AdmissionRejected as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Consulta rechazada por control de admisión: {str(e)}"
+            )]
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error ejecutando consulta: {str(e)}"
+            )]
+        finally:
+            conn.close()
+        
+        header = f"Consulta ejecutada exitosamente.\nAdmisión: {json.dumps(decision.to_dict(), default=str)}\nResultados:"
+        key = self._spill_key("execute_query", {"query": query}, self.tenant, self._data_version(self.tenant))
+        spill = (None, None, None)
+        if self.spill.enabled:
+            descriptor = self.spill.lookup(key, header)
+            if descriptor is not None:
+                content, links = self._spilled_response("execute_query", header, descriptor)
+                return content + links
+            spill = (self.spill.new_path(), self.spill.config["threshold_bytes"], self.spill.config["max_bytes"])
         
         try:
-            cursor.execute(query)
-            results = cursor.fetchall()
-            data = [dict(row) for row in results]
+            if self.workers.should_offload(decision.cost):
+                # resultado grande: el worker arma las filas y serializa el JSON fuera del GIL del servidor
+                _, payload = await self._run_in_lane(
+                    decision, query_to_json, self.tenant.db_path, decision.query,
+                    self.admission.timeout_for(decision), self.workers.config["compress_bytes"], *spill,
+                    executor=self.workers.executor
+                )
+                results = payload if isinstance(payload, RowWriter) else decode_payload(payload)
+            else:
+                data = await self._run_in_lane(decision, profiled(self._run_admitted_query), decision, *spill)
+                results = data if isinstance(data, RowWriter) else json.dumps(data, indent=2, default=str)
             
+            if isinstance(results, RowWriter):
+                content, links = self._spilled_response(
+                    "execute_query", header, self.spill.add_rows(key, results, header)
+                )
+                return content + links
             return [types.TextContent(
                 type="text",
-                text=f"Consulta ejecutada exitosamente.\nResultados:\n{json.dumps(data, indent=2, default=str)}"
+                text=f"{header}\n{results}"
             )]
         
         except Exception as e:
@@ -355,36 +606,115 @@ class CompleteDatabaseMCP:
                 type="text",
                 text=f"Error ejecutando consulta: {str(e)}"
             )]
+    
+    async def _run_in_lane(self, decision, func, *args, executor=None):
+        """Ejecuta una consulta admitida en su carril; en el lento la llamada cede su cupo de la cuota del tenant"""
+        async with self.tenants.lane(decision.lane):
+            return await self.admission.run(decision, func, *args, executor=executor)
+    
+    def _run_admitted_query(self, decision, spill_path: str | None = None, spill_threshold: int | None = None,
+                            spill_max_bytes: int | None = None) -> list[dict] | RowWriter:
+        """Ejecuta (en un hilo del carril) una consulta ya admitida; con spill_path un resultado grande va a ese archivo"""
+        conn = self._connect(row_factory=None)
+        conn.set_authorizer(AdmissionController.read_only_authorizer())
+        AdmissionController.install_deadline(conn, self.admission.timeout_for(decision))
+        
+        try:
+            data, spilled = collect_rows(conn.execute(decision.query), spill_path, spill_threshold, spill_max_bytes)
+            return spilled if spilled is not None else data
         
         finally:
             conn.close()
     
-    async def _get_table_schema(self, table_name: str) -> list[types.TextContent]:
-        """Obtiene el schema de una tabla"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    async def _export_query(self, query: str, fmt: str, filename: str | None,
+                            batch_size: int) -> list[types.TextContent]:
+        """Exporta una consulta SQL de lectura a un archivo, sin LIMIT automático"""
+        if not query.strip().upper().startswith(("SELECT", "WITH")):
+            return [types.TextContent(
+                type="text",
+                text="Error: Solo se permiten consultas SELECT"
+            )]
+        
+        conn = self._connect(row_factory=None)
+        try:
+            decision = self.admission.evaluate(conn, query, bulk=True)
+            path = export_path(os.path.join(self.export_dir, self.tenant.name), filename, fmt)
+        except AdmissionRejected as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Exportación rechazada por control de admisión: {str(e)}"
+            )]
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error exportando consulta: {str(e)}"
+            )]
+        finally:
+            conn.close()
+        
+        def run_export():
+            conn = self._connect(row_factory=None)
+            conn.set_authorizer(AdmissionController.read_only_authorizer())
+            AdmissionController.install_deadline(conn, self.admission.policy["export_timeout"])
+            try:
+                return export_cursor(conn.execute(decision.query), path, fmt, batch_size)
+            finally:
+                conn.close()
+        
+        try:
+            result = await self._run_in_lane(decision, profiled(run_export))
+            result["admission"] = decision.to_dict()
+            # el archivo se puede leer por rangos de bytes con resources/read
+            resource = self.spill.register_file(result["path"], EXPORT_MIME_TYPES[fmt], "export_query", result["rows"])
+            result["resource"] = resource["resource"]
+            result["pages"] = resource["pages"]
+            
+            return [types.TextContent(
+                type="text",
+                text=f"Exportación completada:\n{json.dumps(result, indent=2, default=str)}"
+            )]
+        
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error exportando consulta: {str(e)}"
+            )]
+    
+    async def _search_entities(self, query: str, entity: str, prefix: bool, limit: int,
+                               offset: int) -> list[types.TextContent]:
+        """Busca productos y clientes en los índices FTS5, ordenados por relevancia (bm25)"""
+        entities = list(SEARCH_INDEXES) if entity == "all" else [entity]
+        conn = self._connect(row_factory=None)
         
         try:
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            schema = cursor.fetchall()
+            results = search_entities(conn, query, entities, limit, offset, prefix)
             
-            if not schema:
+            return [types.TextContent(
+                type="text",
+                text=f"Resultados de búsqueda:\n{json.dumps(results, indent=2, default=str)}"
+            )]
+        
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error en la búsqueda: {str(e)}"
+            )]
+        
+        finally:
+            conn.close()
+    
+    async def _get_table_schema(self, table_name: str) -> list[types.TextContent]:
+        """Obtiene el schema de una tabla (cacheado hasta el próximo cambio de DDL)"""
+        try:
+            schema_info = self.tenant.catalog.table_schema(table_name)
+            
+            if not schema_info:
+                available_tables = ", ".join(self.tenant.catalog.tables())
                 return [types.TextContent(
                     type="text",
-                    text=f"La tabla '{table_name}' no existe"
+                    text=f"La tabla '{table_name}' no existe. Disponibles: {available_tables}"
                 )]
             
-            schema_info = []
-            for column in schema:
-                schema_info.append({
-                    "column_id": column[0],
-                    "name": column[1],
-                    "type": column[2],
-                    "not_null": bool(column[3]),
-                    "default_value": column[4],
-                    "primary_key": bool(column[5])
-                })
-            
             return [types.TextContent(
                 type="text",
                 text=f"Schema de la tabla '{table_name}':\n{json.dumps(schema_info, indent=2)}"
@@ -395,26 +725,35 @@ class CompleteDatabaseMCP:
                 type="text",
                 text=f"Error obteniendo schema: {str(e)}"
             )]
-        
-        finally:
-            conn.close()
     
-    async def _get_database_stats(self) -> list[types.TextContent]:
-        """Obtiene estadísticas de la base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    async def _get_database_stats(self, exact: bool = False) -> list[types.TextContent]:
+        """Obtiene estadísticas de la base de datos desde el cache del catálogo"""
         try:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
+            counts = self.tenant.catalog.row_counts(exact=exact)
+            sizes, database = self.tenant.catalog.sizes()
+            
+            stats = {"tables": {}, "database": database}
             
-            stats = {"tables": {}}
+            for table_name, count in counts.items():
+                stats["tables"][table_name] = {
+                    **count,
+                    **sizes.get(table_name, {"pages": None, "bytes": None})
+                }
             
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
-                stats["tables"][table_name] = {"row_count": count}
+            conn = self.tenant.pool.acquire(None)
+            try:
+                layout = partition_layout(conn)
+            finally:
+                conn.close()
+            if layout:
+                # meses archivados: los conteos de orders / order_items de arriba son solo los de main
+                stats["partitions"] = [
+                    {k: v for k, v in partition.items() if k != "path"} for partition in layout
+                ]
+            # consultas que esperan turno en cada carril (el control de admisión es de todo el servidor)
+            stats["admission"] = {"waiting": dict(self.admission.waiting)}
+            if self.tenant.result_cache.enabled:
+                stats["result_cache"] = await asyncio.to_thread(self.tenant.result_cache.stats)
             
             return [types.TextContent(
                 type="text",
@@ -426,69 +765,13 @@ class CompleteDatabaseMCP:
                 type="text",
                 text=f"Error obteniendo estadísticas: {str(e)}"
             )]
-        
-        finally:
-            conn.close()
     
     async def _ask_business_question(self, question: str) -> list[types.TextContent]:
         """Responde preguntas de negocio en lenguaje natural"""
         question_lower = question.lower()
         
-        # ampliamos el mapeo de preguntas
-        query_patterns = {
-            "mejores clientes": """
-                SELECT u.name, u.email, u.country, 
-                       COUNT(o.id) as total_orders,
-                       SUM(o.total_amount) as total_spent
-                FROM users u
-                JOIN orders o ON u.id = o.user_id
-                WHERE o.status = 'completed'
-                GROUP BY u.id
-                ORDER BY total_spent DESC
-                LIMIT 5
-            """,
-            
-            "productos más vendidos": """
-                SELECT p.name, p.category, 
-                       SUM(oi.quantity) as total_sold,
-                       SUM(oi.quantity * oi.unit_price) as revenue,
-                       p.supplier
-                FROM products p
-                JOIN order_items oi ON p.id = oi.product_id
-                JOIN orders o ON oi.order_id = o.id
-                WHERE o.status IN ('completed', 'shipped')
-                GROUP BY p.id
-                ORDER BY total_sold DESC
-                LIMIT 5
-            """,
-            
-            "ventas por país": """
-                SELECT u.country, 
-                       COUNT(o.id) as total_orders,
-                       SUM(o.total_amount) as total_revenue,
-                       AVG(o.total_amount) as avg_order_value
-                FROM users u
-                JOIN orders o ON u.id = o.user_id
-                WHERE o.status = 'completed'
-                GROUP BY u.country
-                ORDER BY total_revenue DESC
-            """,
-            
-            "clientes inactivos": """
-                SELECT name, email, country, registration_date
-                FROM users
-                WHERE is_active = 0 OR id NOT IN (
-                    SELECT DISTINCT user_id FROM orders WHERE status = 'completed'
-                )
-            """,
-            
-            "inventario bajo": """
-                SELECT name, category, stock, price, supplier
-                FROM products
-                WHERE stock < 10
-                ORDER BY stock ASC
-            """
-        }
+        # las preguntas reconocidas y sus consultas están en el registro
+        query_patterns = self.registry.get("ask_business_question").sql
         
         selected_query = None
         for pattern, query in query_patterns.items():
@@ -503,8 +786,7 @@ class CompleteDatabaseMCP:
                 text=f"Pregunta no reconocida. Prueba: {available_questions}"
             )]
 
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -528,21 +810,12 @@ class CompleteDatabaseMCP:
     
     async def _get_kpis(self) -> list[types.TextContent]:
         """Obtiene indicadores clave de rendimiento"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             # KPIs principales
-            cursor.execute("""
-                SELECT 
-                    (SELECT COUNT(*) FROM users WHERE is_active = 1) as active_customers,
-                    (SELECT COUNT(*) FROM orders WHERE status = 'completed') as completed_orders,
-                    (SELECT SUM(total_amount) FROM orders WHERE status = 'completed') as total_revenue,
-                    (SELECT AVG(total_amount) FROM orders WHERE status = 'completed') as avg_order_value,
-                    (SELECT COUNT(*) FROM products) as total_products,
-                    (SELECT COUNT(*) FROM products WHERE stock < 10) as low_stock_products
-            """)
+            cursor.execute(self.registry.sql("get_kpis", "kpis"))
             
             kpis = dict(cursor.fetchone())
             
@@ -565,94 +838,14 @@ class CompleteDatabaseMCP:
             conn.close()
     
     async def _generate_business_report(self, report_type: str, period: str) -> list[types.TextContent]:
-        """Genera reportes de negocio automáticamente"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
+        """Sirve el reporte desde su snapshot precalculado (stale-while-revalidate)"""
         try:
-            if report_type == "sales":
-                cursor.execute("""
-                    SELECT 
-                        DATE(o.order_date) as date,
-                        COUNT(*) as orders_count,
-                        SUM(o.total_amount) as daily_revenue,
-                        AVG(o.total_amount) as avg_order_value
-                    FROM orders o
-                    WHERE o.status IN ('completed', 'shipped')
-                    GROUP BY DATE(o.order_date)
-                    ORDER BY date DESC
-                """)
-                sales_data = [dict(row) for row in cursor.fetchall()]
-                
-                cursor.execute("""
-                    SELECT 
-                        SUM(total_amount) as total_revenue,
-                        COUNT(*) as total_orders,
-                        AVG(total_amount) as avg_order_value
-                    FROM orders
-                    WHERE status IN ('completed', 'shipped')
-                """)
-                summary = dict(cursor.fetchone())
-                
-                report_data = {
-                    "report_type": "Sales Report",
-                    "period": period,
-                    "summary": summary,
-                    "daily_sales": sales_data
-                }
-                
-            elif report_type == "customers":
-                cursor.execute("""
-                    SELECT country, COUNT(*) as customer_count,
-                           SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_count
-                    FROM users
-                    GROUP BY country
-                    ORDER BY customer_count DESC
-                """)
-                by_country = [dict(row) for row in cursor.fetchall()]
-                
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_customers,
-                        SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_customers
-                    FROM users
-                """)
-                summary = dict(cursor.fetchone())
-                
-                report_data = {
-                    "report_type": "Customer Report",
-                    "period": period,
-                    "summary": summary,
-                    "by_country": by_country
-                }
-                
-            elif report_type == "products":
-                cursor.execute("""
-                    SELECT category, COUNT(*) as product_count,
-                           AVG(price) as avg_price,
-                           SUM(stock) as total_stock
-                    FROM products
-                    GROUP BY category
-                    ORDER BY product_count DESC
-                """)
-                by_category = [dict(row) for row in cursor.fetchall()]
-                
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_products,
-                        COUNT(CASE WHEN stock < 10 THEN 1 END) as low_stock_count,
-                        AVG(price) as avg_price
-                    FROM products
-                """)
-                summary = dict(cursor.fetchone())
-                
-                report_data = {
-                    "report_type": "Product Report", 
-                    "period": period,
-                    "summary": summary,
-                    "by_category": by_category
-                }
+            # un snapshot por tipo: el reporte no depende del período, que solo se informa
+            snapshot, stale = await self.tenant.scheduler.get(report_type)
+            report_data = {
+                "report_type": snapshot.data["report_type"], "period": period,
+                **snapshot.data, "snapshot": snapshot.metadata(stale)
+            }
             
             return [types.TextContent(
                 type="text",
@@ -664,73 +857,36 @@ class CompleteDatabaseMCP:
                 type="text",
                 text=f"Error generando reporte: {str(e)}"
             )]
-        
-        finally:
-            conn.close()
     
     async def _find_insights(self, focus_area: str) -> list[types.TextContent]:
         """Encuentra insights automáticamente"""
         insights = []
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             if focus_area in ["sales", "all"]:
                 # Insight de producto más rentable
-                cursor.execute("""
-                    SELECT p.name, 
-                           (p.price - p.cost) as profit_per_unit,
-                           COALESCE(SUM(oi.quantity), 0) as units_sold,
-                           COALESCE(SUM((p.price - p.cost) * oi.quantity), 0) as total_profit
-                    FROM products p
-                    LEFT JOIN order_items oi ON p.id = oi.product_id
-                    LEFT JOIN orders o ON oi.order_id = o.id AND o.status = 'completed'
-                    WHERE p.cost IS NOT NULL AND p.cost > 0
-                    GROUP BY p.id
-                    ORDER BY total_profit DESC
-                    LIMIT 1
-                """)
+                cursor.execute(self.registry.sql("find_insights", "most_profitable"))
                 most_profitable = cursor.fetchone()
                 if most_profitable and most_profitable['total_profit'] > 0:
                     insights.append(f"producto más rentable: {most_profitable['name']} con ${most_profitable['total_profit']:.2f} en ganancias totales")
             
             if focus_area in ["customers", "all"]:
                 #país con más clientes
-                cursor.execute("""
-                    SELECT country, COUNT(*) as customer_count
-                    FROM users
-                    WHERE is_active = 1
-                    GROUP BY country
-                    ORDER BY customer_count DESC
-                    LIMIT 1
-                """)
+                cursor.execute(self.registry.sql("find_insights", "top_country"))
                 top_country = cursor.fetchone()
                 if top_country:
                     insights.append(f"pais con más clientes activos: {top_country['country']} ({top_country['customer_count']} clientes)")
             
             if focus_area in ["products", "all"]:
-                #productos con bajo stock
-                cursor.execute("""
-                    SELECT COUNT(*) as low_stock_count
-                    FROM products
-                    WHERE stock < 10
-                """)
-                low_stock = cursor.fetchone()
-                if low_stock and low_stock['low_stock_count'] > 0:
-                    insights.append(f"⚠️ Alerta: {low_stock['low_stock_count']} productos tienen inventario bajo (< 10 unidades)")
-                
-                #productos sin ventas
-                cursor.execute("""
-                    SELECT COUNT(*) as no_sales_count
-                    FROM products p
-                    LEFT JOIN order_items oi ON p.id = oi.product_id
-                    WHERE oi.product_id IS NULL
-                """)
-                no_sales = cursor.fetchone()
-                if no_sales and no_sales['no_sales_count'] > 0:
-                    insights.append(f"📊 {no_sales['no_sales_count']} productos no han tenido ventas aún")
+                #productos con bajo stock y sin ventas, desde el estado de inventario
+                counts = alert_counts(conn)
+                if counts["low_stock"] > 0:
+                    insights.append(f"⚠️ Alerta: {counts['low_stock']} productos tienen inventario bajo su punto de reorden")
+                if counts["without_sales"] > 0:
+                    insights.append(f"📊 {counts['without_sales']} productos no han tenido ventas aún")
             
             if not insights:
                 insights.append("✅ Todo parece estar funcionando bien en esta área")
@@ -751,98 +907,89 @@ class CompleteDatabaseMCP:
         finally:
             conn.close()
     
-    async def _get_sales_analytics(self, period: str) -> list[types.TextContent]:
-        """Obtiene análisis de ventas por período"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    async def _run_analytics(self, tables: list[str], func, *args, date_range: tuple | None = None):
+        """Ejecuta func(conn, *args) en el carril de procesos si las tablas son grandes, si no en un hilo.
+
+        date_range (inicio, fin) poda las particiones: solo se adjuntan y se
+        cuentan en el costo las que pueden tener pedidos en ese rango.
+        """
+        counts = self.tenant.catalog.row_counts()
+        cost = sum(counts.get(table, {}).get("row_count") or 0 for table in tables)
+        conn = self.tenant.pool.acquire(None)
+        try:
+            selected = prune(partition_layout(conn), *(date_range or ()))
+        finally:
+            conn.close()
+        cost += sum(archived_rows(selected, table) for table in tables)
+        if self.workers.should_offload(cost):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.workers.executor,
+                functools.partial(call_with_connection, self.tenant.db_path, func, *args, date_range=date_range)
+            )
+        
+        def compute():
+            conn = self._connect(None, *(date_range or ()))
+            try:
+                return func(conn, *args)
+            finally:
+                conn.close()
         
+        return await asyncio.to_thread(profiled(compute))
+    
+    async def _get_sales_trends(self, granularity: str, group_by: str, start_date: str | None,
+                                end_date: str | None, window: int | None, horizon: int,
+                                top: int) -> list[types.TextContent]:
+        """Obtiene tendencias y pronóstico de ventas (cálculo vectorizado con NumPy)"""
         try:
-            #analisis general
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_orders,
-                    SUM(total_amount) as total_revenue,
-                    AVG(total_amount) as avg_order_value,
-                    COUNT(DISTINCT user_id) as unique_customers
-                FROM orders
-                WHERE status = 'completed'
-            """)
-            summary = dict(cursor.fetchone())
-            
-            #ventas por categoria
-            cursor.execute("""
-                SELECT p.category,
-                       COUNT(oi.id) as items_sold,
-                       SUM(oi.quantity * oi.unit_price) as category_revenue
-                FROM products p
-                JOIN order_items oi ON p.id = oi.product_id
-                JOIN orders o ON oi.order_id = o.id
-                WHERE o.status = 'completed'
-                GROUP BY p.category
-                ORDER BY category_revenue DESC
-            """)
-            by_category = [dict(row) for row in cursor.fetchall()]
-            
-            analytics = {
-                "period": period,
-                "summary": summary,
-                "by_category": by_category
-            }
+            trends = await self._run_analytics(
+                ["orders", "order_items"], compute_sales_trends,
+                granularity, group_by, start_date, end_date, window, horizon, top,
+                date_range=(start_date, end_date)
+            )
             
             return [types.TextContent(
                 type="text",
-                text=f"analisis de ventas ({period}):\n\n{json.dumps(analytics, indent=2, default=str)}"
+                text=f"tendencias de ventas ({granularity}, por {group_by}):\n\n{json.dumps(trends, indent=2, default=str)}"
             )]
         
         except Exception as e:
             return [types.TextContent(
                 type="text",
-                text=f"Error en analisis: {str(e)}"
+                text=f"Error en tendencias: {str(e)}"
             )]
-        
-        finally:
-            conn.close()
     
-    async def _get_customer_insights(self) -> list[types.TextContent]:
-        """Obtiene insights de clientes"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    async def _get_customer_segments(self, segment: str | None, reference_date: str | None,
+                                     limit: int, offset: int) -> list[types.TextContent]:
+        """Obtiene la segmentación RFM, cacheada hasta que cambien los datos"""
+        tenant = self.tenant
         
         try:
-            #clientes más valiosos
-            cursor.execute("""
-                SELECT u.name, u.country, 
-                       COUNT(o.id) as order_count,
-                       COALESCE(SUM(o.total_amount), 0) as lifetime_value
-                FROM users u
-                LEFT JOIN orders o ON u.id = o.user_id AND o.status = 'completed'
-                WHERE u.is_active = 1
-                GROUP BY u.id
-                ORDER BY lifetime_value DESC
-                LIMIT 3
-            """)
-            top_customers = [dict(row) for row in cursor.fetchall()]
-            
-            #distribución por país
-            cursor.execute("""
-                SELECT country, COUNT(*) as customer_count
-                FROM users
-                WHERE is_active = 1
-                GROUP BY country
-                ORDER BY customer_count DESC
-            """)
-            by_country = [dict(row) for row in cursor.fetchall()]
-            
-            insights = {
-                "top_customers": top_customers,
-                "distribution_by_country": by_country
+            # en memoria solo se guarda la de la fecha por defecto: una entrada por tenant;
+            # con otra reference_date se recalcula (el cache persistente cubre las repetidas)
+            data_version = tenant.catalog.data_version()
+            cached = tenant.cache.get("customer_segments") if reference_date is None else None
+            if cached and cached[0] == data_version:
+                result = cached[1]
+            else:
+                result = await self._run_analytics(["orders", "users"], compute_customer_segments, reference_date)
+                if reference_date is None:
+                    tenant.cache["customer_segments"] = (data_version, result)
+            
+            customers = result["customers"]
+            if segment:
+                customers = [customer for customer in customers if customer[-1] == segment]
+            page = [dict(zip(RFM_COLUMNS, customer)) for customer in customers[offset:offset + limit]]
+            
+            segments = {
+                "total_customers": result["total_customers"],
+                "segments": result["segments"],
+                "customers": page,
+                "customers_matching": len(customers)
             }
             
             return [types.TextContent(
                 type="text",
-                text=f"customer Insights:\n\n{json.dumps(insights, indent=2, default=str)}"
+                text=f"segmentación RFM de clientes:\n\n{json.dumps(segments, indent=2, default=str)}"
             )]
         
         except Exception as e:
@@ -850,40 +997,14 @@ class CompleteDatabaseMCP:
                 type="text",
                 text=f"Error: {str(e)}"
             )]
-        
-        finally:
-            conn.close()
     
-    async def _get_inventory_alerts(self) -> list[types.TextContent]:
-        """Obtiene alertas de inventario"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    async def _get_inventory_alerts(self, reference_date: str | None,
+                                    velocity_days: int) -> list[types.TextContent]:
+        """Obtiene alertas de inventario desde el estado incremental (costo proporcional a las alertas)"""
+        conn = self._connect(row_factory=None)
         
         try:
-            #productos con stock bajo
-            cursor.execute("""
-                SELECT name, category, stock, supplier,
-                       CASE WHEN cost IS NOT NULL THEN (price - cost) ELSE NULL END as profit_margin
-                FROM products
-                WHERE stock < 10
-                ORDER BY stock ASC
-            """)
-            low_stock = [dict(row) for row in cursor.fetchall()]
-            
-            #productos sin ventas
-            cursor.execute("""
-                SELECT p.name, p.category, p.stock
-                FROM products p
-                LEFT JOIN order_items oi ON p.id = oi.product_id
-                WHERE oi.product_id IS NULL
-            """)
-            no_sales = [dict(row) for row in cursor.fetchall()]
-            
-            alerts = {
-                "low_stock_products": low_stock,
-                "products_without_sales": no_sales
-            }
+            alerts = inventory_alerts(conn, reference_date, velocity_days)
             
             return [types.TextContent(
                 type="text",
@@ -899,23 +1020,63 @@ class CompleteDatabaseMCP:
         finally:
             conn.close()
     
+    async def _set_inventory_threshold(self, scope: str, key: str | None,
+                                       reorder_level: int | None) -> list[types.TextContent]:
+        """Crea, cambia o borra un punto de reorden"""
+        conn = self._connect(row_factory=None)
+        
+        try:
+            low_stock = await asyncio.to_thread(set_threshold, conn, scope, key, reorder_level)
+            action = "borrado" if reorder_level is None else f"= {reorder_level}"
+            target = "general" if scope == "default" else f"{scope} {key}"
+            return [types.TextContent(
+                type="text",
+                text=f"Punto de reorden {target} {action}. Productos bajo su punto de reorden: {low_stock}"
+            )]
+        
+        except Exception as e:
+            return [types.TextContent(
+                type="text",
+                text=f"Error definiendo umbral: {str(e)}"
+            )]
+        
+        finally:
+            conn.close()
+    
+    async def _expire_spill(self):
+        """Borra los resultados vencidos del spill cada cleanup_seconds"""
+        while True:
+            await asyncio.sleep(self.spill.config["cleanup_seconds"])
+            await asyncio.to_thread(self.spill.cleanup)
+    
     async def run(self):
         """Ejecuta el servidor MCP"""
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="complete-database-mcp",
-                    server_version="0.3.0",
-                    capabilities=self.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={},
+            self.default_tenant.start()
+            spill_cleanup = asyncio.get_running_loop().create_task(self._expire_spill())
+            try:
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    InitializationOptions(
+                        server_name="complete-database-mcp",
+                        server_version="0.3.0",
+                        capabilities=self.server.get_capabilities(
+                            notification_options=NotificationOptions(),
+                            experimental_capabilities={},
+                        ),
                     ),
-                ),
-            )
+                )
+            finally:
+                spill_cleanup.cancel()
+                await self.tenants.close_all()
+                await self.default_tenant.close()
+                self.workers.shutdown()
+                self.spill.close()
+                if self.tracer:
+                    self.tracer.close()
 
 
 if __name__ == "__main__":
-    complete_db_mcp = CompleteDatabaseMCP()
+    complete_db_mcp = CompleteDatabaseMCP(os.environ.get("MCP_DB_PATH", "database_demo/mcp_database.db"))
     asyncio.run(complete_db_mcp.run())
\ No newline at end of file
@@ -0,0 +1,215 @@
+import csv
+import os
+import re
+import time
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow es opcional: sin pyarrow solo se exporta CSV
+    pa = None
+
+
+EXPORT_FORMATS = {"csv": ".csv", "arrow": ".arrow"}
+EXPORT_MIME_TYPES = {"csv": "text/csv", "arrow": "application/vnd.apache.arrow.file"}
+EXPORT_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def export_path(export_dir: str, filename: str | None, fmt: str) -> str:
+    """Ruta del archivo de exportación dentro de export_dir (sin subdirectorios)"""
+    extension = EXPORT_FORMATS[fmt]
+    if filename:
+        if not EXPORT_NAME.match(filename) or filename.startswith("."):
+            raise ValueError(f"Nombre de archivo inválido: {filename!r}")
+        if not filename.endswith(extension):
+            filename += extension
+    else:
+        filename = f"export-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}{extension}"
+    os.makedirs(export_dir, exist_ok=True)
+    return os.path.join(export_dir, filename)
+
+
+def _write_csv(cursor, f, batch_size: int) -> int:
+    writer = csv.writer(f)
+    writer.writerow([column[0] for column in cursor.description])
+    rows = 0
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return rows
+        writer.writerows(batch)
+        rows += len(batch)
+
+
+def _column_array(column):
+    try:
+        return pa.array(column)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # SQLite no fija el tipo de una columna: con valores mezclados en el lote se escribe como texto
+        return pa.array([None if value is None else str(value) for value in column], type=pa.string())
+
+
+def _widen_type(current, incoming):
+    """Tipo que admite los valores de ambos sin perder datos"""
+    if current == incoming or pa.types.is_null(incoming):
+        return current
+    if pa.types.is_null(current):
+        return incoming
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(current) for check in numeric) and any(check(incoming) for check in numeric):
+        return pa.float64()
+    return pa.string()
+
+
+def _cast_batch(arrays: list, schema) -> tuple:
+    """(lote con el schema, None) o (None, índice de la columna que no cabe sin perder datos)"""
+    cast = []
+    for index, (array, field) in enumerate(zip(arrays, schema)):
+        if array.type != field.type:
+            try:
+                # cast seguro: falla en vez de truncar (p. ej. enteros de más de 53 bits a double)
+                array = array.cast(field.type)
+            except pa.ArrowInvalid:
+                return None, index
+        cast.append(array)
+    return pa.RecordBatch.from_arrays(cast, schema=schema), None
+
+
+class _ArrowFile:
+    """Archivo Arrow IPC cuyo schema se ensancha si un lote posterior trae otro tipo en una columna.
+
+    El schema sale del primer lote. Si después una columna trae un tipo que no
+    entra (real donde había enteros, texto donde había números), se pasa al
+    tipo más ancho y los lotes ya escritos se reescriben en un archivo nuevo,
+    uno por vez con mmap, así la memoria sigue acotada por el lote.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.current = path
+        self.generation = 0
+        self.schema = None
+        self._sink = None
+        self._writer = None
+
+    def _open(self, schema):
+        self.schema = schema
+        self._sink = pa.OSFile(self.current, "wb")
+        self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def _rewrite(self, schema):
+        self._close()
+        previous = self.current
+        while True:
+            self.generation += 1
+            self.current = f"{self.path}.{self.generation}"
+            self._open(schema)
+            failed = None
+            with pa.memory_map(previous) as source:
+                reader = pa.ipc.open_file(source)
+                for index in range(reader.num_record_batches):
+                    batch, failed = _cast_batch(reader.get_batch(index).columns, schema)
+                    if failed is not None:
+                        break
+                    self._writer.write_batch(batch)
+            if failed is None:
+                break
+            self._close()
+            os.remove(self.current)
+            schema = schema.set(failed, schema.field(failed).with_type(pa.string()))
+        os.remove(previous)
+
+    def write(self, arrays: list, names: list[str]):
+        if self.schema is None:
+            self._open(pa.schema([pa.field(name, array.type) for name, array in zip(names, arrays)]))
+        schema = pa.schema([
+            field.with_type(_widen_type(field.type, array.type)) for field, array in zip(self.schema, arrays)
+        ])
+        while True:
+            if schema != self.schema:
+                self._rewrite(schema)
+                schema = self.schema
+            batch, failed = _cast_batch(arrays, schema)
+            if failed is None:
+                break
+            schema = schema.set(failed, schema.field(failed).with_type(pa.string()))
+        self._writer.write_batch(batch)
+
+    def finish(self, names: list[str]):
+        if self.schema is None:
+            self._open(pa.schema([(name, pa.string()) for name in names]))
+        elif any(pa.types.is_null(field.type) for field in self.schema):
+            # una columna que fue NULL en todas las filas no tiene tipo: se escribe como texto
+            self._rewrite(pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in self.schema
+            ]))
+        self._close()
+        if self.current != self.path:
+            os.replace(self.current, self.path)
+
+    def discard(self):
+        self._close()
+        if self.current != self.path and os.path.exists(self.current):
+            os.remove(self.current)
+
+
+def _write_arrow(cursor, path: str, batch_size: int) -> int:
+    names = [column[0] for column in cursor.description]
+    output = _ArrowFile(path)
+    rows = 0
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            output.write([_column_array(column) for column in zip(*batch)], names)
+            rows += len(batch)
+        output.finish(names)
+    except BaseException:
+        output.discard()
+        raise
+    return rows
+
+
+def export_cursor(cursor, path: str, fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Escribe el resultado de un cursor a path lote por lote con fetchmany.
+
+    La memoria queda acotada por batch_size sin importar el total de filas.
+    Se escribe a un archivo temporal que se renombra al terminar, así nunca
+    queda a la vista un export a medias.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    if fmt == "arrow" and pa is None:
+        raise RuntimeError("El formato arrow requiere pyarrow (pip install pyarrow)")
+
+    start = time.perf_counter()
+    partial = f"{path}.part"
+    try:
+        if fmt == "csv":
+            with open(partial, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+                rows = _write_csv(cursor, f, batch_size)
+        else:
+            rows = _write_arrow(cursor, partial, batch_size)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    return {
+        "path": os.path.abspath(path),
+        "format": fmt,
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else None,
+    }
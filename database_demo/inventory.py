@@ -0,0 +1,308 @@
+import contextlib
+import sqlite3
+
+
+# Punto de reorden por defecto (el "stock < 10" de las alertas originales)
+DEFAULT_REORDER_LEVEL = 10
+# Días de ventas recientes con que se estima la velocidad de venta
+DEFAULT_VELOCITY_DAYS = 30
+THRESHOLD_SCOPES = ["product", "category", "default"]
+
+
+def _reorder_level_sql(product_id: str, category: str) -> str:
+    """Punto de reorden del producto: umbral propio, si no el de su categoría, si no el general"""
+    return f"""COALESCE(
+        (SELECT reorder_level FROM inventory_thresholds WHERE scope = 'product' AND key = CAST({product_id} AS TEXT)),
+        (SELECT reorder_level FROM inventory_thresholds WHERE scope = 'category' AND key = {category}),
+        (SELECT reorder_level FROM inventory_thresholds WHERE scope = 'default' AND key = ''),
+        {DEFAULT_REORDER_LEVEL}
+    )"""
+
+
+def _sale_sql(sign: str, item: str) -> list[str]:
+    """Sentencias que suman (sign='+') o restan (sign='-') una línea de pedido al estado del producto"""
+    day = f"COALESCE((SELECT DATE(order_date) FROM orders WHERE id = {item}.order_id), DATE('now'))"
+    statements = [f"""
+        UPDATE inventory_state
+        SET units_sold = units_sold {sign} COALESCE({item}.quantity, 0),
+            sales_count = sales_count {sign} 1
+        WHERE product_id = {item}.product_id
+    """]
+    if sign == "+":
+        statements.append(f"""
+            UPDATE inventory_state SET last_sold_at = {day}
+            WHERE product_id = {item}.product_id AND (last_sold_at IS NULL OR last_sold_at < {day})
+        """)
+        statements.append(f"""
+            INSERT INTO inventory_daily_sales (product_id, day, units, items)
+            VALUES ({item}.product_id, {day}, COALESCE({item}.quantity, 0), 1)
+            ON CONFLICT (product_id, day) DO UPDATE SET units = units + excluded.units, items = items + 1
+        """)
+    else:
+        statements.append(f"""
+            UPDATE inventory_daily_sales SET units = units - COALESCE({item}.quantity, 0), items = items - 1
+            WHERE product_id = {item}.product_id AND day = {day}
+        """)
+        statements.append(f"""
+            DELETE FROM inventory_daily_sales
+            WHERE product_id = {item}.product_id AND day = {day} AND items <= 0
+        """)
+        # la última venta pasa a ser el día más reciente que aún tiene líneas (búsqueda por clave primaria)
+        statements.append(f"""
+            UPDATE inventory_state
+            SET last_sold_at = (SELECT MAX(day) FROM inventory_daily_sales WHERE product_id = {item}.product_id)
+            WHERE product_id = {item}.product_id
+        """)
+    return statements
+
+
+def _trigger(name: str, event: str, table: str, statements: list[str], when: str | None = None) -> str:
+    # nombre calificado con main: la tabla se busca en main aunque haya vistas TEMP con el mismo nombre
+    when_clause = f"WHEN {when}" if when else ""
+    body = ";\n".join(statement.strip() for statement in statements)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS main.{name} AFTER {event} ON {table} {when_clause}
+        BEGIN
+            {body};
+        END
+    """
+
+
+# las ventas archivadas en particiones se mueven, no se deshacen
+_TRACKING = "(SELECT paused FROM inventory_sync) = 0"
+
+
+def rebuild_inventory(cursor):
+    """Recalcula inventory_state e inventory_daily_sales desde cero (estado inicial de la migración 4).
+
+    order_items puede ser la vista con particiones si la conexión las tiene.
+    """
+    cursor.execute("DELETE FROM main.inventory_state")
+    cursor.execute("DELETE FROM main.inventory_daily_sales")
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO main.inventory_state
+            (product_id, reorder_level, low_stock, units_sold, sales_count, last_sold_at)
+        SELECT p.id, {_reorder_level_sql('p.id', 'p.category')}, 0,
+               COALESCE(s.units_sold, 0), COALESCE(s.sales_count, 0), s.last_sold_at
+        FROM products p
+        LEFT JOIN (
+            SELECT oi.product_id, SUM(oi.quantity) AS units_sold, COUNT(*) AS sales_count,
+                   MAX(COALESCE(DATE(o.order_date), DATE('now'))) AS last_sold_at
+            FROM order_items oi LEFT JOIN orders o ON o.id = oi.order_id
+            GROUP BY oi.product_id
+        ) s ON s.product_id = p.id
+    """)
+    cursor.execute("""
+        UPDATE main.inventory_state
+        SET low_stock = (SELECT COALESCE(p.stock, 0) < inventory_state.reorder_level FROM products p WHERE p.id = product_id)
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO main.inventory_daily_sales (product_id, day, units, items)
+        SELECT oi.product_id, COALESCE(DATE(o.order_date), DATE('now')), SUM(COALESCE(oi.quantity, 0)), COUNT(*)
+        FROM order_items oi LEFT JOIN orders o ON o.id = oi.order_id
+        WHERE oi.product_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+
+def create_inventory_engine(cursor, default_reorder_level: int = DEFAULT_REORDER_LEVEL):
+    """Tablas de umbrales y estado de inventario, con sus triggers (migración 4)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_thresholds (
+            scope TEXT NOT NULL CHECK (scope IN ('product', 'category', 'default')),
+            key TEXT NOT NULL,
+            reorder_level INTEGER NOT NULL,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(
+        "INSERT OR IGNORE INTO inventory_thresholds VALUES ('default', '', ?)", (default_reorder_level,)
+    )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_state (
+            product_id INTEGER PRIMARY KEY,
+            reorder_level INTEGER NOT NULL,
+            low_stock INTEGER NOT NULL,
+            units_sold INTEGER NOT NULL DEFAULT 0,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            last_sold_at DATE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_daily_sales (
+            product_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            units INTEGER NOT NULL,
+            items INTEGER NOT NULL,
+            PRIMARY KEY (product_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS inventory_sync (paused INTEGER NOT NULL)")
+    cursor.execute("INSERT INTO inventory_sync SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM inventory_sync)")
+
+    # índices parciales: las alertas leen solo las filas en alerta, no todo el catálogo
+    cursor.execute("CREATE INDEX IF NOT EXISTS inventory_low_stock ON inventory_state (product_id) WHERE low_stock = 1")
+    cursor.execute("CREATE INDEX IF NOT EXISTS inventory_unsold ON inventory_state (product_id) WHERE sales_count = 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS inventory_last_sold ON inventory_state (last_sold_at)")
+
+    rebuild_inventory(cursor)
+
+    refresh_product = f"""
+        UPDATE inventory_state
+        SET reorder_level = {_reorder_level_sql('NEW.id', 'NEW.category')},
+            low_stock = COALESCE(NEW.stock, 0) < {_reorder_level_sql('NEW.id', 'NEW.category')}
+        WHERE product_id = NEW.id
+    """
+    triggers = [
+        _trigger("inventory_product_ai", "INSERT", "products", [
+            "INSERT OR IGNORE INTO inventory_state (product_id, reorder_level, low_stock) VALUES (NEW.id, 0, 0)",
+            refresh_product,
+        ]),
+        _trigger("inventory_product_au", "UPDATE OF stock, category", "products", [refresh_product]),
+        _trigger("inventory_product_ad", "DELETE", "products", [
+            "DELETE FROM inventory_state WHERE product_id = OLD.id",
+            "DELETE FROM inventory_daily_sales WHERE product_id = OLD.id",
+        ]),
+        _trigger("inventory_item_ai", "INSERT", "order_items", _sale_sql("+", "NEW"), _TRACKING),
+        _trigger("inventory_item_ad", "DELETE", "order_items", _sale_sql("-", "OLD"), _TRACKING),
+        _trigger("inventory_item_au", "UPDATE OF product_id, quantity, order_id", "order_items",
+                 _sale_sql("-", "OLD") + _sale_sql("+", "NEW"), _TRACKING),
+    ]
+    # un cambio de umbral recalcula solo los productos a los que aplica
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        triggers.append(_trigger(f"inventory_threshold_{event.lower()}", event, "inventory_thresholds", [f"""
+            UPDATE inventory_state
+            SET reorder_level = (SELECT {_reorder_level_sql('p.id', 'p.category')} FROM products p WHERE p.id = product_id),
+                low_stock = (SELECT COALESCE(p.stock, 0) < {_reorder_level_sql('p.id', 'p.category')} FROM products p WHERE p.id = product_id)
+            WHERE ({row}.scope = 'default')
+               OR ({row}.scope = 'product' AND product_id = CAST({row}.key AS INTEGER))
+               OR ({row}.scope = 'category' AND product_id IN (SELECT id FROM products WHERE category = {row}.key))
+        """]))
+    for sql in triggers:
+        cursor.execute(sql)
+
+
+def create_order_date_tracking(cursor):
+    """Trigger que mueve las ventas de un pedido al cambiar su fecha (migración 5)"""
+    old_day = "COALESCE(DATE(OLD.order_date), DATE('now'))"
+    new_day = "COALESCE(DATE(NEW.order_date), DATE('now'))"
+    items = "SELECT product_id FROM order_items WHERE order_id = NEW.id AND product_id IS NOT NULL"
+    statements = [f"""
+        UPDATE inventory_daily_sales
+        SET units = units - (SELECT COALESCE(SUM(COALESCE(quantity, 0)), 0) FROM order_items
+                             WHERE order_id = NEW.id AND product_id = inventory_daily_sales.product_id),
+            items = items - (SELECT COUNT(*) FROM order_items
+                             WHERE order_id = NEW.id AND product_id = inventory_daily_sales.product_id)
+        WHERE day = {old_day} AND product_id IN ({items})
+    """, f"""
+        DELETE FROM inventory_daily_sales WHERE day = {old_day} AND items <= 0 AND product_id IN ({items})
+    """, f"""
+        INSERT INTO inventory_daily_sales (product_id, day, units, items)
+        SELECT product_id, {new_day}, SUM(COALESCE(quantity, 0)), COUNT(*)
+        FROM order_items WHERE order_id = NEW.id AND product_id IS NOT NULL
+        GROUP BY product_id
+        ON CONFLICT (product_id, day) DO UPDATE SET units = units + excluded.units, items = items + excluded.items
+    """, f"""
+        UPDATE inventory_state
+        SET last_sold_at = (SELECT MAX(day) FROM inventory_daily_sales WHERE product_id = inventory_state.product_id)
+        WHERE product_id IN ({items})
+    """]
+    when = f"{_TRACKING} AND {old_day} IS NOT {new_day}"
+    cursor.execute(_trigger("inventory_order_date_au", "UPDATE OF order_date", "orders", statements, when))
+
+
+@contextlib.contextmanager
+def suspend_tracking(conn: sqlite3.Connection):
+    """Dentro de una transacción abierta, mueve líneas de pedido sin contarlas como ventas o devoluciones"""
+    try:
+        conn.execute("UPDATE main.inventory_sync SET paused = 1")
+    except sqlite3.OperationalError:
+        # base sin el motor de inventario
+        yield
+        return
+    try:
+        yield
+    finally:
+        conn.execute("UPDATE main.inventory_sync SET paused = 0")
+
+
+def set_threshold(conn: sqlite3.Connection, scope: str, key: str | None, reorder_level: int | None) -> int:
+    """Crea, cambia o (con reorder_level None) borra un umbral; devuelve los productos en alerta de stock"""
+    if scope not in THRESHOLD_SCOPES:
+        raise ValueError(f"Alcance inválido: {scope}. Disponibles: {', '.join(THRESHOLD_SCOPES)}")
+    if scope == "default":
+        key = ""
+        if reorder_level is None:
+            raise ValueError("El umbral general no se puede borrar")
+    elif not key:
+        raise ValueError(f"El alcance {scope} requiere key")
+    if reorder_level is not None and reorder_level < 0:
+        raise ValueError("reorder_level debe ser >= 0")
+
+    with conn:
+        if reorder_level is None:
+            conn.execute("DELETE FROM main.inventory_thresholds WHERE scope = ? AND key = ?", (scope, str(key)))
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO main.inventory_thresholds VALUES (?, ?, ?)", (scope, str(key), reorder_level)
+            )
+    return alert_counts(conn)["low_stock"]
+
+
+def alert_counts(conn: sqlite3.Connection) -> dict:
+    """Conteos de alertas; cada COUNT recorre solo su índice parcial"""
+    row = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM inventory_state WHERE low_stock = 1),
+               (SELECT COUNT(*) FROM inventory_state WHERE sales_count = 0)
+    """).fetchone()
+    return {"low_stock": row[0], "without_sales": row[1]}
+
+
+def inventory_alerts(conn: sqlite3.Connection, reference_date: str | None = None,
+                     velocity_days: int = DEFAULT_VELOCITY_DAYS) -> dict:
+    """Productos bajo su punto de reorden (con días de cobertura) y productos sin ventas.
+
+    La velocidad es el promedio diario de unidades vendidas en los
+    velocity_days anteriores a reference_date (por defecto, el día de la
+    última venta registrada); days_of_cover = stock / velocidad.
+    """
+    if reference_date is None:
+        reference_date = conn.execute("SELECT MAX(last_sold_at) FROM inventory_state").fetchone()[0]
+
+    cursor = conn.execute("""
+        SELECT p.id, p.name, p.category, p.stock, p.supplier,
+               CASE WHEN p.cost IS NOT NULL THEN (p.price - p.cost) ELSE NULL END as profit_margin,
+               s.reorder_level, s.last_sold_at,
+               (SELECT COALESCE(SUM(d.units), 0) FROM inventory_daily_sales d
+                WHERE d.product_id = s.product_id
+                  AND d.day > DATE(:reference, '-' || :days || ' days') AND d.day <= DATE(:reference)
+               ) * 1.0 / :days as daily_velocity
+        FROM inventory_state s
+        JOIN products p ON p.id = s.product_id
+        WHERE s.low_stock = 1
+        ORDER BY p.stock ASC
+    """, {"reference": reference_date, "days": velocity_days})
+    columns = [column[0] for column in cursor.description]
+    low_stock = []
+    for row in cursor.fetchall():
+        item = dict(zip(columns, row))
+        velocity = item["daily_velocity"]
+        item["daily_velocity"] = round(velocity, 3) if velocity is not None else None
+        item["days_of_cover"] = round((item["stock"] or 0) / velocity, 1) if velocity else None
+        low_stock.append(item)
+
+    cursor = conn.execute("""
+        SELECT p.id, p.name, p.category, p.stock
+        FROM inventory_state s
+        JOIN products p ON p.id = s.product_id
+        WHERE s.sales_count = 0
+    """)
+    columns = [column[0] for column in cursor.description]
+    no_sales = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    return {
+        "reference_date": reference_date,
+        "velocity_days": velocity_days,
+        "low_stock_products": low_stock,
+        "products_without_sales": no_sales,
+    }
@@ -0,0 +1,327 @@
+"""Particionado opcional de orders / order_items por mes en archivos SQLite adjuntos.
+
+Uso:
+    python database_demo/partitions.py archive --hot-months 3
+    python database_demo/partitions.py archive --before 2024-01-01 --db database_demo/tenants/acme.db
+    python database_demo/partitions.py list
+
+Los pedidos de meses cerrados se mueven de la base principal a
+<base>.partitions/orders_YYYY_MM.db junto con sus order_items; cada archivo
+queda de solo lectura y se adjunta con immutable=1, así SQLite no lo vuelve a
+verificar ni bloquear. En cada conexión las vistas TEMP orders y order_items
+unen la tabla principal (los meses activos) con las particiones, de modo que
+el SQL existente sigue funcionando sin cambios.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import stat
+import sys
+from datetime import date
+from urllib.parse import quote
+from inventory import suspend_tracking
+
+
+PARTITIONED_TABLES = ["orders", "order_items"]
+REGISTRY_TABLE = "_partitions"
+_SCHEMA_PREFIX = "p_"
+_PARTITION_NAME = re.compile(r"^\d{4}(_\d{2})?$")
+# columna del registro con las filas archivadas de cada tabla
+_COUNT_COLUMNS = {"orders": "orders_count", "order_items": "items_count"}
+
+
+def create_partition_registry(cursor):
+    """Registro de particiones archivadas (migración 3)"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            orders_count INTEGER NOT NULL,
+            items_count INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def readonly_uri(path: str) -> str:
+    return f"file:{quote(os.path.abspath(path))}?mode=ro&immutable=1"
+
+
+def partition_layout(conn: sqlite3.Connection) -> list[dict]:
+    """Particiones registradas en la base principal, de la más antigua a la más nueva"""
+    try:
+        rows = conn.execute(f"""
+            SELECT name, path, start_date, end_date, orders_count, items_count
+            FROM main.{REGISTRY_TABLE} ORDER BY start_date
+        """).fetchall()
+    except sqlite3.OperationalError:
+        # base sin migrar (o de solo lectura sin el registro): sin particiones
+        return []
+    columns = ["name", "path", "start_date", "end_date", "orders_count", "items_count"]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def prune(layout: list[dict], start: str | None = None, end: str | None = None) -> list[dict]:
+    """Particiones que pueden tener pedidos en [start, end] (fechas YYYY-MM-DD, extremos opcionales)"""
+    return [
+        partition for partition in layout
+        if (start is None or partition["end_date"] >= start[:10])
+        and (end is None or partition["start_date"] <= end[:10])
+    ]
+
+
+def archived_rows(layout: list[dict], table: str) -> int:
+    """Filas de la tabla guardadas en las particiones del layout (0 si la tabla no se particiona)"""
+    column = _COUNT_COLUMNS.get(table)
+    return sum(partition[column] for partition in layout) if column else 0
+
+
+def _same_file(attached: str, registered: str) -> bool:
+    return attached == registered or os.path.realpath(attached) == os.path.realpath(registered)
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA "{schema}".table_info("{table}")')]
+
+
+def install_views(conn: sqlite3.Connection, layout: list[dict], start: str | None = None,
+                  end: str | None = None) -> list[dict]:
+    """Adjunta las particiones de [start, end] y arma las vistas TEMP que las unen a main.
+
+    Es idempotente: si la conexión ya tiene exactamente esas particiones
+    adjuntas no hace nada, así puede llamarse en cada uso de una conexión del
+    pool. Devuelve las particiones adjuntadas.
+    """
+    selected = prune(layout, start, end)
+    wanted = {_SCHEMA_PREFIX + partition["name"]: partition for partition in selected}
+    attached = {
+        row[1]: row[2] for row in conn.execute("PRAGMA database_list")
+        if row[1].startswith(_SCHEMA_PREFIX)
+    }
+    # una partición consolidada conserva el nombre pero cambia de archivo: se compara también la ruta
+    current = {
+        schema for schema, path in attached.items()
+        if schema in wanted and _same_file(path, wanted[schema]["path"])
+    }
+    if current == set(attached) == set(wanted):
+        return selected
+
+    for table in PARTITIONED_TABLES:
+        conn.execute(f'DROP VIEW IF EXISTS temp."{table}"')
+    for schema in set(attached) - current:
+        conn.execute(f'DETACH DATABASE "{schema}"')
+    for schema in sorted(set(wanted) - current):
+        conn.execute(f'ATTACH DATABASE ? AS "{schema}"', (readonly_uri(wanted[schema]["path"]),))
+
+    if wanted:
+        for table in PARTITIONED_TABLES:
+            columns = _columns(conn, "main", table)
+            selects = [f'SELECT {", ".join(columns)} FROM main."{table}"']
+            for schema in sorted(wanted):
+                # una partición archivada antes de un ALTER TABLE no tiene las columnas nuevas
+                existing = set(_columns(conn, schema, table))
+                select_list = ", ".join(column if column in existing else f"NULL AS {column}" for column in columns)
+                selects.append(f'SELECT {select_list} FROM "{schema}"."{table}"')
+            conn.execute(f'CREATE TEMP VIEW "{table}" AS {" UNION ALL ".join(selects)}')
+    return selected
+
+
+# --- archivado -----------------------------------------------------------------
+
+def _month_bounds(key: str) -> tuple[str, str]:
+    year, month = int(key[:4]), int(key[5:7])
+    last = (date(year + (month == 12), month % 12 + 1, 1).toordinal() - 1)
+    return f"{year:04d}-{month:02d}-01", date.fromordinal(last).isoformat()
+
+
+def _create_partition_file(main: sqlite3.Connection, path: str):
+    """Crea el archivo de la partición con el mismo DDL que las tablas de main"""
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        os.remove(path)
+    part = sqlite3.connect(path)
+    for table in PARTITIONED_TABLES:
+        sql = main.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        part.execute(sql)
+    part.commit()
+    part.close()
+
+
+def _seal(path: str):
+    """Deja la partición de solo lectura en disco"""
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _index_partition(conn: sqlite3.Connection, schema: str):
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "{schema}".orders_order_date ON orders (order_date)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "{schema}".order_items_order_id ON order_items (order_id)')
+
+
+def archive(db_path: str, before: str, partitions_dir: str | None = None,
+            max_attached: int | None = None) -> list[dict]:
+    """Mueve a particiones los meses completos anteriores a before (YYYY-MM-DD).
+
+    Cada mes se copia y se borra de main en una sola transacción que abarca
+    ambos archivos. Un mes ya archivado no se reabre: los pedidos con fecha
+    vieja que lleguen después quedan en main y las vistas los siguen
+    mostrando. Si las particiones superan el límite de ATTACH de SQLite se
+    consolidan los meses más antiguos en archivos anuales.
+    """
+    partitions_dir = partitions_dir or f"{db_path}.partitions"
+    os.makedirs(partitions_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    max_attached = max_attached or conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    create_partition_registry(conn)
+    archived = {partition["name"] for partition in partition_layout(conn)}
+    created = []
+
+    try:
+        keys = [row[0] for row in conn.execute("""
+            SELECT DISTINCT strftime('%Y_%m', order_date) FROM main.orders
+            WHERE order_date IS NOT NULL AND order_date < ? ORDER BY 1
+        """, (before[:7] + "-01",))]
+
+        for key in keys:
+            if key is None or key in archived:
+                continue
+            start, end = _month_bounds(key)
+            path = os.path.join(partitions_dir, f"orders_{key}.db")
+            _create_partition_file(conn, path)
+            conn.execute("ATTACH DATABASE ? AS new_partition", (path,))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("""
+                        INSERT INTO new_partition.orders SELECT * FROM main.orders
+                        WHERE order_date >= ? AND order_date < date(?, '+1 day')
+                    """, (start, end))
+                    conn.execute("""
+                        INSERT INTO new_partition.order_items SELECT * FROM main.order_items
+                        WHERE order_id IN (SELECT id FROM new_partition.orders)
+                    """)
+                    _index_partition(conn, "new_partition")
+                    with suspend_tracking(conn):
+                        conn.execute("DELETE FROM main.order_items WHERE order_id IN (SELECT id FROM new_partition.orders)")
+                        conn.execute("DELETE FROM main.orders WHERE id IN (SELECT id FROM new_partition.orders)")
+                    orders_count = conn.execute("SELECT COUNT(*) FROM new_partition.orders").fetchone()[0]
+                    items_count = conn.execute("SELECT COUNT(*) FROM new_partition.order_items").fetchone()[0]
+                    conn.execute(f"""
+                        INSERT INTO main.{REGISTRY_TABLE} (name, path, start_date, end_date, orders_count, items_count)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (key, os.path.abspath(path), start, end, orders_count, items_count))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.execute("DETACH DATABASE new_partition")
+            _seal(path)
+            archived.add(key)
+            created.append({"name": key, "orders": orders_count, "items": items_count})
+
+        _consolidate(conn, partitions_dir, max_attached)
+    finally:
+        conn.close()
+    return created
+
+
+def _consolidate(conn: sqlite3.Connection, partitions_dir: str, max_attached: int):
+    """Une los meses del año más antiguo en una partición anual mientras se supere max_attached"""
+    while True:
+        layout = partition_layout(conn)
+        if len(layout) <= max_attached:
+            return
+        months_by_year: dict[str, list[dict]] = {}
+        for partition in layout:
+            if "_" in partition["name"]:
+                months_by_year.setdefault(partition["name"][:4], []).append(partition)
+        candidates = [year for year, months in sorted(months_by_year.items()) if len(months) > 1]
+        if not candidates:
+            raise RuntimeError(
+                f"{len(layout)} particiones superan el límite de ATTACH de SQLite ({max_attached}) "
+                "y no quedan meses que consolidar"
+            )
+        year = candidates[0]
+        months = months_by_year[year]
+        existing_year = next((p for p in layout if p["name"] == year), None)
+        sources = months + ([existing_year] if existing_year else [])
+
+        # cada consolidación escribe un archivo nuevo (orders_YYYY.<generación>.db): las
+        # conexiones que tienen adjunto el anterior ven el cambio de ruta y lo vuelven a adjuntar
+        generation = 1
+        if existing_year:
+            match = re.search(r"\.(\d+)\.db$", existing_year["path"])
+            generation = int(match.group(1)) + 1 if match else 2
+        final_path = os.path.join(partitions_dir, f"orders_{year}.{generation}.db")
+        path = f"{final_path}.tmp"
+        _create_partition_file(conn, path)
+        conn.execute("ATTACH DATABASE ? AS new_partition", (path,))
+        try:
+            for source in sources:
+                conn.execute("ATTACH DATABASE ? AS source_partition", (readonly_uri(source["path"]),))
+                try:
+                    conn.execute("INSERT INTO new_partition.orders SELECT * FROM source_partition.orders")
+                    conn.execute("INSERT INTO new_partition.order_items SELECT * FROM source_partition.order_items")
+                finally:
+                    conn.execute("DETACH DATABASE source_partition")
+            _index_partition(conn, "new_partition")
+        finally:
+            conn.execute("DETACH DATABASE new_partition")
+
+        os.replace(path, final_path)
+        _seal(final_path)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(f"DELETE FROM main.{REGISTRY_TABLE} WHERE name = ?", [(p["name"],) for p in sources])
+        conn.execute(f"""
+            INSERT INTO main.{REGISTRY_TABLE} (name, path, start_date, end_date, orders_count, items_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            year, os.path.abspath(final_path),
+            min(p["start_date"] for p in sources), max(p["end_date"] for p in sources),
+            sum(p["orders_count"] for p in sources), sum(p["items_count"] for p in sources)
+        ))
+        conn.execute("COMMIT")
+        for source in sources:
+            # las conexiones que aún lo tienen adjunto conservan su descriptor abierto
+            os.chmod(source["path"], stat.S_IRUSR | stat.S_IWUSR)
+            os.remove(source["path"])
+
+
+def _hot_cutoff(hot_months: int, today: date | None = None) -> str:
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - hot_months + 1
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiones mensuales de orders / order_items")
+    parser.add_argument("--db", default="database_demo/mcp_database.db")
+    parser.add_argument("--dir", help="Directorio de particiones (por defecto <db>.partitions)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = subparsers.add_parser("archive", help="Archivar meses cerrados en particiones")
+    group = archive_parser.add_mutually_exclusive_group()
+    group.add_argument("--hot-months", type=int, default=3, help="Meses (incluido el actual) que quedan en la base principal")
+    group.add_argument("--before", help="Archivar los meses anteriores a esta fecha (YYYY-MM-DD)")
+    subparsers.add_parser("list", help="Listar particiones")
+
+    args = parser.parse_args()
+    if args.command == "archive":
+        before = args.before or _hot_cutoff(args.hot_months)
+        result = archive(args.db, before, args.dir)
+    else:
+        conn = sqlite3.connect(args.db)
+        result = partition_layout(conn)
+        conn.close()
+    json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import threading
+import time
+
+
+_active_session: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """Datos capturados durante una llamada perfilada"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profiles: list[cProfile.Profile] = []
+        self.statements: list[dict] = []
+        self._lock = threading.Lock()
+        self._open: dict[int, dict] = {}
+        self.started = time.perf_counter()
+
+    def add_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            self.profiles.append(profile)
+
+    def trace_callback(self, conn_id: int):
+        """Callback para set_trace_callback: cierra la sentencia anterior de la conexión y abre la nueva"""
+        def callback(statement: str):
+            now = time.perf_counter()
+            with self._lock:
+                self._close_statement(conn_id, now)
+                entry = {"sql": " ".join(statement.split()), "start_ms": round((now - self.started) * 1000, 3)}
+                self._open[conn_id] = {"entry": entry, "t": now}
+                self.statements.append(entry)
+        return callback
+
+    def _close_statement(self, conn_id: int, now: float):
+        current = self._open.pop(conn_id, None)
+        if current:
+            current["entry"]["duration_ms"] = round((now - current["t"]) * 1000, 3)
+
+    def finish(self):
+        now = time.perf_counter()
+        with self._lock:
+            for conn_id in list(self._open):
+                self._close_statement(conn_id, now)
+
+
+def trace_connection(conn):
+    """Registra las sentencias de la conexión si hay una sesión de perfilado activa"""
+    session = _active_session.get()
+    if session is not None:
+        conn.set_trace_callback(session.trace_callback(id(conn)))
+    return conn
+
+
+def profiled(func):
+    """Envuelve una función que corre en otro hilo para que también quede perfilada"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _active_session.get()
+        if session is None:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            session.add_profile(profile)
+    return wrapper
+
+
+def folded_stacks(stats: pstats.Stats, max_depth: int = 64) -> list[str]:
+    """Convierte pstats al formato 'a;b;c <microsegundos>' de flamegraph.pl / speedscope.
+
+    cProfile solo guarda aristas caller -> callee, no pilas completas, así que
+    el tiempo de cada función se reparte entre sus llamadores en proporción
+    al tiempo acumulado de cada arista.
+    """
+    raw = stats.stats
+    callees: dict[tuple, list[tuple]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func: tuple) -> str:
+        filename, line, name = func
+        text = name if filename == "~" else f"{name} ({os.path.basename(filename)}:{line})"
+        return text.replace(";", ",")
+
+    samples: dict[str, float] = {}
+
+    def walk(func: tuple, stack: list[tuple], budget: float):
+        cumulative = raw[func][3]
+        if cumulative <= 0 or budget <= 0:
+            return
+        scale = budget / cumulative
+        path = ";".join(label(f) for f in stack)
+        samples[path] = samples.get(path, 0.0) + raw[func][2] * scale
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_cumulative in callees.get(func, []):
+            if callee in raw and callee not in stack:
+                walk(callee, stack + [callee], edge_cumulative * scale)
+
+    roots = [func for func, value in raw.items() if not any(caller in raw for caller in value[4])]
+    for root in roots:
+        walk(root, [root], raw[root][3])
+
+    return [f"{path} {int(seconds * 1_000_000)}" for path, seconds in samples.items() if seconds >= 1e-6]
+
+
+class CallProfiler:
+    """Perfilado opcional de llamadas a herramientas.
+
+    Se activa con MCP_PROFILE_RATE (fracción de llamadas muestreadas, 0 por
+    defecto) o por llamada con el argumento "_profile": true. Por cada llamada
+    muestreada escribe en MCP_PROFILE_DIR:
+      - <id>.prof   estadísticas cProfile (snakeviz, pstats)
+      - <id>.folded pilas plegadas (flamegraph.pl, speedscope)
+      - <id>.json   resumen con tiempos de SQL por sentencia y de framing MCP
+
+    El cProfile del hilo del event loop también ve las otras tareas que corren
+    mientras la llamada espera; el trabajo en hilos se captura con profiled().
+    Los tiempos por sentencia van desde que SQLite inicia la sentencia hasta
+    la siguiente de la misma conexión (o el fin de la llamada), incluyendo el
+    fetch desde Python.
+    """
+
+    def __init__(self, output_dir: str | None = None, sample_rate: float | None = None):
+        self.output_dir = output_dir or os.environ.get("MCP_PROFILE_DIR", "profiles")
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("MCP_PROFILE_RATE", "0"))
+        self.sample_rate = sample_rate
+        self._active = False
+
+    def should_profile(self, arguments: dict) -> bool:
+        if self._active:
+            # cProfile admite un solo perfilador activo por hilo
+            return False
+        if arguments.get("_profile"):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextlib.asynccontextmanager
+    async def session(self, name: str):
+        session = ProfileSession(name)
+        token = _active_session.set(session)
+        profile = cProfile.Profile()
+        self._active = True
+        profile.enable()
+        try:
+            yield session
+        finally:
+            profile.disable()
+            self._active = False
+            _active_session.reset(token)
+            session.add_profile(profile)
+            session.finish()
+
+    def write(self, session: ProfileSession, arguments: dict, total: float, framing: float) -> str:
+        """Escribe los archivos de la sesión y devuelve su prefijo"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{session.name}"
+        )
+
+        stats = pstats.Stats(session.profiles[0])
+        for profile in session.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(f"{prefix}.prof")
+
+        with open(f"{prefix}.folded", "w", encoding="utf-8") as f:
+            f.write("\n".join(folded_stacks(stats)) + "\n")
+
+        sql_ms = sum(entry.get("duration_ms", 0.0) for entry in session.statements)
+        summary = {
+            "tool": session.name,
+            "arguments": arguments,
+            "total_ms": round(total * 1000, 3),
+            "sql_ms": round(sql_ms, 3),
+            "framing_ms": round(framing * 1000, 3),
+            "statements": session.statements,
+        }
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+        return prefix
@@ -0,0 +1,122 @@
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any
+import mcp.types as types
+from jsonschema.validators import validator_for
+
+
+@dataclass
+class ToolSpec:
+    """Declaración de una herramienta: schema, argumentos por defecto y SQL se definen una sola vez.
+
+    Con handler la atiende ese método del servidor, que recibe los argumentos
+    en el orden de properties. Sin handler es un reporte declarativo: se
+    ejecutan sus sentencias con los argumentos como parámetros :nombre y la
+    respuesta es el encabezado más un JSON con el resultado de cada sentencia.
+    """
+    name: str
+    description: str
+    properties: dict = field(default_factory=dict)
+    required: list = field(default_factory=list)
+    defaults: dict = field(default_factory=dict)      # valor de los argumentos opcionales omitidos
+    handler: str | None = None
+    sql: dict = field(default_factory=dict)           # sentencias con nombre, parametrizadas con :argumento
+    cacheable: bool = False                           # solo lectura y determinista
+    header: str = ""                                  # (reportes) encabezado, con format() sobre los argumentos
+    echo: tuple = ()                                  # (reportes) argumentos repetidos al inicio del JSON
+    single_row: tuple = ()                            # (reportes) sentencias que devuelven una sola fila
+    error: str = "Error"                              # (reportes) prefijo del mensaje de error
+
+    def bind(self, arguments: dict[str, Any]) -> dict[str, Any]:
+        """Argumentos de la llamada completados con los valores por defecto, en el orden de properties"""
+        return {name: arguments.get(name, self.defaults.get(name)) for name in self.properties}
+
+
+class _RecordedParameters(dict):
+    """Parámetros de EXPLAIN: cualquier nombre vale NULL y queda registrado"""
+
+    def __init__(self):
+        super().__init__()
+        self.names = []
+
+    def __missing__(self, name):
+        self.names.append(name)
+        return None
+
+
+class ToolRegistry:
+    """Herramientas del servidor armadas una vez al iniciar.
+
+    La lista de tools (con su schema y anotaciones) y el validador de
+    argumentos de cada una se construyen aquí y no en cada tools/list o
+    tools/call. validate() compila cada sentencia con EXPLAIN contra una base
+    ya migrada y warm() la deja preparada en el cache de sentencias de una
+    conexión, así la primera llamada no paga el parseo.
+    """
+
+    def __init__(self, specs: list[ToolSpec], common_properties: dict | None = None):
+        self._specs = {spec.name: spec for spec in specs}
+        self._validators = {}
+        self._parameters: dict[tuple[str, str], list[str]] = {}
+        # solo lectura y deterministas: su resultado va al cache persistente
+        self.cacheable = frozenset(spec.name for spec in specs if spec.cacheable)
+        tools = []
+        for spec in specs:
+            schema = {"type": "object", "properties": {**spec.properties, **(common_properties or {})}}
+            if spec.required:
+                schema["required"] = list(spec.required)
+            validator_class = validator_for(schema)
+            validator_class.check_schema(schema)
+            self._validators[spec.name] = validator_class(schema)
+            tool = types.Tool(name=spec.name, description=spec.description, inputSchema=schema)
+            if spec.cacheable:
+                # el cliente puede cachear sus resultados mientras no cambie data_version
+                tool.annotations = types.ToolAnnotations(readOnlyHint=True, idempotentHint=True)
+            tools.append(tool)
+        self.tools = types.ListToolsResult(tools=tools)
+
+    def get(self, name: str) -> ToolSpec | None:
+        return self._specs.get(name)
+
+    def sql(self, tool: str, name: str) -> str:
+        return self._specs[tool].sql[name]
+
+    def check_arguments(self, name: str, arguments: dict[str, Any]) -> str | None:
+        """Mensaje del primer error de validación de los argumentos; None si son válidos o la herramienta no existe"""
+        validator = self._validators.get(name)
+        if validator is None:
+            return None
+        error = next(validator.iter_errors(arguments), None)
+        return error.message if error is not None else None
+
+    def validate(self, conn: sqlite3.Connection):
+        """Compila cada sentencia con EXPLAIN y comprueba que sus parámetros sean argumentos de la herramienta"""
+        for spec in self._specs.values():
+            for name, sql in spec.sql.items():
+                parameters = _RecordedParameters()
+                try:
+                    conn.execute(f"EXPLAIN {sql}", parameters).fetchall()
+                except sqlite3.Error as e:
+                    raise ValueError(f"SQL inválido en {spec.name}.{name}: {e}") from e
+                unknown = [param for param in parameters.names if param not in spec.properties]
+                if unknown:
+                    raise ValueError(f"Parámetros sin argumento en {spec.name}.{name}: {', '.join(unknown)}")
+                self._parameters[(spec.name, name)] = parameters.names
+
+    def warm(self, conn: sqlite3.Connection) -> int:
+        """Prepara las sentencias validadas en el cache de sentencias de la conexión sin ejecutarlas; devuelve cuántas quedaron en él"""
+        warmed = 0
+        for (tool, name), parameters in self._parameters.items():
+            sql = self._specs[tool].sql[name]
+            # sqlite3 (CPython 3.11) toma la sentencia del cache o la prepara y la guarda antes de enlazar
+            # los parámetros: con uno de más falla el enlace antes del primer paso y queda preparada.
+            # no está documentado (tests/test_registry.py lo fija), así que solo cuenta ese error; con
+            # cualquier otro resultado se compila con EXPLAIN, que al menos carga el esquema en la conexión
+            try:
+                conn.execute(sql, (None,) * (len(parameters) + 1))
+            except sqlite3.ProgrammingError as e:
+                if "number of bindings" in str(e):
+                    warmed += 1
+                    continue
+            conn.execute(f"EXPLAIN {sql}", _RecordedParameters()).fetchall()
+        return warmed
@@ -0,0 +1,125 @@
+"""Reproduce un trace grabado (MCP_TRACE_FILE) contra un proceso database_server.py.
+
+Uso:
+    python database_demo/replay.py trace.jsonl --speed 1      # ritmo original
+    python database_demo/replay.py trace.jsonl --speed 4      # 4x más rápido
+    python database_demo/replay.py trace.jsonl --speed max --concurrency 16
+
+Reporta la distribución de latencias por herramienta (p50/p90/p99/max),
+comparada con la grabada, y las respuestas que difieren del trace.
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import sys
+import time
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from tracing import normalize_response, read_trace, response_digest
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def latency_summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p90_ms": round(percentile(values, 90), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(max(values, default=0.0), 3),
+    }
+
+
+def schedule(trace: list[dict], speed: float | None) -> list[tuple[float, dict]]:
+    """(segundos desde el inicio del replay, entrada) en orden de inicio; con speed=None todas salen a la vez"""
+    # cada línea se escribe al terminar la llamada pero t es su inicio: el archivo no viene ordenado por t
+    ordered = sorted(trace, key=lambda entry: entry["t"])
+    origin = ordered[0]["t"] if ordered else 0.0
+    return [((entry["t"] - origin) / speed if speed else 0.0, entry) for entry in ordered]
+
+
+async def replay(trace: list[dict], server: str, speed: float | None, concurrency: int,
+                 max_diffs: int = 5) -> dict:
+    """Reproduce el trace; speed=None significa lo más rápido posible"""
+    server_params = StdioServerParameters(command=sys.executable, args=[server])
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: dict[str, list[float]] = {}
+    recorded: dict[str, list[float]] = {}
+    diffs = []
+    errors = 0
+
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            started = time.perf_counter()
+
+            async def play(offset: float, entry: dict):
+                nonlocal errors
+                delay = offset - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                async with semaphore:
+                    t0 = time.perf_counter()
+                    result = await session.call_tool(entry["n"], entry.get("a") or {})
+                    elapsed = (time.perf_counter() - t0) * 1000
+                text = "".join(getattr(content, "text", "") for content in result.content)
+                latencies.setdefault(entry["n"], []).append(elapsed)
+                recorded.setdefault(entry["n"], []).append(entry.get("ms", 0.0))
+                if result.isError or text.startswith("Error"):
+                    errors += 1
+                if response_digest(text) != entry.get("h"):
+                    diff = None
+                    if "r" in entry and len(diffs) < max_diffs:
+                        diff = "\n".join(difflib.unified_diff(
+                            normalize_response(entry["r"]).splitlines(),
+                            normalize_response(text).splitlines(),
+                            "grabado", "replay", lineterm="", n=1
+                        ))
+                    diffs.append({"tool": entry["n"], "arguments": entry.get("a"), "diff": diff})
+
+            await asyncio.gather(*(play(offset, entry) for offset, entry in schedule(trace, speed)))
+            wall = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "calls": len(trace),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_calls_per_s": round(len(trace) / wall, 1) if wall else None,
+        "overall": latency_summary(all_latencies),
+        "by_tool": {
+            name: {"replay": latency_summary(values), "recorded": latency_summary(recorded[name])}
+            for name, values in sorted(latencies.items())
+        },
+        "response_diffs": len(diffs),
+        "diff_samples": [d for d in diffs if d["diff"]][:max_diffs],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de traces de llamadas MCP")
+    parser.add_argument("trace", help="Archivo de trace (.jsonl o .jsonl.gz)")
+    parser.add_argument("--server", default="database_demo/database_server.py")
+    parser.add_argument("--speed", default="1", help="Factor de velocidad (1, 2, 10...) o 'max'")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="Guardar el reporte JSON en este archivo")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    report = asyncio.run(replay(read_trace(args.trace), args.server, speed, args.concurrency))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
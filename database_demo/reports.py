@@ -0,0 +1,129 @@
+import contextlib
+import sqlite3
+
+
+# Cada reporte es una sola consulta de desglose (un recorrido de la tabla) que
+# además trae, en columnas con prefijo "_", las sumas parciales necesarias
+# para derivar el resumen sin volver a recorrer la tabla.
+REPORT_PIPELINES = {
+    "sales": {
+        "title": "Sales Report",
+        "breakdown": "daily_sales",
+        "query": """
+            SELECT
+                DATE(o.order_date) as date,
+                COUNT(*) as orders_count,
+                SUM(o.total_amount) as daily_revenue,
+                AVG(o.total_amount) as avg_order_value,
+                COUNT(o.total_amount) as _amount_count
+            FROM orders o
+            WHERE o.status IN ('completed', 'shipped')
+            GROUP BY DATE(o.order_date)
+            ORDER BY date DESC
+        """,
+    },
+    "customers": {
+        "title": "Customer Report",
+        "breakdown": "by_country",
+        "query": """
+            SELECT country, COUNT(*) as customer_count,
+                   SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_count
+            FROM users
+            GROUP BY country
+            ORDER BY customer_count DESC
+        """,
+    },
+    "products": {
+        "title": "Product Report",
+        "breakdown": "by_category",
+        "query": """
+            SELECT category, COUNT(*) as product_count,
+                   AVG(price) as avg_price,
+                   SUM(stock) as total_stock,
+                   COUNT(CASE WHEN stock < 10 THEN 1 END) as _low_stock_count,
+                   SUM(price) as _price_sum,
+                   COUNT(price) as _price_count
+            FROM products
+            GROUP BY category
+            ORDER BY product_count DESC
+        """,
+    },
+}
+
+
+def _sum(rows: list[dict], column: str):
+    """SUM() de SQL sobre los parciales: None si no hay ningún valor"""
+    values = [row[column] for row in rows if row[column] is not None]
+    return sum(values) if values else None
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if numerator is not None and denominator else None
+
+
+def _sales_summary(rows: list[dict]) -> dict:
+    revenue = _sum(rows, "daily_revenue")
+    return {
+        "total_revenue": revenue,
+        "total_orders": sum(row["orders_count"] for row in rows),
+        "avg_order_value": _ratio(revenue, sum(row["_amount_count"] for row in rows)),
+    }
+
+
+def _customers_summary(rows: list[dict]) -> dict:
+    return {
+        "total_customers": sum(row["customer_count"] for row in rows),
+        "active_customers": _sum(rows, "active_count"),
+    }
+
+
+def _products_summary(rows: list[dict]) -> dict:
+    return {
+        "total_products": sum(row["product_count"] for row in rows),
+        "low_stock_count": sum(row["_low_stock_count"] for row in rows),
+        "avg_price": _ratio(_sum(rows, "_price_sum"), sum(row["_price_count"] for row in rows)),
+    }
+
+
+SUMMARIES = {
+    "sales": _sales_summary,
+    "customers": _customers_summary,
+    "products": _products_summary,
+}
+
+
+@contextlib.contextmanager
+def read_transaction(conn: sqlite3.Connection):
+    """Transacción de lectura: todas las consultas ven la misma versión de la base"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+def build_report(conn: sqlite3.Connection, report_type: str) -> dict:
+    """Desglose y resumen del reporte con un solo recorrido, dentro de una transacción de lectura.
+
+    Las consultas no dependen del período (cubren todo el historial): el mismo
+    resultado sirve para week, month y quarter.
+    """
+    pipeline = REPORT_PIPELINES.get(report_type)
+    if pipeline is None:
+        raise ValueError(f"Tipo de reporte desconocido: {report_type}")
+
+    with read_transaction(conn):
+        cursor = conn.execute(pipeline["query"])
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    summary = SUMMARIES[report_type](rows)
+    breakdown = [{k: v for k, v in row.items() if not k.startswith("_")} for row in rows]
+    return {
+        "report_type": pipeline["title"],
+        "summary": summary,
+        pipeline["breakdown"]: breakdown,
+    }
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+# Configuración por defecto del cache persistente; se sobreescribe con el
+# argumento result_cache_config o la variable de entorno MCP_RESULT_CACHE (JSON).
+DEFAULT_RESULT_CACHE_CONFIG = {
+    "enabled": True,
+    "max_bytes": 64 * 1024 * 1024,   # tamaño máximo de los resultados guardados (comprimidos)
+    "touch_seconds": 60.0,           # frecuencia máxima con que un hit actualiza last_access
+    "busy_timeout_ms": 2000,         # espera ante otro proceso escribiendo el mismo cache
+}
+
+# argumentos que no cambian el resultado de la herramienta
+IGNORED_ARGUMENTS = {"tenant", "_profile", "_structured"}
+
+
+def database_fingerprint(db_path: str) -> str:
+    """Huella del contenido de la base sin abrirla con SQLite.
+
+    Combina el file change counter del encabezado (bytes 24-27, que SQLite
+    incrementa en cada commit en modo rollback journal) con tamaño y mtime
+    del archivo y de su -wal, donde van los commits en modo WAL.
+    PRAGMA data_version no sirve aquí: es por conexión y no sobrevive a
+    un reinicio.
+    """
+    parts = []
+    with open(db_path, "rb") as f:
+        header = f.read(100)
+    parts.append(header[24:28].hex())
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return "-".join(parts)
+
+
+def cache_key(tool: str, arguments: dict) -> str:
+    relevant = {k: v for k, v in arguments.items() if k not in IGNORED_ARGUMENTS}
+    encoded = json.dumps([tool, relevant], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache de resultados de herramientas en un archivo SQLite junto a la base.
+
+    Cada entrada se identifica por herramienta + argumentos y guarda la huella
+    de la base con que se calculó: si la base cambió, la entrada deja de
+    servirse y se reemplaza en el próximo put. El archivo usa WAL y
+    busy_timeout, así que varios procesos del servidor pueden leerlo y
+    escribirlo a la vez; cualquier error del cache se trata como un miss.
+    Al superar max_bytes se eliminan las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, db_path: str, config: dict | None = None, cache_path: str | None = None):
+        self.db_path = db_path
+        self.cache_path = cache_path or f"{db_path}.cache"
+        self.config = dict(DEFAULT_RESULT_CACHE_CONFIG)
+        env_config = os.environ.get("MCP_RESULT_CACHE")
+        if env_config:
+            self.config.update(json.loads(env_config))
+        if config:
+            self.config.update(config)
+        self.enabled = self.config["enabled"]
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.cache_path, check_same_thread=False, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.config['busy_timeout_ms'])}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    tool TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            self._conn = conn
+        return self._conn
+
+    def fingerprint(self) -> str | None:
+        """Huella actual de la base; se toma antes de calcular para no guardar un resultado con una huella posterior"""
+        if not self.enabled:
+            return None
+        try:
+            return database_fingerprint(self.db_path)
+        except OSError:
+            return None
+
+    def get(self, tool: str, arguments: dict, fingerprint: str | None) -> list[str] | None:
+        """Textos del resultado guardado con esa huella, o None si no hay uno vigente"""
+        if fingerprint is None:
+            return None
+        key = cache_key(tool, arguments)
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT payload, last_access FROM results WHERE key = ? AND fingerprint = ?",
+                    (key, fingerprint)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                now = time.time()
+                if now - row[1] > self.config["touch_seconds"]:
+                    conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, OSError, ValueError, zlib.error):
+            self.misses += 1
+            return None
+
+    def put(self, tool: str, arguments: dict, texts: list[str], fingerprint: str | None):
+        """Guarda el resultado calculado con la base en el estado fingerprint"""
+        if fingerprint is None:
+            return
+        payload = zlib.compress(json.dumps(texts, ensure_ascii=False).encode("utf-8"))
+        if len(payload) > self.config["max_bytes"]:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (cache_key(tool, arguments), tool, fingerprint, payload, len(payload), now, now)
+                    )
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        excess = total - self.config["max_bytes"]
+        if excess <= 0:
+            return
+        # se libera hasta un 10% por debajo del máximo para no desalojar en cada put
+        excess += self.config["max_bytes"] // 10
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM results WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        try:
+            with self._lock:
+                entries, size = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+        except sqlite3.Error:
+            entries = size = None
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,146 @@
+import re
+import sqlite3
+
+
+# Índices FTS5 por entidad: tabla base, columnas indexadas (en orden), pesos
+# de bm25 por columna y columnas que se devuelven en cada resultado
+SEARCH_INDEXES = {
+    "products": {
+        "table": "products",
+        "columns": ["name", "category", "supplier"],
+        "weights": [10.0, 3.0, 2.0],
+        "fields": ["id", "name", "category", "supplier", "price", "stock"],
+    },
+    "users": {
+        "table": "users",
+        "columns": ["name", "email", "country"],
+        "weights": [10.0, 5.0, 1.0],
+        "fields": ["id", "name", "email", "country", "is_active"],
+    },
+}
+
+# unicode61 con remove_diacritics 2 ignora mayúsculas y acentos tanto al
+# indexar como al consultar; los índices de prefijo de 2 y 3 caracteres
+# evitan recorrer todo el vocabulario en búsquedas por prefijo cortas
+FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_table(entity: str) -> str:
+    return f"{SEARCH_INDEXES[entity]['table']}_fts"
+
+
+def create_search_indexes(cursor):
+    """Crea las tablas FTS5 (external content) y los triggers que las sincronizan.
+
+    Las tablas FTS no duplican el texto: leen las columnas de la tabla base
+    por rowid (content=...). Los triggers replican cada INSERT, DELETE y
+    UPDATE de las columnas indexadas; al final se reconstruye el índice con
+    las filas que ya existían.
+    """
+    for entity, index in SEARCH_INDEXES.items():
+        table, fts = index["table"], fts_table(entity)
+        columns = ", ".join(index["columns"])
+        new_values = ", ".join(f"new.{column}" for column in index["columns"])
+        old_values = ", ".join(f"old.{column}" for column in index["columns"])
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {columns}, content = '{table}', content_rowid = 'id', {FTS_OPTIONS}
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF id, {columns} ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        """)
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def match_expression(text: str, prefix: bool = True) -> str | None:
+    """Convierte texto libre en una expresión MATCH de FTS5.
+
+    Cada palabra se cita (así la sintaxis de FTS5 del usuario no se
+    interpreta) y todas deben aparecer; con prefix la última se busca como
+    prefijo ("macbook pr" encuentra "MacBook Pro"). Solo la última: un
+    prefijo largo sin índice propio (p. ej. "usuario*" frente a miles de
+    emails "usuarioN") obliga a fusionar las listas de todos esos términos.
+    """
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_entity(conn: sqlite3.Connection, entity: str, match: str, limit: int,
+                  offset: int = 0) -> tuple[list[dict], int]:
+    """Resultados de una entidad ordenados por bm25 (menor es más relevante) y total de coincidencias"""
+    index = SEARCH_INDEXES[entity]
+    fts = fts_table(entity)
+    weights = ", ".join(str(weight) for weight in index["weights"])
+    fields = ", ".join(f"t.{field}" for field in index["fields"])
+
+    rows = conn.execute(f"""
+        SELECT {fields},
+               bm25({fts}, {weights}) AS score,
+               highlight({fts}, 0, '[', ']') AS highlighted
+        FROM {fts} f
+        JOIN {index['table']} t ON t.id = f.rowid
+        WHERE {fts} MATCH ?
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, (match, limit, offset)).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM {fts} WHERE {fts} MATCH ?", (match,)).fetchone()[0]
+
+    results = []
+    for row in rows:
+        result = dict(zip(index["fields"], row))
+        result["entity"] = entity
+        result["score"] = round(row[-2], 4)
+        result["highlighted"] = row[-1]
+        results.append(result)
+    return results, total
+
+
+def search_entities(conn: sqlite3.Connection, text: str, entities: list[str], limit: int = 20,
+                    offset: int = 0, prefix: bool = True) -> dict:
+    """Busca en varias entidades y pagina el resultado combinado por bm25"""
+    match = match_expression(text, prefix)
+    if match is None:
+        return {"query": text, "total": 0, "totals": {}, "results": []}
+
+    if len(entities) == 1:
+        results, total = search_entity(conn, entities[0], match, limit, offset)
+        return {"query": text, "match": match, "total": total, "totals": {entities[0]: total}, "results": results}
+
+    results = []
+    totals = {}
+    for entity in entities:
+        # cada entidad aporta a lo sumo offset + limit filas: la página combinada sale de ahí
+        entity_results, totals[entity] = search_entity(conn, entity, match, offset + limit)
+        results.extend(entity_results)
+    results.sort(key=lambda result: result["score"])
+    results = results[offset:offset + limit]
+
+    return {
+        "query": text,
+        "match": match,
+        "total": sum(totals.values()),
+        "totals": totals,
+        "results": results,
+    }
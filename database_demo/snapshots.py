@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+from collections import deque
+from urllib.parse import quote
+from partitions import install_views, partition_layout
+
+
+# Configuración por defecto del planificador; se sobreescribe con el argumento
+# scheduler_config o la variable de entorno MCP_REPORT_SCHEDULER (JSON).
+DEFAULT_SCHEDULER_CONFIG = {
+    "enabled": True,             # ciclo periódico; sin él solo se recalcula al servir un snapshot viejo
+    "refresh_seconds": 300.0,    # cadencia de recálculo aunque no cambien los datos
+    "max_age_seconds": 60.0,     # a partir de aquí un snapshot se considera viejo
+    "poll_seconds": 5.0,         # cada cuánto se revisa PRAGMA data_version
+    "jitter_seconds": 2.0,       # desfase aleatorio para no recalcular todo a la vez
+    "max_concurrency": 1,        # recálculos simultáneos como máximo
+    "keep_versions": 3,          # versiones guardadas por reporte
+}
+
+
+class InteractiveGate:
+    """Cuenta las llamadas interactivas en curso para que el trabajo en segundo plano espere"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enter(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def exit(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def wait_idle(self):
+        while self.in_flight:
+            await self._idle.wait()
+
+
+class Snapshot:
+    """Resultado precalculado de un reporte con su versión y momento de cálculo"""
+
+    def __init__(self, version: int, data: dict, data_version: int | None):
+        self.version = version
+        self.data = data
+        self.data_version = data_version
+        self.created_at = time.time()
+
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def metadata(self, stale: bool) -> dict:
+        return {
+            "version": self.version,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.created_at)),
+            "age_seconds": round(self.age(), 1),
+            "stale": stale,
+        }
+
+
+class ReportScheduler:
+    """Precalcula reportes en segundo plano y los sirve con stale-while-revalidate.
+
+    build_report(conn, key) -> dict se ejecuta en un hilo con
+    una conexión de solo lectura propia, nunca con las de las llamadas
+    interactivas, y solo cuando el InteractiveGate indica que no hay llamadas
+    en curso. Un snapshot queda viejo por edad o porque cambió data_version;
+    servirlo dispara su recálculo sin hacer esperar al llamador.
+    """
+
+    def __init__(self, db_path: str, build_report, keys: list[str],
+                 gate: InteractiveGate, config: dict | None = None):
+        self.db_path = db_path
+        self.build_report = build_report
+        self.keys = keys
+        self.gate = gate
+        self.config = dict(DEFAULT_SCHEDULER_CONFIG)
+        env_config = os.environ.get("MCP_REPORT_SCHEDULER")
+        if env_config:
+            self.config.update(json.loads(env_config))
+        if config:
+            self.config.update(config)
+
+        self._history: dict[str, deque] = {}
+        self._versions: dict[str, int] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(self.config["max_concurrency"])
+        self._watch_conn = None
+        self._data_version = None
+        self._task = None
+
+    # --- servicio ---------------------------------------------------------
+
+    def latest(self, key: str) -> Snapshot | None:
+        history = self._history.get(key)
+        return history[-1] if history else None
+
+    def is_stale(self, snapshot: Snapshot) -> bool:
+        if snapshot.age() > self.config["max_age_seconds"]:
+            return True
+        return self._data_version is not None and snapshot.data_version != self._data_version
+
+    async def get(self, key: str) -> tuple[Snapshot, bool]:
+        """Devuelve (snapshot, stale); si no hay ninguno lo calcula en línea"""
+        snapshot = self.latest(key)
+        if snapshot is None:
+            snapshot = await self._refresh(key, interactive=True)
+            return snapshot, False
+        if self._task is None:
+            # sin el ciclo en segundo plano nadie más revisa data_version
+            self._data_version = self._poll_data_version()
+        stale = self.is_stale(snapshot)
+        if stale:
+            self.request_refresh(key)
+        return snapshot, stale
+
+    def request_refresh(self, key: str):
+        """Agenda un recálculo si no hay uno en curso para ese reporte"""
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    # --- cálculo ----------------------------------------------------------
+
+    def _compute(self, key: str) -> dict:
+        conn = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True)
+        install_views(conn, partition_layout(conn))
+        conn.row_factory = sqlite3.Row
+        try:
+            return self.build_report(conn, key)
+        finally:
+            conn.close()
+
+    async def _refresh(self, key: str, interactive: bool = False) -> Snapshot:
+        # la versión se lee antes de calcular: si entra una escritura durante el
+        # cálculo el snapshot queda con la versión anterior y se ve viejo, nunca
+        # al revés (datos previos a la escritura marcados con la versión nueva)
+        if interactive:
+            # sin snapshot previo el llamador espera de todas formas: no pasa por la cola de fondo
+            data_version = self._poll_data_version()
+            data = await asyncio.to_thread(self._compute, key)
+        else:
+            await asyncio.sleep(random.uniform(0, self.config["jitter_seconds"]))
+            async with self._semaphore:
+                await self.gate.wait_idle()
+                data_version = self._poll_data_version()
+                data = await asyncio.to_thread(self._compute, key)
+
+        version = self._versions.get(key, 0) + 1
+        self._versions[key] = version
+        snapshot = Snapshot(version, data, data_version)
+        self._history.setdefault(key, deque(maxlen=self.config["keep_versions"])).append(snapshot)
+        return snapshot
+
+    def _poll_data_version(self) -> int:
+        if self._watch_conn is None:
+            self._watch_conn = sqlite3.connect(self.db_path)
+        return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    async def _loop(self):
+        last_full_refresh = 0.0
+        while True:
+            data_version = self._poll_data_version()
+            changed = self._data_version is not None and data_version != self._data_version
+            self._data_version = data_version
+            due = time.monotonic() - last_full_refresh >= self.config["refresh_seconds"]
+
+            if changed or due:
+                last_full_refresh = time.monotonic()
+                for key in self.keys:
+                    self.request_refresh(key)
+
+            await asyncio.sleep(self.config["poll_seconds"] + random.uniform(0, self.config["jitter_seconds"]))
+
+    def start(self):
+        """Arranca el ciclo en segundo plano (requiere un event loop activo)"""
+        if self.config["enabled"] and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._watch_conn is not None:
+            self._watch_conn.close()
+            self._watch_conn = None
@@ -0,0 +1,399 @@
+import json
+import mmap
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlsplit
+
+
+# Configuración por defecto del spill de resultados grandes; se sobreescribe con
+# el argumento spill_config o la variable de entorno MCP_SPILL (JSON).
+DEFAULT_SPILL_CONFIG = {
+    "enabled": True,
+    "threshold_bytes": 256 * 1024,      # respuestas mayores se materializan y se devuelven como recurso
+    "ttl_seconds": 900.0,               # vida de un resultado desde su último acceso
+    "cleanup_seconds": 60.0,            # cada cuánto se borran los vencidos aunque nadie lea el spill
+    "max_bytes": 512 * 1024 * 1024,     # presupuesto total de disco de los resultados
+    "page_rows": 1000,                  # filas por página sugeridas al cliente
+    "max_page_bytes": 4 * 1024 * 1024,  # tope de una lectura (por filas o por bytes)
+    "dir": None,                        # por defecto un directorio temporal del proceso
+}
+
+SPILL_SCHEME = "spill"
+NDJSON = "application/x-ndjson"
+
+_SQL_TYPES = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT", type(None): None}
+
+
+def _schema(rows: list) -> list[dict]:
+    """Columnas y tipo del primer valor no nulo de cada una"""
+    if not rows or not isinstance(rows[0], dict):
+        return []
+    columns = {name: None for name in rows[0]}
+    for row in rows[:100]:
+        for name, value in row.items():
+            if columns.get(name) is None:
+                columns[name] = _SQL_TYPES.get(type(value), "JSON")
+    return [{"name": name, "type": kind} for name, kind in columns.items()]
+
+
+def _split_rows(data) -> tuple[list | None, dict]:
+    """Separa las filas (la lista más larga de la respuesta) del resto, que queda en línea"""
+    if isinstance(data, list):
+        return data, {}
+    if isinstance(data, dict):
+        lists = [(len(value), key) for key, value in data.items() if isinstance(value, list)]
+        if lists:
+            _, key = max(lists)
+            return data[key], {"rows_key": key, **{k: v for k, v in data.items() if k != key}}
+    return None, {}
+
+
+def _ndjson(row) -> bytes:
+    return json.dumps(row, default=str, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class RowWriter:
+    """Filas de un resultado escritas como NDJSON a medida que llegan, con el índice de desplazamientos.
+
+    Ya cerrado se puede enviar entre procesos: un worker escribe el archivo y
+    devuelve el writer para que el servidor lo registre en el store.
+    """
+
+    def __init__(self, path: str, max_bytes: int | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offsets = array("Q")
+        self.size = 0
+        self.sample: list = []          # primeras filas, para el schema
+        self._file = open(path, "wb")
+
+    def write(self, row, line: bytes | None = None):
+        line = line if line is not None else _ndjson(row)
+        if self.max_bytes is not None and self.size + len(line) > self.max_bytes:
+            raise ValueError(f"El resultado supera el máximo de {self.max_bytes} bytes para resultados grandes")
+        self.offsets.append(self.size)
+        self._file.write(line)
+        self.size += len(line)
+        if len(self.sample) < 100:
+            self.sample.append(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_rows(cursor, spill_path: str | None = None, threshold: int | None = None,
+                 max_bytes: int | None = None, batch_size: int = 1000) -> tuple[list | None, RowWriter | None]:
+    """Filas del cursor como dicts; si su NDJSON pasa de threshold bytes siguen a spill_path en vez de a memoria.
+
+    Devuelve (filas, None) o, si se materializó, (None, writer) con el archivo
+    cerrado. En memoria nunca quedan más de threshold bytes de filas.
+    """
+    columns = [column[0] for column in cursor.description]
+    rows, lines, size, writer = [], [], 0, None
+    try:
+        while batch := cursor.fetchmany(batch_size):
+            for values in batch:
+                row = dict(zip(columns, values))
+                if spill_path is None:
+                    rows.append(row)
+                    continue
+                line = _ndjson(row)
+                if writer is not None:
+                    writer.write(row, line)
+                    continue
+                rows.append(row)
+                lines.append(line)
+                size += len(line)
+                if size > threshold:
+                    writer = RowWriter(spill_path, max_bytes)
+                    for buffered, buffered_line in zip(rows, lines):
+                        writer.write(buffered, buffered_line)
+                    rows, lines = None, None
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+    if writer is None:
+        return rows, None
+    writer.close()
+    return None, writer
+
+
+class SpillEntry:
+    def __init__(self, entry_id: str, path: str, mime_type: str, size: int, offsets: array | None,
+                 schema: list[dict], owned: bool, ttl: float, name: str):
+        self.id = entry_id
+        self.path = path
+        self.mime_type = mime_type
+        self.size = size
+        self.offsets = offsets          # inicio de cada fila en el archivo (NDJSON); None sin paginado por filas
+        self.schema = schema
+        self.owned = owned              # False para archivos que no son del store (exportaciones)
+        self.ttl = ttl
+        self.name = name
+        self.last_access = time.time()
+        self._map = None
+        self._lock = threading.Lock()
+
+    @property
+    def uri(self) -> str:
+        return f"{SPILL_SCHEME}://results/{self.id}"
+
+    @property
+    def rows(self) -> int | None:
+        return len(self.offsets) if self.offsets is not None else None
+
+    @property
+    def expires_at(self) -> float:
+        return self.last_access + self.ttl
+
+    def read(self, start: int, end: int) -> bytes:
+        with self._lock:
+            if self._map is None:
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map[start:end]
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def row_bounds(self, start: int, stop: int) -> tuple[int, int]:
+        byte_start = self.offsets[start] if start < len(self.offsets) else self.size
+        byte_end = self.offsets[stop] if stop < len(self.offsets) else self.size
+        return byte_start, byte_end
+
+
+class SpillStore:
+    """Resultados grandes materializados una vez y leídos por páginas con resources/read.
+
+    Una respuesta que supera threshold_bytes se escribe en un archivo
+    temporal: sus filas como NDJSON (con un índice de desplazamientos para
+    paginar por filas) y el resto de la respuesta queda en línea junto con la
+    URI, el schema y el número de filas. Las lecturas van por mmap, así que
+    servir una página no relee el archivo completo. Cada resultado vence
+    ttl_seconds después de su último acceso, y si el total supera max_bytes se
+    eliminan primero los usados hace más tiempo.
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = dict(DEFAULT_SPILL_CONFIG)
+        env_config = os.environ.get("MCP_SPILL")
+        if env_config:
+            self.config.update(json.loads(env_config))
+        if config:
+            self.config.update(config)
+        self.enabled = self.config["enabled"]
+        self._dir = None
+        self._entries: dict[str, SpillEntry] = {}
+        self._keys: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    @property
+    def directory(self) -> str:
+        if self._dir is None:
+            base = self.config["dir"]
+            if base:
+                os.makedirs(base, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="mcp-spill-", dir=base)
+        return self._dir
+
+    def should_spill(self, texts: list[str]) -> bool:
+        return self.enabled and sum(len(text) for text in texts) > self.config["threshold_bytes"]
+
+    # --- escritura --------------------------------------------------------
+
+    def spill(self, key: tuple, header: str, data, text: str) -> dict | None:
+        """Materializa la respuesta y devuelve su descriptor; None si no entra en el presupuesto.
+
+        key identifica el resultado (herramienta, argumentos, tenant,
+        data_version): la misma respuesta pedida otra vez reutiliza el archivo.
+        """
+        rows, inline = _split_rows(data)
+        descriptor = self.lookup(key, header, inline if rows is not None else None)
+        if descriptor is not None:
+            return descriptor
+
+        if rows is None:
+            entry_id = secrets.token_urlsafe(12)
+            path = os.path.join(self.directory, f"{entry_id}.json")
+            with open(path, "wb") as f:
+                size = f.write(text.encode("utf-8"))
+            if size > self.config["max_bytes"]:
+                os.remove(path)
+                return None
+            entry = SpillEntry(entry_id, path, "application/json", size, None, [], True,
+                               self.config["ttl_seconds"], key[0])
+            return self._add(key, entry, header, None)
+
+        writer = RowWriter(self.new_path())
+        try:
+            for row in rows:
+                writer.write(row)
+        finally:
+            writer.close()
+        if writer.size > self.config["max_bytes"]:
+            writer.discard()
+            return None
+        return self.add_rows(key, writer, header, inline)
+
+    def new_path(self) -> str:
+        """Ruta para un RowWriter; el nombre del archivo es el id del resultado"""
+        return os.path.join(self.directory, f"{secrets.token_urlsafe(12)}.ndjson")
+
+    def lookup(self, key: tuple, header: str, inline=None) -> dict | None:
+        """Descriptor del resultado ya materializado con esa clave, si sigue vigente"""
+        with self._lock:
+            self._expire()
+            entry_id = self._keys.get(key)
+            entry = self._entries.get(entry_id) if entry_id else None
+            if entry is None:
+                return None
+            entry.last_access = time.time()
+            return self._descriptor(entry, header, inline)
+
+    def add_rows(self, key: tuple, writer: RowWriter, header: str, inline=None) -> dict:
+        """Registra las filas ya escritas por un RowWriter cerrado y devuelve su descriptor"""
+        entry_id = os.path.splitext(os.path.basename(writer.path))[0]
+        entry = SpillEntry(entry_id, writer.path, NDJSON, writer.size, writer.offsets, _schema(writer.sample),
+                           True, self.config["ttl_seconds"], key[0])
+        return self._add(key, entry, header, inline)
+
+    def _add(self, key: tuple, entry: SpillEntry, header: str, inline) -> dict:
+        with self._lock:
+            self._make_room(entry.size)
+            self._entries[entry.id] = entry
+            self._keys[key] = entry.id
+            self.total_bytes += entry.size
+        return self._descriptor(entry, header, inline)
+
+    def register_file(self, path: str, mime_type: str, name: str, rows: int | None = None) -> dict:
+        """Expone un archivo existente (p. ej. una exportación) para leerlo por rangos de bytes; no se borra al vencer"""
+        entry = SpillEntry(secrets.token_urlsafe(12), path, mime_type, os.path.getsize(path), None, [],
+                           False, self.config["ttl_seconds"], name)
+        with self._lock:
+            self._expire()
+            self._entries[entry.id] = entry
+        descriptor = self._descriptor(entry, None, None)
+        descriptor["rows"] = rows
+        return descriptor
+
+    def _descriptor(self, entry: SpillEntry, header: str | None, inline) -> dict:
+        page_bytes = self.config["max_page_bytes"]
+        descriptor = {
+            "spilled": True,
+            "resource": entry.uri,
+            "mime_type": entry.mime_type,
+            "rows": entry.rows,
+            "bytes": entry.size,
+            "schema": entry.schema,
+            "expires_at": datetime.fromtimestamp(entry.expires_at, timezone.utc).isoformat(),
+            "pages": {"bytes": f"{entry.uri}?offset=0&length={page_bytes}"},
+        }
+        if entry.rows is not None:
+            descriptor["pages"]["rows"] = f"{entry.uri}?rows=0:{self.config['page_rows']}"
+        if inline:
+            descriptor["inline"] = inline
+        return descriptor
+
+    # --- limpieza ---------------------------------------------------------
+
+    def _remove(self, entry_id: str):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        entry.close()
+        if entry.owned:
+            self.total_bytes -= entry.size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        for key in [key for key, value in self._keys.items() if value == entry_id]:
+            del self._keys[key]
+
+    def _expire(self):
+        now = time.time()
+        for entry_id in [entry_id for entry_id, entry in self._entries.items() if entry.expires_at < now]:
+            self._remove(entry_id)
+
+    def _make_room(self, size: int):
+        owned = sorted((entry for entry in self._entries.values() if entry.owned), key=lambda entry: entry.last_access)
+        for entry in owned:
+            if self.total_bytes + size <= self.config["max_bytes"]:
+                break
+            self._remove(entry.id)
+
+    def cleanup(self):
+        with self._lock:
+            self._expire()
+
+    def close(self):
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._remove(entry_id)
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    # --- lectura ----------------------------------------------------------
+
+    def entries(self) -> list[SpillEntry]:
+        with self._lock:
+            self._expire()
+            return list(self._entries.values())
+
+    def read(self, uri: str) -> tuple[bytes, str, dict]:
+        """Lee una página: ?rows=inicio:fin (NDJSON) u ?offset=N&length=M (bytes); sin parámetros, la primera página de filas"""
+        parts = urlsplit(uri)
+        entry_id = parts.path.rsplit("/", 1)[-1]
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(entry_id)
+            if entry is None or parts.scheme != SPILL_SCHEME:
+                raise ValueError(f"Recurso inexistente o vencido: {uri}")
+            entry.last_access = time.time()
+
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        max_bytes = self.config["max_page_bytes"]
+        if "offset" in query or entry.offsets is None:
+            start = max(int(query.get("offset", 0)), 0)
+            end = min(start + min(int(query.get("length", max_bytes)), max_bytes), entry.size)
+            data = entry.read(start, max(end, start))
+            following = f"{entry.uri}?offset={end}&length={end - start}" if end < entry.size else None
+            return data, "application/octet-stream", {
+                "offset": start, "length": len(data), "total_bytes": entry.size, "next": following
+            }
+
+        first, _, last = query.get("rows", f"0:{self.config['page_rows']}").partition(":")
+        start = max(int(first or 0), 0)
+        stop = min(int(last) if last else entry.rows, entry.rows)
+        byte_start, byte_end = entry.row_bounds(start, max(stop, start))
+        # la página se recorta a max_page_bytes, siempre con al menos una fila
+        while stop > start + 1 and byte_end - byte_start > max_bytes:
+            stop = start + max((stop - start) // 2, 1)
+            byte_start, byte_end = entry.row_bounds(start, stop)
+        data = entry.read(byte_start, byte_end)
+        count = max(stop - start, 0)
+        following = f"{entry.uri}?rows={stop}:{stop + max(count, 1)}" if stop < entry.rows else None
+        return data, entry.mime_type, {
+            "rows": [start, stop], "total_rows": entry.rows, "next": following
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+
+TENANT_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_current_tenant: contextvars.ContextVar = contextvars.ContextVar("current_tenant", default=None)
+# cupo que ocupa la llamada en curso: la cuota del tenant o, al pasar al carril lento, la de ese carril
+_current_slot: contextvars.ContextVar = contextvars.ContextVar("current_slot", default=None)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexión cuyo close() la devuelve al pool en vez de cerrarla"""
+
+    pool = None
+    warmed = False      # las sentencias del registro ya están en su cache
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite de una base de datos.
+
+    Las conexiones se abren bajo demanda; al devolverse se limpian (rollback,
+    row_factory, authorizer, trace y progress handler) y se guardan hasta
+    max_idle. Si no hay ninguna libre se abre otra en vez de bloquear: la
+    concurrencia ya la limitan las cuotas por tenant y los carriles de admisión.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle: list[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.opened = 0
+
+    def acquire(self, row_factory=sqlite3.Row) -> PooledConnection:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            # como URI para que el ATTACH de las particiones acepte mode=ro&immutable=1
+            conn = sqlite3.connect(f"file:{quote(self.db_path)}", uri=True,
+                                   factory=PooledConnection, check_same_thread=False)
+            conn.pool = self
+            self.opened += 1
+        conn.row_factory = row_factory
+        return conn
+
+    def release(self, conn: PooledConnection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.set_authorizer(None)
+            conn.set_trace_callback(None)
+            conn.set_progress_handler(None, 0)
+        except sqlite3.Error:
+            conn.really_close()
+            return
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.really_close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+
+class TenantState:
+    """Todo lo que el servidor mantiene abierto para una base de datos de tenant"""
+
+    def __init__(self, name: str, db_path: str, pool: ConnectionPool, catalog, scheduler,
+                 result_cache, max_concurrent_calls: int, max_slow_calls: int = 1):
+        self.name = name
+        self.db_path = db_path
+        self.pool = pool
+        self.catalog = catalog
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.quota = asyncio.Semaphore(max_concurrent_calls)
+        # las consultas del carril lento esperan y corren con esta cuota, no con la de arriba
+        self.slow_quota = asyncio.Semaphore(max_slow_calls)
+        self.in_use = 0
+        # resultados derivados del tenant, cada uno guardado junto al data_version con que se calculó
+        self.cache: dict = {}
+
+    def start(self):
+        """Arranca el trabajo en segundo plano del tenant (requiere el event loop: no se llama desde el hilo de apertura)"""
+        self.scheduler.start()
+
+    async def close(self):
+        await self.scheduler.stop()
+        self.catalog.close()
+        self.result_cache.close()
+        self.pool.close()
+
+
+class TenantManager:
+    """LRU acotado de tenants abiertos.
+
+    Cada llamada que nombra un tenant obtiene su TenantState con get(); si no
+    está abierto se crea con tenant_factory(name, db_path), que inicializa o
+    migra el schema. La apertura corre en un hilo para no frenar a los demás
+    tenants, y un lock por nombre evita abrir dos veces el mismo cuando llegan
+    varias llamadas a la vez. Al superar max_open se cierra el tenant menos usado
+    recientemente que no tenga llamadas en curso, así la memoria depende de
+    max_open y no del total de tenants.
+    """
+
+    def __init__(self, tenants_dir: str, tenant_factory, max_open: int = 32):
+        self.tenants_dir = tenants_dir
+        self.tenant_factory = tenant_factory
+        self.max_open = max_open
+        self._open: OrderedDict[str, TenantState] = OrderedDict()
+        self._closing: set[asyncio.Task] = set()
+        self._opening: dict[str, asyncio.Lock] = {}
+
+    def path_for(self, name: str) -> str:
+        if not TENANT_NAME.match(name):
+            raise ValueError(f"Nombre de tenant inválido: {name!r}")
+        return os.path.join(self.tenants_dir, f"{name}.db")
+
+    async def get(self, name: str) -> TenantState:
+        state = self._open.get(name)
+        if state is not None:
+            self._open.move_to_end(name)
+            return state
+
+        db_path = self.path_for(name)
+        lock = self._opening.setdefault(name, asyncio.Lock())
+        async with lock:
+            state = self._open.get(name)
+            if state is not None:
+                # lo abrió otra llamada mientras esta esperaba el lock
+                self._open.move_to_end(name)
+                return state
+            try:
+                state = await asyncio.to_thread(self._create, name, db_path)
+            finally:
+                # las llamadas que ya esperan tienen el lock; las nuevas encuentran el tenant en _open
+                self._opening.pop(name, None)
+            state.start()
+            self._open[name] = state
+            self._evict(keep=name)
+            return state
+
+    def _create(self, name: str, db_path: str) -> TenantState:
+        os.makedirs(self.tenants_dir, exist_ok=True)
+        return self.tenant_factory(name, db_path)
+
+    def _evict(self, keep: str | None = None):
+        """Cierra tenants sin llamadas en curso, del menos usado recientemente, hasta volver a max_open.
+
+        keep es el tenant que get() acaba de abrir: todavía no tiene llamadas en
+        curso pero su llamador está por usarlo.
+        """
+        while len(self._open) > self.max_open:
+            victim = next(
+                (name for name, state in self._open.items() if state.in_use == 0 and name != keep), None
+            )
+            if victim is None:
+                # todos ocupados: se tolera el exceso hasta que alguno se libere
+                return
+            state = self._open.pop(victim)
+            task = asyncio.get_running_loop().create_task(state.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @contextlib.asynccontextmanager
+    async def use(self, state: TenantState):
+        """Reserva un cupo de la cuota del tenant y lo deja como tenant actual"""
+        state.in_use += 1
+        slot = {"quota": None}
+        try:
+            await state.quota.acquire()
+            slot["quota"] = state.quota
+            tenant_token = _current_tenant.set(state)
+            slot_token = _current_slot.set(slot)
+            try:
+                yield state
+            finally:
+                _current_slot.reset(slot_token)
+                _current_tenant.reset(tenant_token)
+        finally:
+            if slot["quota"] is not None:
+                slot["quota"].release()
+            state.in_use -= 1
+            self._evict()
+
+    @contextlib.asynccontextmanager
+    async def lane(self, lane: str):
+        """Con lane "slow" la llamada en curso cambia su cupo de la cuota del tenant por uno del carril lento.
+
+        Así las consultas que esperan en la cola lenta no ocupan los cupos de
+        las llamadas baratas del mismo tenant. El cupo nuevo se libera al
+        terminar la llamada, en use().
+        """
+        state, slot = _current_tenant.get(), _current_slot.get()
+        if lane == "slow" and state is not None and slot is not None and slot["quota"] is state.quota:
+            slot["quota"] = None
+            state.quota.release()
+            await state.slow_quota.acquire()
+            slot["quota"] = state.slow_quota
+        yield
+
+    @staticmethod
+    def current() -> TenantState | None:
+        return _current_tenant.get()
+
+    async def close_all(self):
+        states = list(self._open.values())
+        self._open.clear()
+        for state in states:
+            await state.close()
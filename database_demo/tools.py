@@ -0,0 +1,337 @@
+from registry import ToolSpec
+from reports import REPORT_PIPELINES
+from export import DEFAULT_BATCH_SIZE, EXPORT_FORMATS
+from search import SEARCH_INDEXES
+from inventory import DEFAULT_VELOCITY_DAYS, THRESHOLD_SCOPES
+from analytics import GRANULARITIES, SALES_SERIES_QUERIES
+
+
+REPORT_TYPES = list(REPORT_PIPELINES)
+REPORT_PERIODS = ["week", "month", "quarter"]
+
+# Herramientas del servidor. Cada una declara su schema, los valores por
+# defecto y el SQL que usa; un reporte nuevo que sea solo consultas se agrega
+# aquí sin escribir un handler (ver get_customer_insights).
+TOOL_SPECS = [
+    ToolSpec(
+        name="execute_query",
+        description="Ejecuta una consulta SQL SELECT",
+        properties={
+            "query": {"type": "string", "description": "Consulta SQL SELECT a ejecutar"}
+        },
+        required=["query"],
+        handler="_execute_query"
+    ),
+    ToolSpec(
+        name="export_query",
+        description="Exporta el resultado de una consulta SELECT a un archivo CSV o Arrow IPC, por lotes y con memoria constante",
+        properties={
+            "query": {"type": "string", "description": "Consulta SQL SELECT a exportar"},
+            "format": {"type": "string", "enum": list(EXPORT_FORMATS), "description": "Formato del archivo (arrow requiere pyarrow)"},
+            "filename": {"type": "string", "description": "Nombre del archivo dentro del directorio de exportación"},
+            "batch_size": {"type": "integer", "minimum": 1, "maximum": 1000000, "description": "Filas por lote leído del cursor"}
+        },
+        required=["query"],
+        defaults={"format": "csv", "batch_size": DEFAULT_BATCH_SIZE},
+        handler="_export_query"
+    ),
+    ToolSpec(
+        name="search_entities",
+        description="Búsqueda de texto completo en productos (nombre, categoría, proveedor) y clientes (nombre, email, país), por prefijo y sin distinguir acentos",
+        properties={
+            "query": {"type": "string", "description": "Texto a buscar"},
+            "entity": {"type": "string", "enum": [*SEARCH_INDEXES, "all"], "description": "Entidad donde buscar (por defecto todas)"},
+            "prefix": {"type": "boolean", "description": "Buscar la última palabra como prefijo (por defecto true)"},
+            "limit": {"type": "integer", "minimum": 1, "maximum": 200, "description": "Resultados por página"},
+            "offset": {"type": "integer", "minimum": 0, "description": "Desplazamiento de la página"}
+        },
+        required=["query"],
+        defaults={"entity": "all", "prefix": True, "limit": 20, "offset": 0},
+        handler="_search_entities",
+        cacheable=True
+    ),
+    ToolSpec(
+        name="get_table_schema",
+        description="Obtiene el schema de una tabla",
+        properties={
+            "table_name": {"type": "string", "description": "Nombre de la tabla"}
+        },
+        required=["table_name"],
+        handler="_get_table_schema",
+        cacheable=True
+    ),
+    ToolSpec(
+        name="get_database_stats",
+        description="Obtiene estadísticas de la base de datos (conteos cacheados, páginas y bytes por tabla, cola de admisión, cache persistente)",
+        properties={
+            "exact": {"type": "boolean", "description": "Recontar con COUNT(*) y resincronizar los contadores"}
+        },
+        defaults={"exact": False},
+        handler="_get_database_stats"
+    ),
+    ToolSpec(
+        name="ask_business_question",
+        description="Responde preguntas de negocio en lenguaje natural",
+        properties={
+            "question": {"type": "string", "description": "Pregunta de negocio en lenguaje natural"}
+        },
+        required=["question"],
+        handler="_ask_business_question",
+        cacheable=True,
+        # cada pregunta reconocida (por contenido) y su consulta
+        sql={
+            "mejores clientes": """
+                SELECT u.name, u.email, u.country,
+                       COUNT(o.id) as total_orders,
+                       SUM(o.total_amount) as total_spent
+                FROM users u
+                JOIN orders o ON u.id = o.user_id
+                WHERE o.status = 'completed'
+                GROUP BY u.id
+                ORDER BY total_spent DESC
+                LIMIT 5
+            """,
+
+            "productos más vendidos": """
+                SELECT p.name, p.category,
+                       SUM(oi.quantity) as total_sold,
+                       SUM(oi.quantity * oi.unit_price) as revenue,
+                       p.supplier
+                FROM products p
+                JOIN order_items oi ON p.id = oi.product_id
+                JOIN orders o ON oi.order_id = o.id
+                WHERE o.status IN ('completed', 'shipped')
+                GROUP BY p.id
+                ORDER BY total_sold DESC
+                LIMIT 5
+            """,
+
+            "ventas por país": """
+                SELECT u.country,
+                       COUNT(o.id) as total_orders,
+                       SUM(o.total_amount) as total_revenue,
+                       AVG(o.total_amount) as avg_order_value
+                FROM users u
+                JOIN orders o ON u.id = o.user_id
+                WHERE o.status = 'completed'
+                GROUP BY u.country
+                ORDER BY total_revenue DESC
+            """,
+
+            "clientes inactivos": """
+                SELECT name, email, country, registration_date
+                FROM users
+                WHERE is_active = 0 OR id NOT IN (
+                    SELECT DISTINCT user_id FROM orders WHERE status = 'completed'
+                )
+            """,
+
+            # mismo criterio que get_kpis y get_inventory_alerts: el punto de reorden vigente
+            "inventario bajo": """
+                SELECT p.name, p.category, p.stock, s.reorder_level, p.price, p.supplier
+                FROM inventory_state s
+                JOIN products p ON p.id = s.product_id
+                WHERE s.low_stock = 1
+                ORDER BY p.stock ASC
+            """
+        }
+    ),
+    ToolSpec(
+        name="get_kpis",
+        description="Obtiene indicadores clave de rendimiento (KPIs)",
+        handler="_get_kpis",
+        cacheable=True,
+        sql={
+            "kpis": """
+                SELECT
+                    (SELECT COUNT(*) FROM users WHERE is_active = 1) as active_customers,
+                    (SELECT COUNT(*) FROM orders WHERE status = 'completed') as completed_orders,
+                    (SELECT SUM(total_amount) FROM orders WHERE status = 'completed') as total_revenue,
+                    (SELECT AVG(total_amount) FROM orders WHERE status = 'completed') as avg_order_value,
+                    (SELECT COUNT(*) FROM products) as total_products,
+                    (SELECT COUNT(*) FROM inventory_state WHERE low_stock = 1) as low_stock_products
+            """
+        }
+    ),
+    ToolSpec(
+        name="generate_business_report",
+        description="Genera reportes de negocio automáticamente",
+        properties={
+            "report_type": {
+                "type": "string",
+                "enum": REPORT_TYPES,
+                "description": "Tipo de reporte a generar"
+            },
+            "period": {
+                "type": "string",
+                "enum": REPORT_PERIODS,
+                "description": "Período del reporte"
+            }
+        },
+        required=["report_type"],
+        defaults={"report_type": "sales", "period": "month"},
+        # no cacheable: la respuesta lleva la edad del snapshot y pasar por el
+        # scheduler es lo que dispara su refresco; el snapshot ya es el cache
+        handler="_generate_business_report"
+    ),
+    ToolSpec(
+        name="find_insights",
+        description="Encuentra insights automáticamente en los datos",
+        properties={
+            "focus_area": {
+                "type": "string",
+                "enum": ["sales", "customers", "products", "all"],
+                "description": "Área de enfoque para los insights"
+            }
+        },
+        defaults={"focus_area": "all"},
+        handler="_find_insights",
+        cacheable=True,
+        sql={
+            # producto más rentable
+            "most_profitable": """
+                SELECT p.name,
+                       (p.price - p.cost) as profit_per_unit,
+                       COALESCE(SUM(oi.quantity), 0) as units_sold,
+                       COALESCE(SUM((p.price - p.cost) * oi.quantity), 0) as total_profit
+                FROM products p
+                LEFT JOIN order_items oi ON p.id = oi.product_id
+                LEFT JOIN orders o ON oi.order_id = o.id AND o.status = 'completed'
+                WHERE p.cost IS NOT NULL AND p.cost > 0
+                GROUP BY p.id
+                ORDER BY total_profit DESC
+                LIMIT 1
+            """,
+            # país con más clientes
+            "top_country": """
+                SELECT country, COUNT(*) as customer_count
+                FROM users
+                WHERE is_active = 1
+                GROUP BY country
+                ORDER BY customer_count DESC
+                LIMIT 1
+            """
+        }
+    ),
+    ToolSpec(
+        name="get_sales_analytics",
+        description="Obtiene análisis de ventas avanzado",
+        properties={
+            "period": {"type": "string", "enum": ["week", "month", "quarter"], "description": "Período de análisis"}
+        },
+        defaults={"period": "month"},
+        cacheable=True,
+        header="analisis de ventas ({period}):",
+        echo=("period",),
+        single_row=("summary",),
+        error="Error en analisis",
+        sql={
+            # analisis general
+            "summary": """
+                SELECT
+                    COUNT(*) as total_orders,
+                    SUM(total_amount) as total_revenue,
+                    AVG(total_amount) as avg_order_value,
+                    COUNT(DISTINCT user_id) as unique_customers
+                FROM orders
+                WHERE status = 'completed'
+            """,
+            # ventas por categoria
+            "by_category": """
+                SELECT p.category,
+                       COUNT(oi.id) as items_sold,
+                       SUM(oi.quantity * oi.unit_price) as category_revenue
+                FROM products p
+                JOIN order_items oi ON p.id = oi.product_id
+                JOIN orders o ON oi.order_id = o.id
+                WHERE o.status = 'completed'
+                GROUP BY p.category
+                ORDER BY category_revenue DESC
+            """
+        }
+    ),
+    ToolSpec(
+        name="get_sales_trends",
+        description="Tendencias de ventas: series diarias/semanales/mensuales por categoría o país con medias móviles, crecimiento, estacionalidad y pronóstico",
+        properties={
+            "granularity": {"type": "string", "enum": list(GRANULARITIES), "description": "Granularidad de las series"},
+            "group_by": {"type": "string", "enum": list(SALES_SERIES_QUERIES), "description": "Dimensión de las series"},
+            "start_date": {"type": "string", "description": "Fecha inicial (YYYY-MM-DD)"},
+            "end_date": {"type": "string", "description": "Fecha final inclusive (YYYY-MM-DD)"},
+            "window": {"type": "integer", "minimum": 1, "description": "Períodos de la media móvil"},
+            "horizon": {"type": "integer", "minimum": 1, "maximum": 52, "description": "Períodos a pronosticar"},
+            "top": {"type": "integer", "minimum": 1, "maximum": 1000, "description": "Series a devolver (las de mayor ingreso)"}
+        },
+        defaults={"granularity": "week", "group_by": "category", "horizon": 4, "top": 10},
+        handler="_get_sales_trends",
+        cacheable=True
+    ),
+    ToolSpec(
+        name="get_customer_insights",
+        description="Obtiene insights de clientes",
+        cacheable=True,
+        header="customer Insights:",
+        sql={
+            # clientes más valiosos
+            "top_customers": """
+                SELECT u.name, u.country,
+                       COUNT(o.id) as order_count,
+                       COALESCE(SUM(o.total_amount), 0) as lifetime_value
+                FROM users u
+                LEFT JOIN orders o ON u.id = o.user_id AND o.status = 'completed'
+                WHERE u.is_active = 1
+                GROUP BY u.id
+                ORDER BY lifetime_value DESC
+                LIMIT 3
+            """,
+            # distribución por país
+            "distribution_by_country": """
+                SELECT country, COUNT(*) as customer_count
+                FROM users
+                WHERE is_active = 1
+                GROUP BY country
+                ORDER BY customer_count DESC
+            """
+        }
+    ),
+    ToolSpec(
+        name="get_customer_segments",
+        description="Segmentación RFM (recencia, frecuencia, monto) de todos los clientes por quintiles",
+        properties={
+            "segment": {"type": "string", "description": "Listar solo los clientes de este segmento"},
+            "reference_date": {"type": "string", "description": "Fecha de referencia para la recencia (por defecto el último pedido)"},
+            "limit": {"type": "integer", "minimum": 0, "maximum": 1000, "description": "Clientes a listar"},
+            "offset": {"type": "integer", "minimum": 0, "description": "Desplazamiento de la página de clientes"}
+        },
+        defaults={"limit": 20, "offset": 0},
+        handler="_get_customer_segments",
+        cacheable=True
+    ),
+    ToolSpec(
+        name="get_data_version",
+        description="Versión actual de los datos (cambia con cada escritura); permite validar caches del cliente",
+        handler="_get_data_version"
+    ),
+    ToolSpec(
+        name="get_inventory_alerts",
+        description="Productos bajo su punto de reorden (con días de cobertura según la velocidad de venta reciente) y productos sin ventas",
+        properties={
+            "reference_date": {"type": "string", "description": "Fecha hasta la que se mide la velocidad de venta (por defecto la última venta)"},
+            "velocity_days": {"type": "integer", "minimum": 1, "maximum": 365, "description": f"Días de ventas para la velocidad (por defecto {DEFAULT_VELOCITY_DAYS})"}
+        },
+        defaults={"velocity_days": DEFAULT_VELOCITY_DAYS},
+        handler="_get_inventory_alerts",
+        cacheable=True
+    ),
+    ToolSpec(
+        name="set_inventory_threshold",
+        description="Define el punto de reorden de un producto, de una categoría o el general",
+        properties={
+            "scope": {"type": "string", "enum": THRESHOLD_SCOPES},
+            "key": {"type": "string", "description": "ID del producto o nombre de la categoría (no aplica al general)"},
+            "reorder_level": {"type": ["integer", "null"], "minimum": 0, "description": "Unidades bajo las que se alerta; null borra el umbral"}
+        },
+        required=["scope", "reorder_level"],
+        handler="_set_inventory_threshold"
+    ),
+]
@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+
+
+# Campos que cambian entre ejecuciones y no deben contar como diferencias
+VOLATILE_FIELDS = re.compile(r'"(age_seconds|generated_at|sizes_measured_at|stale|version)": [^,\n}]+')
+
+
+def normalize_response(text: str) -> str:
+    """Quita los campos volátiles de una respuesta antes de compararla"""
+    return VOLATILE_FIELDS.sub(r'"\1": null', text)
+
+
+def response_digest(text: str) -> str:
+    return hashlib.sha1(normalize_response(text).encode("utf-8")).hexdigest()[:16]
+
+
+def open_trace(path: str, mode: str):
+    """Abre un trace JSONL, comprimido con gzip si termina en .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_trace(path: str) -> list[dict]:
+    with open_trace(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class TraceRecorder:
+    """Graba cada llamada a herramienta como una línea JSON compacta.
+
+    Claves: t (timestamp unix), n (herramienta), a (argumentos), ms (latencia),
+    b (bytes de la respuesta), h (hash de la respuesta normalizada) y, si
+    record_responses está activo, r (texto completo para diffs en el replay).
+    """
+
+    def __init__(self, path: str, record_responses: bool = False):
+        self.path = path
+        self.record_responses = record_responses
+        self._lock = threading.Lock()
+        self._file = open_trace(path, "a")
+
+    def record(self, name: str, arguments: dict, started_at: float, latency: float, text: str):
+        entry = {
+            "t": round(started_at, 4),
+            "n": name,
+            "a": arguments,
+            "ms": round(latency * 1000, 3),
+            "b": len(text.encode("utf-8")),
+            "h": response_digest(text),
+        }
+        if self.record_responses:
+            entry["r"] = text
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
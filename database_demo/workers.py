@@ -0,0 +1,133 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+from admission import AdmissionController
+from partitions import install_views, partition_layout
+from spill import RowWriter, collect_rows
+
+
+# Configuración por defecto del carril de procesos; se sobreescribe con el
+# argumento workers_config o la variable de entorno MCP_PROCESS_POOL (JSON).
+DEFAULT_WORKERS_CONFIG = {
+    "workers": min(4, max((os.cpu_count() or 1) - 1, 1)),  # 0 desactiva el carril
+    "min_cost": 200_000,        # costo estimado (filas) a partir del cual se usa un proceso
+    "compress_bytes": 1 << 20,  # payloads mayores se devuelven comprimidos con zlib
+}
+
+# conexiones de solo lectura del worker, una por base de datos (y por hilo,
+# para que las mismas funciones sirvan también desde un ThreadPoolExecutor)
+_connections: dict[tuple[str, int], sqlite3.Connection] = {}
+
+
+def _worker_connection(db_path: str, date_range: tuple | None = None) -> sqlite3.Connection:
+    key = (db_path, threading.get_ident())
+    conn = _connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{quote(db_path)}?mode=ro", uri=True)
+        _connections[key] = conn
+    # ATTACH no pasa el authorizer de solo lectura: las vistas de particiones se arman sin él
+    conn.set_authorizer(None)
+    install_views(conn, partition_layout(conn), *(date_range or ()))
+    conn.set_authorizer(AdmissionController.read_only_authorizer())
+    return conn
+
+
+def _encode(text: str, compress_bytes: int) -> bytes:
+    data = text.encode("utf-8")
+    if len(data) > compress_bytes:
+        # nivel 1: el costo está en cruzar el pipe entre procesos, no en el tamaño final
+        return b"z" + zlib.compress(data, 1)
+    return b"t" + data
+
+
+def decode_payload(payload: bytes) -> str:
+    if payload[:1] == b"z":
+        return zlib.decompress(payload[1:]).decode("utf-8")
+    return payload[1:].decode("utf-8")
+
+
+def query_to_json(db_path: str, query: str, timeout: float, compress_bytes: int,
+                  spill_path: str | None = None, spill_threshold: int | None = None,
+                  spill_max_bytes: int | None = None) -> tuple[int, bytes | RowWriter]:
+    """Ejecuta la consulta en el worker y devuelve (filas, JSON ya serializado como en execute_query).
+
+    Con spill_path, un resultado de más de spill_threshold bytes se escribe ahí
+    como NDJSON mientras se lee y en lugar del JSON se devuelve el RowWriter.
+    """
+    conn = _worker_connection(db_path)
+    AdmissionController.install_deadline(conn, timeout)
+    try:
+        data, spilled = collect_rows(conn.execute(query), spill_path, spill_threshold, spill_max_bytes)
+    finally:
+        conn.set_progress_handler(None, 0)
+        if conn.in_transaction:
+            conn.rollback()
+    if spilled is not None:
+        return len(spilled.offsets), spilled
+    return len(data), _encode(json.dumps(data, indent=2, default=str), compress_bytes)
+
+
+def call_with_connection(db_path: str, func, *args, date_range: tuple | None = None):
+    """Ejecuta func(conn, *args) en el worker; func debe ser una función de módulo (se envía por referencia).
+
+    date_range (inicio, fin) limita las particiones adjuntadas a las que pueden tener pedidos en ese rango.
+    """
+    conn = _worker_connection(db_path, date_range)
+    try:
+        return func(conn, *args)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+
+
+class ProcessLane:
+    """Carril de procesos para trabajo de CPU que el GIL serializaría en hilos.
+
+    Construir dicts por fila, json.dumps de resultados grandes y el
+    post-proceso de la analítica corren en Python puro: en hilos comparten un
+    solo núcleo. Aquí se envían a un ProcessPoolExecutor (spawn) cuyos
+    workers abren sus propias conexiones de solo lectura y devuelven el
+    resultado ya serializado. El pool se crea con el primer uso.
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = dict(DEFAULT_WORKERS_CONFIG)
+        env_config = os.environ.get("MCP_PROCESS_POOL")
+        if env_config:
+            self.config.update(json.loads(env_config))
+        if config:
+            self.config.update(config)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config["workers"] > 0
+
+    def should_offload(self, cost: float) -> bool:
+        return self.enabled and cost >= self.config["min_cost"]
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                # un worker murió (OOM, señal): el pool queda inutilizable y se reemplaza
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.config["workers"],
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+# los módulos del servidor se importan por nombre, como lo hace database_server.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_demo"))
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    """Crea servidores sobre una base de ejemplo en tmp_path, sin planificador, cache persistente ni procesos"""
+    import mcp.types as types
+    from database_server import CompleteDatabaseMCP
+
+    def make(**overrides):
+        options = {
+            "tenants_dir": str(tmp_path / "tenants"),
+            "scheduler_config": {"enabled": False},
+            "result_cache_config": {"enabled": False},
+            "workers_config": {"workers": 0},
+            "spill_config": {"dir": str(tmp_path / "spill")},
+            **overrides,
+        }
+        server = CompleteDatabaseMCP(str(tmp_path / "main.db"), **options)
+        handler = server.server.request_handlers[types.CallToolRequest]
+
+        async def call(name: str, **arguments) -> types.CallToolResult:
+            request = types.CallToolRequest(
+                method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments)
+            )
+            return (await handler(request)).root
+
+        server.call = call
+        return server
+
+    return make
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import sqlite3
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM orders LIMIT 10", True),
+    ("SELECT * FROM orders o WHERE o.id IN (SELECT order_id FROM order_items LIMIT 5)", False),
+    ("SELECT 'no LIMIT here' AS note FROM orders", False),
+    ("SELECT * FROM orders -- LIMIT 10", False),
+    ("SELECT * FROM orders /* LIMIT 10 */", False),
+    ('SELECT "limit" FROM orders', False),
+    ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < (SELECT 5 LIMIT 1)) SELECT x FROM c", False),
+    ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT x FROM c LIMIT 5", True),
+    ("SELECT id FROM users UNION ALL SELECT id FROM products\nlimit 3;", True),
+])
+def test_has_outer_limit(query, expected):
+    assert AdmissionController.has_outer_limit(query) is expected
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM users -- note",
+    "SELECT * FROM users; -- note",
+    "SELECT * FROM users /* note */ ;\n",
+    "SELECT '-- not a comment;' AS x FROM users",
+])
+def test_auto_limit_wraps_queries_ending_in_comments(query):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(str(i),) for i in range(50)])
+    controller = AdmissionController({"cheap_cost": 1, "max_cost": 10, "auto_limit": 5})
+    decision = controller.evaluate(conn, query)
+    assert decision.action == "limit"
+    assert len(conn.execute(decision.query).fetchall()) == 5
+
+
+RECURSIVE = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c{inner}) "
+
+
+@pytest.mark.parametrize("query", [
+    RECURSIVE.format(inner=" LIMIT 5") + "SELECT x FROM c",
+    RECURSIVE.format(inner=" LIMIT 5") + "SELECT max(x) FROM c",
+    RECURSIVE.format(inner="") + "SELECT x FROM c LIMIT 5",
+    RECURSIVE.format(inner="") + "SELECT x FROM c WHERE x > 2 LIMIT 5 -- LIMIT",
+])
+def test_bounded_recursive_cte_is_admitted(query):
+    conn = sqlite3.connect(":memory:")
+    decision = AdmissionController({"auto_limit": 1000}).evaluate(conn, query)
+    rows = conn.execute(decision.query).fetchall()
+    assert 1 <= len(rows) <= 5
+
+
+@pytest.mark.parametrize("query", [
+    RECURSIVE.format(inner="") + "SELECT max(x) FROM c LIMIT 1",
+    RECURSIVE.format(inner="") + "SELECT x FROM c ORDER BY x LIMIT 1",
+    RECURSIVE.format(inner="") + "SELECT x, sum(x) OVER () FROM c LIMIT 1",
+    RECURSIVE.format(inner="") + "SELECT x FROM users JOIN c ON c.x = users.id LIMIT 1",
+    RECURSIVE.format(inner=" WHERE 1 OR x < (SELECT 5 LIMIT 1)") + "SELECT x FROM c",
+])
+def test_unbounded_recursive_cte_is_rejected(query):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    with pytest.raises(AdmissionRejected, match="CTE recursivo sin LIMIT"):
+        AdmissionController().evaluate(conn, query)
+
+
+def test_database_stats_report_queued_queries(make_server):
+    server = make_server(admission_policy={"cheap_cost": -1, "slow_lane_concurrency": 1})
+
+    async def waiting() -> dict:
+        result = await server.call("get_database_stats")
+        return json.loads(result.content[0].text.split("\n", 1)[1])["admission"]["waiting"]
+
+    async def scenario():
+        slow_lane = server.admission._lanes["slow"]
+        await slow_lane.acquire()
+        query = asyncio.create_task(server.call("execute_query", query="SELECT COUNT(*) FROM users"))
+        await asyncio.sleep(0.05)
+        queued = await waiting()
+        slow_lane.release()
+        result = await query
+        return queued, await waiting(), result
+
+    queued, drained, result = asyncio.run(scenario())
+    assert queued == {"fast": 0, "slow": 1}
+    assert drained == {"fast": 0, "slow": 0}
+    assert "Consulta ejecutada exitosamente" in result.content[0].text
+
+
+@pytest.mark.parametrize("policy, bulk, lane, action", [
+    ({}, False, "fast", "run"),
+    ({"cheap_cost": 1}, False, "slow", "run"),
+    ({"cheap_cost": 1, "max_cost": 10, "on_expensive": "queue"}, False, "slow", "queue"),
+    ({"cheap_cost": 1, "max_cost": 10, "on_expensive": "reject"}, True, "slow", "queue"),
+])
+def test_policy_picks_lane_and_action(policy, bulk, lane, action):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(str(i),) for i in range(50)])
+    decision = AdmissionController(policy).evaluate(conn, "SELECT * FROM users", bulk=bulk)
+    assert (decision.lane, decision.action) == (lane, action)
+    assert decision.query == "SELECT * FROM users"
+
+
+def test_rejected_queries_answer_with_the_reason(make_server):
+    server = make_server(admission_policy={"cheap_cost": 1, "max_cost": 2, "on_expensive": "reject"})
+
+    result = asyncio.run(server.call("execute_query", query="SELECT * FROM users"))
+    assert result.content[0].text.startswith("Consulta rechazada por control de admisión: costo estimado")
+
+
+def test_writes_are_rejected_before_running():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    with pytest.raises(AdmissionRejected, match="solo se permiten consultas de lectura"):
+        AdmissionController().evaluate(conn, "WITH x AS (SELECT 1) DELETE FROM users")
@@ -0,0 +1,28 @@
+import sqlite3
+from analytics import compute_customer_segments
+
+
+def _database():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, country TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, order_date DATE,
+                             total_amount REAL, status TEXT);
+        INSERT INTO users VALUES (1, 'Ana', 'ana@x', 'CL'), (2, 'Beto', 'beto@x', 'AR'), (3, 'Caro', 'caro@x', 'PE');
+        INSERT INTO orders VALUES (1, 1, '2024-01-10', 100.0, 'completed');
+    """)
+    return conn
+
+
+def test_customers_without_orders_are_segmented():
+    result = compute_customer_segments(_database())
+    assert result["total_customers"] == 3
+    assert result["segments"]["Sin compras"]["customers"] == 2
+
+
+def test_order_with_null_user_keeps_non_buyers():
+    conn = _database()
+    conn.execute("INSERT INTO orders VALUES (2, NULL, '2024-01-11', 50.0, 'shipped')")
+    result = compute_customer_segments(conn)
+    assert result["total_customers"] == 3
+    assert sorted(customer[0] for customer in result["customers"]) == [1, 2, 3]
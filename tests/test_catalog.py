@@ -0,0 +1,49 @@
+import asyncio
+import sqlite3
+import threading
+import catalog
+from catalog import CatalogCache
+
+
+def _database(tmp_path) -> str:
+    path = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, total REAL)")
+    conn.executemany("INSERT INTO orders (total) VALUES (?)", [(i,) for i in range(100)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_install_measures_sizes_in_background(tmp_path, monkeypatch):
+    measure = catalog._measure_sizes
+    release = threading.Event()
+
+    def blocked_measure(conn, tables):
+        release.wait(5)
+        return measure(conn, tables)
+
+    monkeypatch.setattr(catalog, "_measure_sizes", blocked_measure)
+    cache = CatalogCache(_database(tmp_path))
+    cache.install()
+    assert cache.row_counts()["orders"]["row_count"] == 100
+
+    sizes, database = cache.sizes()
+    assert sizes == {}
+    assert database["sizes_pending"] and database["sizes_refreshing"]
+
+    refresh = cache._sizes_refresh
+    release.set()
+    refresh.join(5)
+    sizes, database = cache.sizes()
+    assert not database["sizes_pending"]
+    assert sizes["orders"]["pages"] >= 1
+    cache.close()
+
+
+def test_unknown_table_lists_available_tables(make_server):
+    server = make_server()
+    result = asyncio.run(server.call("get_table_schema", table_name="nope"))
+    message, available = result.content[0].text.split("Disponibles: ")
+    assert message == "La tabla 'nope' no existe. "
+    assert {"users", "orders", "order_items", "products"} <= set(available.split(", "))
@@ -0,0 +1,44 @@
+import sqlite3
+import pytest
+from export import export_cursor
+
+pa = pytest.importorskip("pyarrow")
+
+
+def _export(tmp_path, query: str, batch_size: int = 1):
+    conn = sqlite3.connect(":memory:")
+    path = str(tmp_path / "out.arrow")
+    result = export_cursor(conn.execute(query), path, "arrow", batch_size)
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return result, table
+
+
+def test_arrow_widens_int_to_real(tmp_path):
+    result, table = _export(tmp_path, "SELECT 1 AS x UNION ALL SELECT 2.5")
+    assert result["rows"] == 2
+    assert pa.types.is_floating(table.schema.field("x").type)
+    assert table.column("x").to_pylist() == [1.0, 2.5]
+
+
+def test_arrow_widens_int_to_text(tmp_path):
+    _, table = _export(tmp_path, "SELECT 1 AS x, 1 AS y UNION ALL SELECT 'abc', 2 UNION ALL SELECT 3, 3")
+    assert pa.types.is_string(table.schema.field("x").type)
+    assert table.column("x").to_pylist() == ["1", "abc", "3"]
+    assert table.column("y").to_pylist() == [1, 2, 3]
+
+
+def test_arrow_large_int_with_real_becomes_text(tmp_path):
+    _, table = _export(tmp_path, "SELECT 9007199254740993 AS x UNION ALL SELECT 0.5")
+    assert table.column("x").to_pylist() == ["9007199254740993", "0.5"]
+
+
+def test_arrow_null_first_batch(tmp_path):
+    _, table = _export(tmp_path, "SELECT NULL AS x, NULL AS y UNION ALL SELECT 7, NULL")
+    assert table.column("x").to_pylist() == [None, 7]
+    assert pa.types.is_string(table.schema.field("y").type)
+
+
+def test_arrow_leaves_no_partial_files(tmp_path):
+    _export(tmp_path, "SELECT 1 AS x UNION ALL SELECT 2.5 UNION ALL SELECT 'z'")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.arrow"]
@@ -0,0 +1,36 @@
+import sqlite3
+from inventory import rebuild_inventory
+
+
+def _tracked(conn):
+    state = conn.execute("""
+        SELECT product_id, reorder_level, low_stock, units_sold, sales_count, last_sold_at
+        FROM inventory_state ORDER BY product_id
+    """).fetchall()
+    daily = conn.execute("SELECT * FROM inventory_daily_sales ORDER BY product_id, day").fetchall()
+    return state, daily
+
+
+def test_triggers_match_a_full_recomputation(make_server):
+    server = make_server()
+    conn = sqlite3.connect(server.db_path)
+    with conn:
+        conn.execute("INSERT INTO orders (user_id, order_date) VALUES (1, '2024-02-10')")
+        order_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.execute("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (?, 1, 2, 10)",
+                     (order_id,))
+        conn.execute("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (?, 2, 1, 10)",
+                     (order_id,))
+        conn.execute("DELETE FROM order_items WHERE id = (SELECT MIN(id) FROM order_items)")
+        conn.execute("UPDATE order_items SET quantity = quantity + 3 WHERE order_id = ?", (order_id,))
+        # mover un pedido a otro día, a un día que ya tiene ventas del producto y al día actual
+        conn.execute("UPDATE orders SET order_date = '2023-12-31' WHERE id = ?", (order_id,))
+        conn.execute("UPDATE orders SET order_date = (SELECT MAX(order_date) FROM orders) WHERE id = 1")
+        conn.execute("UPDATE orders SET order_date = NULL WHERE id = 2")
+    tracked = _tracked(conn)
+
+    with conn:
+        rebuild_inventory(conn.cursor())
+    assert tracked == _tracked(conn)
+    assert any(row[1] == "2023-12-31" for row in tracked[1])
+    conn.close()
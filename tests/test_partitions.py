@@ -0,0 +1,62 @@
+import asyncio
+import json
+import sqlite3
+from partitions import archive, archived_rows, partition_layout
+
+MONTHLY_SALES = """
+    SELECT strftime('%Y-%m', o.order_date) AS month, COUNT(DISTINCT o.id) AS orders, COUNT(oi.id) AS items
+    FROM orders o LEFT JOIN order_items oi ON oi.order_id = o.id
+    GROUP BY 1 ORDER BY 1
+"""
+
+
+def _admission(result) -> dict:
+    line = next(line for line in result.content[0].text.splitlines() if line.startswith("Admisión: "))
+    return json.loads(line[len("Admisión: "):])
+
+
+def test_admission_counts_archived_rows(make_server):
+    server = make_server()
+    archive(server.db_path, "2024-04-01")
+
+    result = asyncio.run(server.call("execute_query", query="SELECT COUNT(*) AS n FROM orders"))
+    assert '"n": 8' in result.content[0].text
+    # 7 pedidos archivados más el de abril que queda en main
+    assert _admission(result)["estimated_cost"] >= 8
+
+
+def test_views_keep_results_through_archive_and_consolidation(make_server):
+    server = make_server()
+    conn = sqlite3.connect(server.db_path)
+    with conn:
+        for day in ("2024-01-15", "2024-02-10"):
+            order_id = conn.execute(
+                "INSERT INTO orders (user_id, order_date, total_amount) VALUES (1, ?, 10)", (day,)
+            ).lastrowid
+            conn.execute("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (?, 1, 1, 10)",
+                         (order_id,))
+    inventory = conn.execute("SELECT * FROM inventory_state ORDER BY product_id").fetchall()
+
+    async def monthly_sales() -> list[dict]:
+        result = await server.call("execute_query", query=MONTHLY_SALES)
+        return json.loads(result.content[0].text.split("Resultados:\n", 1)[1])
+
+    async def scenario():
+        before = await monthly_sales()
+        created = archive(server.db_path, "2024-04-01")
+        # la conexión del pool que ya adjuntó los meses debe volver a adjuntar el archivo anual
+        monthly = await monthly_sales()
+        archive(server.db_path, "2024-04-01", max_attached=1)
+        yearly = await monthly_sales()
+        return before, created, monthly, yearly
+
+    before, created, monthly, yearly = asyncio.run(scenario())
+    assert [partition["name"] for partition in created] == ["2024_01", "2024_02", "2024_03"]
+    assert before == monthly == yearly
+    layout = partition_layout(conn)
+    assert [partition["name"] for partition in layout] == ["2024"]
+    assert archived_rows(layout, "orders") == sum(row["orders"] for row in before[:-1])
+    assert conn.execute("SELECT COUNT(*) FROM main.orders").fetchone()[0] == before[-1]["orders"]
+    # mover pedidos a particiones no cuenta como devoluciones
+    assert conn.execute("SELECT * FROM inventory_state ORDER BY product_id").fetchall() == inventory
+    conn.close()
@@ -0,0 +1,30 @@
+import sqlite3
+from registry import ToolRegistry, ToolSpec
+
+
+def _registry(conn):
+    spec = ToolSpec(
+        name="stock", description="stock",
+        properties={"category": {"type": "string"}, "limit": {"type": "integer"}},
+        sql={"products": "SELECT name, stock FROM products WHERE category = :category LIMIT :limit"},
+    )
+    registry = ToolRegistry([spec])
+    registry.validate(conn)
+    return registry, spec.sql["products"]
+
+
+def test_warm_leaves_statement_in_cache():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE products (name TEXT, category TEXT, stock INTEGER)")
+    conn.execute("INSERT INTO products VALUES ('a', 'x', 1)")
+    registry, sql = _registry(conn)
+    # cada preparación de la sentencia pasa por el authorizer; una sentencia del cache no
+    prepared = []
+    conn.set_authorizer(lambda action, *args: prepared.append(action) or sqlite3.SQLITE_OK)
+
+    assert registry.warm(conn) == 1
+    assert prepared
+    prepared.clear()
+    assert conn.execute(sql, {"category": "x", "limit": 5}).fetchall() == [("a", 1)]
+    assert prepared == []
+
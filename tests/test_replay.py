@@ -0,0 +1,20 @@
+from replay import schedule
+from tracing import TraceRecorder, read_trace
+
+
+def test_schedule_follows_call_start_order(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    recorder = TraceRecorder(path)
+    # se graban al terminar: la llamada larga que empezó primero queda al final del archivo
+    recorder.record("get_kpis", {}, 100.5, 10.0, "b")
+    recorder.record("get_kpis", {}, 101.0, 10.0, "c")
+    recorder.record("execute_query", {"query": "SELECT 1"}, 100.0, 2000.0, "a")
+    recorder.close()
+    trace = read_trace(path)
+
+    assert [(offset, entry["n"]) for offset, entry in schedule(trace, 1)] == [
+        (0.0, "execute_query"), (0.5, "get_kpis"), (1.0, "get_kpis")
+    ]
+    assert [offset for offset, _ in schedule(trace, 2)] == [0.0, 0.25, 0.5]
+    assert [offset for offset, _ in schedule(trace, None)] == [0.0, 0.0, 0.0]
+    assert schedule([], 1) == []
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import sqlite3
+from result_cache import ResultCache
+
+
+def test_database_stats_report_result_cache(make_server):
+    server = make_server(result_cache_config={"enabled": True})
+
+    async def scenario():
+        await server.call("get_kpis")
+        await server.call("get_kpis")
+        result = await server.call("get_database_stats")
+        await server.default_tenant.close()
+        return json.loads(result.content[0].text.split("\n", 1)[1])["result_cache"]
+
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["entries"] == 1 and stats["bytes"] > 0
+
+
+def test_write_changes_fingerprint_and_misses(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    cache = ResultCache(db_path, {"enabled": True})
+
+    fingerprint = cache.fingerprint()
+    cache.put("get_kpis", {"tenant": "acme"}, ["kpis"], fingerprint)
+    # los argumentos que no cambian el resultado no cambian la clave
+    assert cache.get("get_kpis", {}, fingerprint) == ["kpis"]
+
+    conn.execute("INSERT INTO users DEFAULT VALUES")
+    conn.commit()
+    conn.close()
+    assert cache.fingerprint() != fingerprint
+    assert cache.get("get_kpis", {}, cache.fingerprint()) is None
+    cache.close()
+
+
+def test_cached_tool_follows_writes(make_server):
+    server = make_server(result_cache_config={"enabled": True})
+
+    async def total_products() -> int:
+        result = await server.call("get_kpis")
+        return json.loads(result.content[0].text.split("\n", 1)[1])["total_products"]
+
+    async def scenario():
+        before = await total_products()
+        conn = sqlite3.connect(server.db_path)
+        with conn:
+            conn.execute("INSERT INTO products (name, category, price, stock) VALUES ('Nuevo', 'Test', 1, 1)")
+        conn.close()
+        after = await total_products()
+        stats = server.default_tenant.result_cache.stats()
+        await server.default_tenant.close()
+        return before, after, stats
+
+    before, after, stats = asyncio.run(scenario())
+    assert after == before + 1
+    assert stats["hits"] == 0 and stats["misses"] == 2
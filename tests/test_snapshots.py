@@ -0,0 +1,67 @@
+import asyncio
+import json
+import sqlite3
+
+
+def _report(result) -> dict:
+    return json.loads(result.content[0].text.split("\n\n", 1)[1])
+
+
+def test_periods_share_one_snapshot_per_report_type(make_server):
+    server = make_server()
+    scheduler = server.default_tenant.scheduler
+    built = []
+    build = scheduler.build_report
+    scheduler.build_report = lambda conn, key: built.append(key) or build(conn, key)
+
+    async def scenario():
+        return [
+            _report(await server.call("generate_business_report", report_type="sales", period=period))
+            for period in ("week", "month", "quarter")
+        ]
+
+    reports = asyncio.run(scenario())
+    assert built == ["sales"]
+    assert [report["period"] for report in reports] == ["week", "month", "quarter"]
+    assert reports[0]["summary"] == reports[2]["summary"]
+    assert list(reports[0])[:3] == ["report_type", "period", "summary"]
+
+
+def test_write_marks_snapshot_stale_and_refreshes_it(make_server):
+    server = make_server(scheduler_config={"enabled": False, "jitter_seconds": 0})
+    scheduler = server.default_tenant.scheduler
+
+    async def total_customers():
+        snapshot, stale = await scheduler.get("customers")
+        return snapshot.data["summary"]["total_customers"], stale
+
+    async def scenario():
+        first = await total_customers()
+        conn = sqlite3.connect(server.db_path)
+        with conn:
+            conn.execute("INSERT INTO users (name, email) VALUES ('Nuevo', 'nuevo@email.com')")
+        conn.close()
+        # se sirve el snapshot anterior marcado como viejo y se recalcula en segundo plano
+        served = await total_customers()
+        await asyncio.gather(*scheduler._refreshing.values())
+        refreshed = await total_customers()
+        await scheduler.stop()
+        return first, served, refreshed
+
+    first, served, refreshed = asyncio.run(scenario())
+    assert first[1] is False
+    assert served == (first[0], True)
+    assert refreshed == (first[0] + 1, False)
+
+
+def test_old_snapshot_is_stale_without_writes(make_server):
+    server = make_server(scheduler_config={"enabled": False, "max_age_seconds": 0})
+    scheduler = server.default_tenant.scheduler
+
+    async def scenario():
+        await scheduler.get("sales")
+        _, stale = await scheduler.get("sales")
+        await scheduler.stop()
+        return stale
+
+    assert asyncio.run(scenario()) is True
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import pytest
+import mcp.types as types
+
+QUERY = "SELECT u.name, u.email, o.id AS order_id, o.total_amount FROM users u CROSS JOIN orders o CROSS JOIN products p"
+
+
+async def _read_rows(server, uri: str) -> list[dict]:
+    handler = server.server.request_handlers[types.ReadResourceRequest]
+    rows = []
+    while uri:
+        result = (await handler(types.ReadResourceRequest(
+            method="resources/read", params=types.ReadResourceRequestParams(uri=uri)
+        ))).root
+        content = result.contents[0]
+        rows.extend(json.loads(line) for line in content.text.splitlines())
+        uri = content.meta["next"]
+    return rows
+
+
+@pytest.mark.parametrize("workers", [
+    {"workers": 0},
+    {"workers": 1, "min_cost": 0},
+])
+def test_large_query_streams_into_paged_resource(make_server, monkeypatch, workers):
+    inline = make_server(spill_config={"enabled": False})
+    expected = json.loads(asyncio.run(inline.call("execute_query", query=QUERY)).content[0].text.split("Resultados:\n", 1)[1])
+
+    server = make_server(workers_config=workers, spill_config={"threshold_bytes": 4096, "page_rows": 100})
+    # el resultado se materializa al leer el cursor, no rearmando el texto de la respuesta
+    monkeypatch.setattr(server, "_spill_result", lambda *args: pytest.fail("resultado serializado completo"))
+
+    async def scenario():
+        result = await server.call("execute_query", query=QUERY)
+        again = await server.call("execute_query", query=QUERY)
+        text, link = result.content
+        descriptor = json.loads(text.text.split("páginas\n", 1)[1])
+        rows = await _read_rows(server, descriptor["pages"]["rows"])
+        return link, descriptor, rows, again
+
+    try:
+        link, descriptor, rows, again = asyncio.run(scenario())
+    finally:
+        server.workers.shutdown()
+    assert link.type == "resource_link" and str(link.uri) == descriptor["resource"]
+    assert descriptor["rows"] == len(expected) == 8 * 8 * 13
+    assert [column["name"] for column in descriptor["schema"]] == ["name", "email", "order_id", "total_amount"]
+    assert rows == expected
+    # la misma consulta con los mismos datos reutiliza el archivo
+    assert again.content[1].uri == link.uri
+    assert len(server.spill.entries()) == 1
+
+
+def test_small_query_stays_inline(make_server):
+    server = make_server(spill_config={"threshold_bytes": 1 << 20})
+    result = asyncio.run(server.call("execute_query", query="SELECT id FROM users ORDER BY id"))
+    assert len(result.content) == 1
+    assert json.loads(result.content[0].text.split("Resultados:\n", 1)[1]) == [{"id": i} for i in range(1, 9)]
+    assert server.spill.entries() == []
+
+
+def test_expired_results_are_removed_without_being_read(make_server):
+    server = make_server(spill_config={"threshold_bytes": 4096, "ttl_seconds": 0.1, "cleanup_seconds": 0.05})
+
+    async def scenario():
+        await server.call("execute_query", query=QUERY)
+        paths = [entry.path for entry in server.spill._entries.values()]
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(server._expire_spill(), 0.4)
+        return paths
+
+    paths = asyncio.run(scenario())
+    assert len(paths) == 1
+    assert not os.path.exists(paths[0])
+    assert server.spill._entries == {} and server.spill.total_bytes == 0
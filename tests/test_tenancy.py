@@ -0,0 +1,112 @@
+import asyncio
+import json
+import sqlite3
+import time
+from tenancy import TenantManager
+
+
+def test_slow_lane_does_not_hold_tenant_quota(make_server, monkeypatch):
+    # todo execute_query va al carril lento, con un solo cupo
+    server = make_server(admission_policy={"cheap_cost": -1, "slow_lane_concurrency": 1})
+    run_query = server._run_admitted_query
+
+    def slow_query(decision, *spill):
+        time.sleep(0.4)
+        return run_query(decision, *spill)
+
+    monkeypatch.setattr(server, "_run_admitted_query", slow_query)
+
+    async def scenario():
+        slow = [
+            asyncio.create_task(server.call("execute_query", query="SELECT COUNT(*) FROM users"))
+            for _ in range(server.max_concurrent_calls)
+        ]
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        kpis = await server.call("get_kpis")
+        elapsed = time.perf_counter() - started
+        results = await asyncio.gather(*slow)
+        return kpis, elapsed, results
+
+    kpis, elapsed, results = asyncio.run(scenario())
+    assert kpis.content[0].text.startswith("KPIs del Negocio")
+    assert elapsed < 0.3
+    assert all("Consulta ejecutada exitosamente" in result.content[0].text for result in results)
+    assert server.default_tenant.quota._value == server.max_concurrent_calls
+    assert server.default_tenant.slow_quota._value == server.max_slow_calls
+
+
+def test_named_tenant_snapshots_follow_writes(make_server):
+    server = make_server(scheduler_config={"enabled": True, "poll_seconds": 0.05, "jitter_seconds": 0})
+
+    async def total_customers() -> int:
+        result = await server.call("generate_business_report", report_type="customers", tenant="acme")
+        return json.loads(result.content[0].text.split("\n", 2)[2])["summary"]["total_customers"]
+
+    async def scenario():
+        before = await total_customers()
+        conn = sqlite3.connect(server.tenants.path_for("acme"))
+        with conn:
+            conn.execute("INSERT INTO users (name, email) VALUES ('Nuevo', 'nuevo@email.com')")
+        conn.close()
+        for _ in range(40):
+            await asyncio.sleep(0.05)
+            if await total_customers() == before + 1:
+                break
+        after = await total_customers()
+        await server.tenants.close_all()
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert after == before + 1
+
+
+class _FakeTenant:
+    def __init__(self, name):
+        self.name = name
+        self.in_use = 0
+        self.quota = asyncio.Semaphore(4)
+        self.slow_quota = asyncio.Semaphore(1)
+        self.closed = False
+
+    def start(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+def test_eviction_spares_the_tenant_just_opened(tmp_path):
+    manager = TenantManager(str(tmp_path), lambda name, db_path: _FakeTenant(name), max_open=1)
+
+    async def scenario():
+        first = await manager.get("a")
+        async with manager.use(first):
+            # "a" está ocupado: el único candidato sería el recién abierto
+            second = await manager.get("b")
+            await asyncio.sleep(0)
+            assert not second.closed
+            assert list(manager._open) == ["a", "b"]
+        await asyncio.sleep(0)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    # al liberarse "a" vuelve a max_open cerrando el menos usado
+    assert first.closed and not second.closed
+    assert list(manager._open) == ["b"]
+
+
+def test_eviction_closes_least_recently_used_idle_tenant(tmp_path):
+    manager = TenantManager(str(tmp_path), lambda name, db_path: _FakeTenant(name), max_open=2)
+
+    async def scenario():
+        a = await manager.get("a")
+        await manager.get("b")
+        await manager.get("a")
+        await manager.get("c")
+        await asyncio.sleep(0)
+        return a
+
+    a = asyncio.run(scenario())
+    assert not a.closed
+    assert list(manager._open) == ["a", "c"]